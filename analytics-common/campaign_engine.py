@@ -0,0 +1,350 @@
+# -*- coding: utf-8 -*-
+"""複数キャンペーン（風邪・花粉症など）を1回の取得でまとめて集計する
+
+全キャンペーンの検索条件を OR でつないだクエリで一度だけ取得し、
+取得したツイートを各キャンペーンの判定処理に渡す。症状語が重なっていても
+検索は1回で済み、キャンペーンを追加しても取得回数は増えない
+（クエリ長の上限を超える分だけクエリが分かれる）。
+
+取得件数の上限はキャンペーンごとに割り当てる。1クエリ×1時間帯につき、各キャンペーンの
+有効件数が depth 件に達するか、取得件数が depth × キャンペーン数 に達するまでページをたどる
+（件数の多いキャンペーンが上限を使い切り、少ないキャンペーンの標本が減るのを防ぐ）。
+
+キャンペーンは次を持つ分析クラス（kaze / pollen の main.py）:
+  campaign              キャンペーン名（保存時の分類キー）
+  symptom_names         症状名のリスト
+  search_clauses()      全症状を拾う検索条件（OR でつなぐ節）のリスト
+  collection_window()   集計期間 (開始, 終了)（UTC）
+  classify_for_store()  本文を [(症状名, 有効か)] に分類（ツイートIDを渡すとほぼ重複も除外）
+  cube                  症状 × 都道府県 × 時間 の集計キューブ（begin_cube() で期間を消してから加え、save_cube() で保存）
+  publish()             集計結果からチャート・本文を作成して投稿
+  charts                チャートの描画（ChartService。投稿後に close() する）
+  client                投稿に使うクライアント
+
+使い方:
+  python analytics-common/campaign_engine.py --campaigns kaze,pollen
+  python analytics-common/campaign_engine.py --store tweets.db --dry-run
+"""
+import argparse
+import functools
+import importlib.util
+import os
+import sys
+from datetime import timedelta, timezone
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import metrics
+from collector import RateLimitedCollector
+from chart_service import CHART_WORKERS
+from plotting import CHART_WIDTH
+from tweet_store import TweetStore
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# 登録済みキャンペーン: 名前 -> (スクリプト, クラス名)
+CAMPAIGNS = {
+    'kaze': (os.path.join(ROOT, 'kaze-analytics', 'main.py'), 'FinalKazeAnalyzer'),
+    'pollen': (os.path.join(ROOT, 'pollen-analytics', 'main.py'), 'PollenAnalyzer'),
+}
+
+QUERY_SUFFIX = ' -is:retweet lang:ja'
+MAX_QUERY_LENGTH = 512  # search/recent のクエリ長上限（Basic）
+
+
+def load_campaign(name, **kwargs):
+    """登録済みキャンペーンの分析クラスを読み込んでインスタンスを返す"""
+    path, class_name = CAMPAIGNS[name]
+    spec = importlib.util.spec_from_file_location(f'campaign_{name}', path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return getattr(module, class_name)(**kwargs)
+
+
+def build_query(clauses):
+    return f"({' OR '.join(clauses)}){QUERY_SUFFIX}"
+
+
+def pack_queries(clauses, max_length=MAX_QUERY_LENGTH):
+    """重複を除いた節を、長さ上限に収まるようにクエリへ詰める（1節だけで上限を超える場合は ValueError）"""
+    queries = []
+    current = []
+    for clause in dict.fromkeys(clauses):
+        length = len(build_query([clause]))
+        if length > max_length:
+            raise ValueError(f"検索条件が1つでクエリ長の上限（{max_length}文字）を超えています"
+                             f"（{length}文字）: {clause}")
+        if current and len(build_query(current + [clause])) > max_length:
+            queries.append(build_query(current))
+            current = []
+        current.append(clause)
+    if current:
+        queries.append(build_query(current))
+    return queries
+
+
+def split_window(start_time, end_time, hours):
+    """期間を hours 時間ごとの時間帯に分割"""
+    buckets = []
+    step = timedelta(hours=hours)
+    current = start_time
+    while current < end_time:
+        buckets.append((current, min(current + step, end_time)))
+        current += step
+    return buckets
+
+
+def _naive_utc(dt):
+    if dt is not None and dt.tzinfo is not None:
+        return dt.astimezone(timezone.utc).replace(tzinfo=None)
+    return dt
+
+
+class CampaignEngine:
+    """登録したキャンペーンを共通の取得結果で集計・投稿する"""
+
+    def __init__(self, campaigns, client=None, store=None, max_tweets_per_bucket=20,
+                 bucket_time_limit=60, bucket_hours=6, max_query_length=MAX_QUERY_LENGTH):
+        self.campaigns = list(campaigns)
+        # 検索は先頭キャンペーンのクライアントで行う（投稿は各キャンペーンのクライアント）
+        self.client = client or self.campaigns[0].client
+        self.collector = RateLimitedCollector(self.client, max_workers=4)
+        self.store = store
+        self.max_tweets_per_bucket = max_tweets_per_bucket
+        self.bucket_time_limit = bucket_time_limit
+        self.bucket_hours = bucket_hours
+        self.queries = pack_queries(
+            [clause for campaign in self.campaigns for clause in campaign.search_clauses()],
+            max_query_length
+        )
+        self.windows = {}
+
+    def collection_window(self):
+        """全キャンペーンの集計期間を合わせた期間"""
+        self.windows = {c.campaign: c.collection_window() for c in self.campaigns}
+        return (min(start for start, _ in self.windows.values()),
+                max(end for _, end in self.windows.values()))
+
+    def iter_tweets(self, query, start_time, end_time, progress=None, budget=None):
+        return self.collector.paginate(
+            self.client.search_recent_tweets,
+            budget=budget or self.max_tweets_per_bucket,
+            time_limit=self.bucket_time_limit,
+            progress=progress,
+            query=query,
+            start_time=start_time.isoformat(),
+            end_time=end_time.isoformat(),
+            tweet_fields=['created_at', 'author_id', 'text']
+        )
+
+    def iter_classified(self, query, start_time, end_time, progress=None):
+        """取得しながら全キャンペーンで判定し、(ツイート, {キャンペーン: [(症状名, 有効か)]}, 数えるキューブのキー) を返す
+
+        集計期間内の有効なツイートは、そのキャンペーンの有効件数が max_tweets_per_bucket に
+        達するまで数える。全キャンペーンが達するか、取得件数が max_tweets_per_bucket ×
+        キャンペーン数に達したら打ち切る。
+        """
+        quota = {c.campaign: self.max_tweets_per_bucket for c in self.campaigns}
+        tweets = self.iter_tweets(query, start_time, end_time, progress,
+                                  budget=self.max_tweets_per_bucket * len(self.campaigns))
+        for tweet in tweets:
+            created_at = _naive_utc(getattr(tweet, 'created_at', None))
+            results = {}
+            hits = []
+            for campaign in self.campaigns:
+                results[campaign.campaign] = campaign.classify_for_store(tweet.text, [query], tweet.id)
+                window_start, window_end = self.windows[campaign.campaign]
+                if not quota[campaign.campaign] or \
+                        (created_at is not None and not window_start <= created_at < window_end):
+                    continue
+                valid = [name for name, ok in results[campaign.campaign] if ok]
+                if valid:
+                    quota[campaign.campaign] -= 1
+                    hits.extend((campaign.campaign, (name, created_at or window_start, None)) for name in valid)
+            yield tweet, results, tuple(hits)
+            if not any(quota.values()):
+                metrics.incr('engine.quota_filled')
+                return
+
+    def save_tweets(self, query, classified, tweets):
+        """取得したツイートを保存し、全キャンペーンの分類結果（classified: 取得時の判定）を記録"""
+        self.store.add_tweets(
+            [{'id': t.id, 'text': t.text, 'created_at': t.created_at} for t in tweets],
+            query=query
+        )
+        results = [classified.pop(t.id) for t in tweets]
+        for campaign in self.campaigns:
+            self.store.set_classifications(campaign.campaign, [
+                (t.id, name, valid)
+                for t, result in zip(tweets, results)
+                for name, valid in result[campaign.campaign]
+            ])
+
+    def fetch_bucket(self, query, start_time, end_time):
+        """1クエリ×1時間帯分を取得して判定する
+
+        保存時は未取得の区間だけ取得して保存し、件数は後で保存済みデータから数える。
+        保存しない場合は {ツイートID: 数えるキューブのキー} を返す（ツイート本体は持たない）。
+        """
+        if self.store is not None:
+            classified = {}
+
+            def fetch(start, end, progress):
+                for tweet, results, _ in self.iter_classified(query, start, end, progress):
+                    classified[tweet.id] = results
+                    yield tweet
+
+            return self.store.fill(query, start_time, end_time, fetch=fetch,
+                                   on_batch=functools.partial(self.save_tweets, query, classified))
+        return {tweet.id: hits for tweet, _, hits in self.iter_classified(query, start_time, end_time)}
+
+    def count(self, cells):
+        """{キャンペーン: {キューブのキー: 件数}} を各キューブに加え、{キャンペーン: {症状名: 有効件数}} を返す"""
+        counts = {}
+        for campaign in self.campaigns:
+            campaign.begin_cube(*self.windows[campaign.campaign])
+            campaign.cube.update(cells[campaign.campaign])
+            totals = {name: 0 for name in campaign.symptom_names}
+            for (name, _, _), n in cells[campaign.campaign].items():
+                totals[name] += n
+            counts[campaign.campaign] = totals
+        return counts
+
+    def count_from_store(self):
+        counts = {}
+        for campaign in self.campaigns:
+            start_time, end_time = self.windows[campaign.campaign]
+            campaign.begin_cube(start_time, end_time)
+            campaign.cube.update(self.store.count_by_symptom_hour(campaign.campaign, start_time, end_time))
+            stored = campaign.cube.totals(start_time, end_time)
+            counts[campaign.campaign] = {name: stored.get(name, 0) for name in campaign.symptom_names}
+        return counts
+
+    def collect(self):
+        """全キャンペーン分を1回の取得で集計"""
+        start_time, end_time = self.collection_window()
+        buckets = split_window(start_time, end_time, self.bucket_hours)
+        print(f"共通取得: クエリ{len(self.queries)}本 × 時間帯{len(buckets)}")
+
+        jobs = {
+            (q, b): functools.partial(self.fetch_bucket, query, bucket_start, bucket_end)
+            for q, query in enumerate(self.queries)
+            for b, (bucket_start, bucket_end) in enumerate(buckets)
+        }
+        results, errors = self.collector.run(jobs)
+        for (q, b), e in sorted(errors.items()):
+            print(f"  クエリ{q+1} 時間帯{b+1}: 取得失敗 - {str(e)}")
+
+        if self.store is not None:
+            return self.count_from_store()
+
+        # クエリをまたいで重複したツイートは1件として数える（先のクエリ・時間帯の判定を使う）
+        counted = set()
+        cells = {c.campaign: {} for c in self.campaigns}
+        for key in sorted(results):
+            for tweet_id, hits in results[key].items():
+                if tweet_id in counted:
+                    continue
+                counted.add(tweet_id)
+                for campaign_name, cell in hits:
+                    cells[campaign_name][cell] = cells[campaign_name].get(cell, 0) + 1
+        print(f"  取得: {len(counted)}件")
+        return self.count(cells)
+
+    def collect_from_store(self):
+        """APIを使わず、保存済みツイートを全キャンペーンで分類し直して集計"""
+        print("保存済みデータから再分類・集計...")
+        self.collection_window()
+        for campaign in self.campaigns:
+            total = self.store.reclassify(campaign.campaign, campaign.classify_for_store)
+            print(f"  {campaign.campaign} 再分類: {total}件")
+        return self.count_from_store()
+
+    def run(self, post=True, chart=True, offline=False):
+        print("複数キャンペーン分析開始: " + ", ".join(c.campaign for c in self.campaigns))
+        with metrics.stage("collect"):
+            counts = self.collect_from_store() if offline else self.collect()
+            for campaign in self.campaigns:
+                campaign.save_cube()
+
+        for campaign in self.campaigns:
+            print(f"[{campaign.campaign}]")
+            for name, count in counts[campaign.campaign].items():
+                print(f"  {name}: {count}件")
+            try:
+                campaign.publish(counts[campaign.campaign], post=post, chart=chart)
+            except Exception as e:
+                metrics.error(f"publish {campaign.campaign}", e)
+                print(f"エラーが発生しました: {str(e)}")
+            finally:
+                campaign.charts.close()
+        return counts
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="複数キャンペーンの共通取得・集計")
+    parser.add_argument("--campaigns", default=",".join(CAMPAIGNS),
+                        help="実行するキャンペーン（カンマ区切り）")
+    parser.add_argument("--depth", type=int, default=20,
+                        help="クエリ×時間帯ごとに各キャンペーンで数える最大件数（取得は最大で depth × キャンペーン数）")
+    parser.add_argument("--bucket-time-limit", type=float, default=60,
+                        help="クエリ×時間帯ごとの取得時間上限（秒）")
+    parser.add_argument("--bucket-hours", type=float, default=6,
+                        help="取得を分ける時間帯の長さ（時間）")
+    parser.add_argument("--max-query-length", type=int, default=MAX_QUERY_LENGTH,
+                        help="1クエリの最大文字数（超える分は別クエリに分ける）")
+    parser.add_argument("--store", default=os.getenv('TWEET_STORE_PATH'),
+                        help="取得済みツイートを保存するSQLiteファイル")
+    parser.add_argument("--offline", action="store_true",
+                        help="APIを使わず --store の保存済みデータを再分類して集計する")
+    parser.add_argument("--trend-store", default=os.getenv('TREND_STORE_PATH'),
+                        help="症状ごとの平常値を保存するJSONファイル（キャンペーン別に記録）")
+    parser.add_argument("--no-chart", action="store_true", help="チャートを作らない")
+    parser.add_argument("--dry-run", action="store_true", help="投稿しない")
+    parser.add_argument("--cube-dir", default=os.getenv('SYMPTOM_CUBE_DIR'),
+                        help="キャンペーンごとの集計キューブ（<キャンペーン>.cube）を保存するディレクトリ")
+    parser.add_argument("--image-format", choices=["png", "webp", "jpeg"], default="png",
+                        help="投稿する画像の形式（png はパレット化して軽量化）")
+    parser.add_argument("--chart-width", type=int, default=CHART_WIDTH, help="チャート画像の幅（ピクセル）")
+    parser.add_argument("--chart-cache", default=os.getenv('CHART_CACHE_DIR'),
+                        help="描画したチャートを内容のハッシュで保存するディレクトリ（同じ内容なら描画しない）")
+    parser.add_argument("--chart-workers", type=int, default=CHART_WORKERS,
+                        help="チャートを描画するプロセス数（0 はプロセスを使わずに描画）")
+    parser.add_argument("--report-dir", help="時間別・地方別のチャートを保存するディレクトリ")
+    parser.add_argument("--outbox", default=os.getenv('PUBLISH_OUTBOX'),
+                        help="投稿に失敗した本文・画像を保存するディレクトリ")
+    parser.add_argument("--metrics", default=os.getenv('METRICS_PATH'),
+                        help="段階ごとの時間・API呼び出し・判定件数を書き出すJSONファイル")
+    parser.add_argument("--profile", help="収集処理の cProfile 結果を保存するファイル（.prof）")
+    args = parser.parse_args(argv)
+    if args.offline and not args.store:
+        parser.error("--offline には --store の指定が必要です")
+
+    names = [name.strip() for name in args.campaigns.split(",") if name.strip()]
+    unknown = [name for name in names if name not in CAMPAIGNS]
+    if unknown:
+        parser.error(f"不明なキャンペーン: {', '.join(unknown)}")
+
+    metrics.start("+".join(names), args.metrics, args.profile)
+    if args.cube_dir:
+        os.makedirs(args.cube_dir, exist_ok=True)
+    engine = CampaignEngine(
+        [load_campaign(name, trend_path=args.trend_store, image_format=args.image_format,
+                       chart_width=args.chart_width, outbox=args.outbox,
+                       chart_cache=args.chart_cache, chart_workers=args.chart_workers,
+                       report_dir=args.report_dir,
+                       cube_path=args.cube_dir and os.path.join(args.cube_dir, f'{name}.cube'))
+         for name in names],
+        store=TweetStore(args.store) if args.store else None,
+        max_tweets_per_bucket=args.depth,
+        bucket_time_limit=args.bucket_time_limit,
+        bucket_hours=args.bucket_hours,
+        max_query_length=args.max_query_length,
+    )
+    engine.run(post=not args.dry_run, chart=not args.no_chart, offline=args.offline)
+    metrics.finish()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
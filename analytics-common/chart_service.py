@@ -0,0 +1,266 @@
+# -*- coding: utf-8 -*-
+"""チャートの並列描画と、内容のハッシュによるディスクキャッシュ
+
+チャートは (種類, データ, 体裁) の組で指定し、プロセスプールで描画して PNG のバイト列を返す。
+submit() はすぐに Future を返すため、描画中に本文の生成などを進められる。
+submit_all() は描画するチャートが描画プロセス数より少なければプロセスを起動せず、
+このプロセスの描画スレッド（1本）で描画する（プロセスの起動と matplotlib の読み込みの方が、
+数枚の描画より重いため）。どちらの場合も submit() は描画の完了を待たない。
+
+cache_dir を指定すると、描画結果を (種類, データ, 体裁, 描画処理の版) のハッシュを名前にして保存し、
+同じ内容のチャートは描画せずに読み込む（件数が前回と同じなら matplotlib も読み込まない）。
+
+  bar   data: {'labels': [...], 'values': [...]}
+  line  data: {'labels': [...], 'series': {系列名: [...]}}
+"""
+import concurrent.futures
+import glob
+import hashlib
+import io
+import json
+import os
+import tempfile
+import threading
+from datetime import timedelta
+
+import metrics
+from plotting import CHART_WIDTH, figure_dpi, setup_fonts
+
+RENDER_VERSION = 1   # 描画処理を変えたら上げる（古いキャッシュを使わない）
+CHART_WORKERS = 3    # 描画プロセス数（投稿用ランキング＋レポートの時間別・地方別）
+CACHE_MAX_FILES = 200
+JST = timedelta(hours=9)
+
+# レポート用チャートの体裁（タイトル以外はキャンペーン共通）
+REPORT_STYLE = {
+    'figsize': [12, 6],
+    'ylabel': '報告件数',
+    'colors': ['#FF6B6B', '#4ECDC4', '#45B7D1', '#96CEB4', '#FFEAA7', '#B39DDB', '#FFAB91', '#90A4AE'],
+    'label_size': 9,
+}
+
+
+def bar_chart(data, style):
+    """棒グラフを描いて PNG のバイト列を返す"""
+    plt = setup_fonts(*style.get('fonts', ()), japanize=style.get('japanize', False))
+    labels = data['labels']
+    values = data['values']
+
+    fig, ax = plt.subplots(figsize=tuple(style.get('figsize', (12, 6))))
+    bars = ax.bar(labels, values, color=style.get('colors'))
+
+    ax.set_title(style.get('title', ''), fontsize=style.get('title_size', 14), pad=20,
+                 fontweight=style.get('title_weight', 'normal'))
+    ax.set_ylabel(style.get('ylabel', ''), fontsize=12)
+    ax.set_xlabel(style.get('xlabel', ''), fontsize=12)
+    if style.get('grid'):
+        ax.grid(True, alpha=0.3, axis='y')
+
+    # 数値表示（skip_zero_labels なら0件の棒には付けない）
+    for bar, value in zip(bars, values):
+        height = bar.get_height()
+        if style.get('skip_zero_labels') and height <= 0:
+            continue
+        ax.text(bar.get_x() + bar.get_width()/2., height + style.get('label_offset', 0.5),
+                f'{value}件', ha='center', va='bottom', fontsize=style.get('label_size', 10),
+                fontweight=style.get('label_weight', 'normal'))
+
+    plt.xticks(rotation=style.get('rotation', 0))
+    plt.tight_layout()
+    return _save(plt, fig, style)
+
+
+def line_chart(data, style):
+    """系列ごとの折れ線グラフを描いて PNG のバイト列を返す"""
+    plt = setup_fonts(*style.get('fonts', ()), japanize=style.get('japanize', False))
+    labels = data['labels']
+
+    fig, ax = plt.subplots(figsize=tuple(style.get('figsize', (12, 6))))
+    colors = style.get('colors') or [None]
+    for i, (name, values) in enumerate(data['series'].items()):
+        ax.plot(range(len(labels)), values, marker='o', markersize=3, label=name,
+                color=colors[i % len(colors)])
+
+    ax.set_title(style.get('title', ''), fontsize=style.get('title_size', 14), pad=20,
+                 fontweight=style.get('title_weight', 'normal'))
+    ax.set_ylabel(style.get('ylabel', ''), fontsize=12)
+    ax.set_xlabel(style.get('xlabel', ''), fontsize=12)
+    ax.grid(True, alpha=0.3)
+    # 件数の軸は整数、時刻の目盛りは最大12本に間引く
+    from matplotlib.ticker import MaxNLocator
+    ax.yaxis.set_major_locator(MaxNLocator(integer=True))
+    step = max(1, -(-len(labels) // 12))
+    ax.set_xticks(range(0, len(labels), step))
+    ax.set_xticklabels(labels[::step], rotation=style.get('rotation', 30), ha='right')
+    ax.legend(fontsize=style.get('label_size', 10))
+    plt.tight_layout()
+    return _save(plt, fig, style)
+
+
+def _save(plt, fig, style):
+    buffer = io.BytesIO()
+    plt.savefig(buffer, format='png', dpi=figure_dpi(fig, style.get('width', CHART_WIDTH)),
+                bbox_inches='tight')
+    plt.close(fig)
+    return buffer.getvalue()
+
+
+RENDERERS = {
+    'bar': bar_chart,
+    'line': line_chart,
+}
+
+
+def render(kind, data, style):
+    """描画プロセスで実行する処理"""
+    return RENDERERS[kind](data, style)
+
+
+def chart_key(kind, data, style):
+    """チャートの内容のハッシュ（キャッシュのファイル名）"""
+    payload = json.dumps([RENDER_VERSION, kind, data, style], ensure_ascii=False, sort_keys=True)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+def _completed(value):
+    future = concurrent.futures.Future()
+    future.set_result(value)
+    return future
+
+
+class ChartService:
+    """チャートの描画（プロセスプール・ディスクキャッシュ付き）
+
+    workers=0 の場合（または pool=False で submit した場合）はプールを使わず、描画スレッドで描画する
+    （pyplot はスレッドセーフでないため、描画スレッドは1本）。
+    """
+
+    def __init__(self, cache_dir=None, workers=CHART_WORKERS):
+        self.cache_dir = cache_dir
+        self.workers = workers
+        self.pool = None
+        self.thread = None
+        self.lock = threading.Lock()
+        if cache_dir:
+            os.makedirs(cache_dir, exist_ok=True)
+
+    def _cache_path(self, key):
+        return os.path.join(self.cache_dir, key + '.png') if self.cache_dir else None
+
+    def _load(self, path):
+        if path is None or not os.path.exists(path):
+            return None
+        with open(path, 'rb') as f:
+            image = f.read()
+        # 使ったキャッシュは新しい扱いにする（古いものから消すため）
+        os.utime(path)
+        return image
+
+    def _store(self, path, image):
+        if path is None:
+            return
+        fd, tmp = tempfile.mkstemp(dir=self.cache_dir, prefix='.chart-', suffix='.png')
+        with os.fdopen(fd, 'wb') as f:
+            f.write(image)
+        os.replace(tmp, path)
+        self.prune()
+
+    def prune(self, max_files=CACHE_MAX_FILES):
+        """キャッシュが max_files を超えたら使われていない順に消す"""
+        paths = glob.glob(os.path.join(self.cache_dir, '*.png'))
+        if len(paths) <= max_files:
+            return
+        paths.sort(key=lambda path: os.path.getmtime(path))
+        for path in paths[:len(paths) - max_files]:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+    def is_cached(self, kind, data, style):
+        path = self._cache_path(chart_key(kind, data, style))
+        return path is not None and os.path.exists(path)
+
+    def submit(self, kind, data, style, pool=True):
+        """チャートの描画を開始し、PNG のバイト列を返す Future を返す"""
+        path = self._cache_path(chart_key(kind, data, style))
+        image = self._load(path)
+        if image is not None:
+            metrics.incr('chart.cache_hit')
+            return _completed(image)
+
+        metrics.incr('chart.rendered')
+        with self.lock:
+            if not self.workers or not pool:
+                if self.thread is None:
+                    self.thread = concurrent.futures.ThreadPoolExecutor(max_workers=1, thread_name_prefix='chart')
+                # 結果を受け取った時点でキャッシュに保存済みになるよう、描画スレッドの中で保存する
+                return self.thread.submit(self._render_and_store, path, kind, data, style)
+            if self.pool is None:
+                self.pool = concurrent.futures.ProcessPoolExecutor(max_workers=self.workers)
+            future = self.pool.submit(render, kind, data, style)
+
+        def store(done):
+            if done.exception() is None:
+                self._store(path, done.result())
+
+        future.add_done_callback(store)
+        return future
+
+    def _render_and_store(self, path, kind, data, style):
+        image = render(kind, data, style)
+        self._store(path, image)
+        return image
+
+    def submit_all(self, specs):
+        """{名前: (種類, データ, 体裁)} の描画を開始し {名前: Future} を返す
+
+        キャッシュに無いチャートが描画プロセス数より少なければ、プールを起動せず描画スレッドで描画する。
+        """
+        rendered = sum(1 for spec in specs.values() if not self.is_cached(*spec))
+        pool = self.pool is not None or rendered >= self.workers
+        return {name: self.submit(*spec, pool=pool) for name, spec in specs.items()}
+
+    def render(self, kind, data, style):
+        """チャートを描画して PNG のバイト列を返す（キャッシュがあれば読み込む。すぐに待つためプールは使わない）"""
+        return self.submit(kind, data, style, pool=False).result()
+
+    def close(self):
+        with self.lock:
+            pool, self.pool = self.pool, None
+            thread, self.thread = self.thread, None
+        for executor in (pool, thread):
+            if executor is not None:
+                executor.shutdown()
+
+
+def report_specs(cube, start_time, end_time, title, style=None):
+    """集計キューブから時間別（症状ごとの折れ線）・地方別（棒）のチャートを {名前: (種類, データ, 体裁)} で返す"""
+    style = dict(REPORT_STYLE, **(style or {}))
+    series = {}
+    labels = []
+    for symptom in cube.symptoms:
+        hourly = cube.by_hour(start_time, end_time, symptom=symptom)
+        labels = [(hour + JST).strftime('%m/%d %H時') for hour, _ in hourly]
+        series[symptom] = [n for _, n in hourly]
+    regions = cube.by_region(start_time, end_time)
+    return {
+        'hourly': ('line', {'labels': labels, 'series': series},
+                   dict(style, title=f'{title}（1時間ごと）', xlabel='時刻（日本時間）')),
+        'regions': ('bar', {'labels': list(regions), 'values': list(regions.values())},
+                    dict(style, title=f'{title}（地方別）', xlabel='地方', rotation=0)),
+    }
+
+
+def save_report(report_dir, campaign, images):
+    """レポート用チャートを <キャンペーン>_<名前>.png で保存（一時ファイルから置き換える）"""
+    os.makedirs(report_dir, exist_ok=True)
+    paths = []
+    for name, image in images.items():
+        path = os.path.join(report_dir, f'{campaign}_{name}.png')
+        fd, tmp = tempfile.mkstemp(dir=report_dir, prefix='.report-', suffix='.png')
+        with os.fdopen(fd, 'wb') as f:
+            f.write(image)
+        os.replace(tmp, path)
+        paths.append(path)
+    return paths
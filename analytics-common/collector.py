@@ -0,0 +1,239 @@
+# -*- coding: utf-8 -*-
+"""レート制限を考慮した並列ツイート収集"""
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlparse
+
+import metrics
+
+SEARCH_RECENT = '/2/tweets/search/recent'
+COUNTS_RECENT = '/2/tweets/counts/recent'
+CREATE_TWEET = '/2/tweets'
+MEDIA_UPLOAD = '/1.1/media/upload.json'
+
+# エンドポイントごとの既定レート制限 (回数, 秒)
+DEFAULT_LIMITS = {
+    SEARCH_RECENT: (180, 15 * 60),
+    COUNTS_RECENT: (300, 15 * 60),
+    CREATE_TWEET: (200, 15 * 60),
+    MEDIA_UPLOAD: (415, 15 * 60),
+}
+
+# 計測値に使うエンドポイント名
+ENDPOINT_NAMES = {
+    SEARCH_RECENT: 'search_recent',
+    COUNTS_RECENT: 'counts_recent',
+    CREATE_TWEET: 'create_tweet',
+    MEDIA_UPLOAD: 'media_upload',
+}
+
+
+class TokenBucket:
+    """トークンバケット。レスポンスヘッダーで残量と復帰時刻を同期する"""
+
+    def __init__(self, capacity, window):
+        self.capacity = capacity
+        self.refill_rate = capacity / float(window)
+        self.tokens = float(capacity)
+        self.reset_at = None
+        self.updated = time.monotonic()
+        self.cond = threading.Condition()
+
+    def _refill(self, now):
+        if self.reset_at is not None:
+            # ヘッダーで枯渇が分かっている場合は復帰時刻まで補充しない
+            if time.time() < self.reset_at:
+                self.updated = now
+                return
+            self.reset_at = None
+            self.tokens = float(self.capacity)
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.refill_rate)
+        self.updated = now
+
+    def acquire(self):
+        """トークンを1つ取得するまで待つ。待った秒数を返す"""
+        waited = 0.0
+        with self.cond:
+            while True:
+                now = time.monotonic()
+                self._refill(now)
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return waited
+                if self.reset_at is not None:
+                    delay = max(self.reset_at - time.time(), 0.1)
+                else:
+                    delay = (1 - self.tokens) / self.refill_rate
+                self.cond.wait(delay)
+                waited += time.monotonic() - now
+
+    def sync(self, limit, remaining, reset):
+        """x-rate-limit-* ヘッダーの値でバケットを補正"""
+        with self.cond:
+            if limit:
+                self.capacity = limit
+            self._refill(time.monotonic())
+            self.tokens = min(self.tokens, float(remaining))
+            if remaining <= 0 and reset:
+                self.reset_at = reset
+            self.cond.notify_all()
+
+
+def _rate_limit_headers(response):
+    headers = getattr(response, 'headers', None) or {}
+    try:
+        return (
+            int(headers.get('x-rate-limit-limit', 0)),
+            int(headers['x-rate-limit-remaining']),
+            int(headers.get('x-rate-limit-reset', 0)),
+        )
+    except (KeyError, TypeError, ValueError):
+        return None
+
+
+def _status_code(exc):
+    return getattr(getattr(exc, 'response', None), 'status_code', None)
+
+
+def _is_connection_error(exc):
+    """接続エラーか（tweepy.API は requests の例外を TweepyException に包んで送出する）"""
+    return isinstance(exc, OSError) or isinstance(exc.__context__, OSError)
+
+
+class RateLimitedCollector:
+    """トークンバケットで流量を制御しながらAPI呼び出しを並列実行する
+
+    tweepy.Client の requests セッションにフックを登録し、
+    レスポンスの x-rate-limit-remaining / reset でバケットを同期する。
+    レート制限やサーバーエラーはバックオフして再試行する。
+    """
+
+    def __init__(self, client, max_workers=4, max_retries=5, backoff_base=2.0, max_backoff=60.0):
+        self.client = client
+        self.max_workers = max_workers
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.max_backoff = max_backoff
+        self.buckets = {}
+        self.lock = threading.Lock()
+
+        self.watch(getattr(client, 'session', None))
+
+    def watch(self, session):
+        """requests セッションのレスポンスでバケットを同期する（投稿用の tweepy.API など）"""
+        hooks = getattr(session, 'hooks', None)
+        if hooks is not None and self._on_response not in hooks.setdefault('response', []):
+            hooks['response'].append(self._on_response)
+
+    def bucket(self, endpoint):
+        with self.lock:
+            if endpoint not in self.buckets:
+                capacity, window = DEFAULT_LIMITS.get(endpoint, DEFAULT_LIMITS[SEARCH_RECENT])
+                self.buckets[endpoint] = TokenBucket(capacity, window)
+            return self.buckets[endpoint]
+
+    def _on_response(self, response, *args, **kwargs):
+        """requests のレスポンスフック：レート制限ヘッダーを反映"""
+        values = _rate_limit_headers(response)
+        if values is None:
+            return
+        endpoint = urlparse(getattr(response, 'url', '') or '').path
+        self.bucket(endpoint).sync(*values)
+
+    def _backoff(self, attempt):
+        delay = min(self.max_backoff, self.backoff_base * (2 ** attempt))
+        return delay * (0.5 + random.random() / 2)
+
+    def call(self, func, endpoint=SEARCH_RECENT, idempotent=True, **kwargs):
+        """レート制限内でAPIを呼び出し、失敗時はバックオフして再試行
+
+        idempotent=False（ツイート投稿など）の場合、サーバーエラー・接続エラーは
+        処理済みかどうか分からないため再試行しない（429 は未処理なので再試行する）。
+        """
+        bucket = self.bucket(endpoint)
+        name = ENDPOINT_NAMES.get(endpoint, endpoint)
+        attempt = 0
+        while True:
+            waited = bucket.acquire()
+            if waited:
+                metrics.observe('api.rate_limit_wait_sec', waited)
+            metrics.incr(f'api.{name}.calls')
+            try:
+                return func(**kwargs)
+            except Exception as e:
+                status = _status_code(e)
+                if status == 429:
+                    values = _rate_limit_headers(getattr(e, 'response', None))
+                    if values is not None:
+                        bucket.sync(*values)
+                    delay = self._backoff(attempt)
+                    if values is not None and values[2]:
+                        delay = max(delay, values[2] - time.time() + 1)
+                elif idempotent and ((status is not None and status >= 500) or _is_connection_error(e)):
+                    delay = self._backoff(attempt)
+                else:
+                    raise
+
+                metrics.incr(f'api.{name}.errors.{status or type(e).__name__}')
+                if attempt >= self.max_retries:
+                    raise
+                attempt += 1
+                metrics.observe('api.backoff_sec', delay)
+                time.sleep(delay)
+
+    def paginate(self, func, budget=None, time_limit=None, page_size=100, endpoint=SEARCH_RECENT,
+                 progress=None, **kwargs):
+        """next_token をたどって1件ずつツイートを返すジェネレーター
+
+        budget 件に達するか time_limit 秒を超えたら打ち切る。
+        ページはそのつど捨てるため、メモリ使用量は1ページ分で一定。
+        progress に dict を渡すと、最後のページまで取得できた場合に
+        progress['complete'] = True を設定する。
+        """
+        deadline = time.monotonic() + time_limit if time_limit else None
+        fetched = 0
+        next_token = None
+        while True:
+            max_results = page_size
+            if budget is not None:
+                # search_recent_tweets の max_results は 10〜100
+                max_results = max(10, min(page_size, budget - fetched))
+            if next_token:
+                kwargs['next_token'] = next_token
+
+            response = self.call(func, endpoint=endpoint, max_results=max_results, **kwargs)
+            metrics.incr('tweets.fetched', len(response.data or []))
+            for tweet in response.data or []:
+                yield tweet
+                fetched += 1
+                if budget is not None and fetched >= budget:
+                    return
+
+            next_token = (response.meta or {}).get('next_token')
+            if not next_token:
+                if progress is not None:
+                    progress['complete'] = True
+                return
+            if deadline is not None and time.monotonic() >= deadline:
+                return
+
+    def _run_job(self, job):
+        # 計測時は各ジョブ（ワーカースレッド）の処理をプロファイルに含める
+        with metrics.profiled():
+            return job()
+
+    def run(self, jobs):
+        """{キー: 引数なし関数} を並列実行し (結果, エラー) の辞書を返す"""
+        results = {}
+        errors = {}
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            futures = {key: executor.submit(self._run_job, job) for key, job in jobs.items()}
+            for key, future in futures.items():
+                try:
+                    results[key] = future.result()
+                except Exception as e:
+                    metrics.error(f'job {key}', e)
+                    errors[key] = e
+        return results, errors
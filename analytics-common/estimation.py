@@ -0,0 +1,207 @@
+# -*- coding: utf-8 -*-
+"""件数エンドポイントの総数と標本の有効率から、症状ごとの件数を推定する
+
+症状クエリに一致するツイートの総数は counts/recent（1時間単位）で1回の呼び出しで取り、
+そのうち有効なツイートの割合（有効率）は、期間を strata 個の時間帯に分けて
+各時間帯から少数の標本を取得し、分析クラスの rejection_reason() で判定して求める。
+
+  推定件数 = Σ 時間帯の総数 × 時間帯の有効率
+  信頼区間 = 総数 × 有効率の Wilson 区間（時間帯ごとのばらつきを反映した有効標本数で計算）
+
+検索で全件を取得・判定する場合と比べ、検索の呼び出しは症状×時間帯ごとに1回で済む。
+"""
+import functools
+import math
+from collections import namedtuple
+from datetime import datetime, timezone
+
+import metrics
+from collector import COUNTS_RECENT
+
+SAMPLE_SIZE = 100  # 症状ごとの標本数（時間帯に等分する）
+STRATA = 4         # 標本を取る時間帯の数
+Z_95 = 1.959964    # 95% 信頼区間
+
+
+class Estimate(namedtuple('Estimate', ('volume', 'sampled', 'valid', 'precision', 'low', 'high'))):
+    """1症状の推定結果（volume: 総数、sampled / valid: 標本数 / 有効数、low / high: 推定件数の信頼区間）"""
+
+    @property
+    def count(self):
+        return int(round(self.volume * self.precision))
+
+
+def wilson_interval(p, n, z=Z_95):
+    """割合 p（標本数 n）の Wilson 信頼区間"""
+    if n <= 0:
+        return 0.0, 1.0
+    z2 = z * z
+    center = (p + z2 / (2 * n)) / (1 + z2 / n)
+    half = z * math.sqrt(p * (1 - p) / n + z2 / (4 * n * n)) / (1 + z2 / n)
+    return max(0.0, center - half), min(1.0, center + half)
+
+
+def stratified_estimate(strata, z=Z_95):
+    """[(総数, 標本数, 有効数)] から Estimate を返す
+
+    標本の無い時間帯は、標本のある時間帯の有効率で補う（重みの計算から除く）。
+    """
+    volume = sum(v for v, _, _ in strata)
+    sampled_strata = [(v, n, k) for v, n, k in strata if n > 0]
+    sampled = sum(n for _, n, _ in sampled_strata)
+    valid = sum(k for _, _, k in sampled_strata)
+    weight_total = sum(v for v, _, _ in sampled_strata)
+    if not sampled_strata:
+        return Estimate(volume, 0, 0, 0.0, 0, volume)
+    if volume and all(n >= v for v, n, _ in strata):
+        # 全件を判定できた場合は推定ではなく実数
+        return Estimate(volume, sampled, valid, valid / volume if volume else 0.0, valid, valid)
+    if weight_total == 0:
+        # 総数が取れない（0件）場合は標本だけで割合を出す
+        sampled_strata = [(n, n, k) for _, n, k in sampled_strata]
+        weight_total = sampled
+
+    precision = 0.0
+    variance = 0.0
+    for v, n, k in sampled_strata:
+        w = v / weight_total
+        p = k / n
+        precision += w * p
+        # 有限母集団修正（時間帯の総数に対して標本が多いほど分散は小さい）
+        fpc = (v - n) / (v - 1) if v > n else 0.0
+        variance += w * w * p * (1 - p) / n * fpc
+
+    # 有効標本数（時間帯ごとの重みの偏りを反映。分散が0の場合は標本数そのもの）
+    n_eff = precision * (1 - precision) / variance if variance > 0 else sampled
+    low, high = wilson_interval(precision, n_eff, z)
+    return Estimate(volume, sampled, valid, precision, int(math.floor(volume * low)),
+                    int(math.ceil(volume * high)))
+
+
+def split_window(start_time, end_time, parts):
+    """期間を parts 個の時間帯に分ける（件数の1時間単位の区切りとそろえるため、境界は正時に切り下げる）"""
+    step = (end_time - start_time) / parts
+    bounds = [start_time]
+    for i in range(1, parts):
+        bound = (start_time + step * i).replace(minute=0, second=0, microsecond=0)
+        if bound > bounds[-1]:
+            bounds.append(bound)
+    bounds.append(end_time)
+    return list(zip(bounds, bounds[1:]))
+
+
+def apportion(total, weights):
+    """整数 total を weights に比例して配分する（端数は累積で丸め、合計は total のまま）"""
+    weight_total = sum(weights)
+    if weight_total <= 0:
+        return [0] * len(weights)
+    shares = []
+    cumulative = 0.0
+    assigned = 0
+    for weight in weights:
+        cumulative += weight
+        share = int(round(total * cumulative / weight_total)) - assigned
+        shares.append(share)
+        assigned += share
+    return shares
+
+
+def _as_utc(value):
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value.replace('Z', '+00:00'))
+    return value if value.tzinfo else value.replace(tzinfo=timezone.utc)
+
+
+class SymptomEstimator:
+    """分析クラス（build_symptom_query / rejection_reason / collector / client を持つもの）の推定モード"""
+
+    def __init__(self, analyzer, sample_size=SAMPLE_SIZE, strata=STRATA):
+        self.analyzer = analyzer
+        self.sample_size = sample_size
+        self.strata = strata
+        # run() 後の {症状名: [(時間の開始, 推定件数)]}（推定件数を時間ごとの総数 × 時間帯の有効率で配分）
+        self.hourly = {}
+
+    def hourly_counts(self, query, start_time, end_time):
+        """[(時間の開始, 件数)] を返す（counts/recent を1時間単位で取得）"""
+        collector = self.analyzer.collector
+        counts = []
+        next_token = None
+        while True:
+            kwargs = {'query': query, 'start_time': start_time.isoformat(),
+                      'end_time': end_time.isoformat(), 'granularity': 'hour'}
+            if next_token:
+                kwargs['next_token'] = next_token
+            response = collector.call(self.analyzer.client.get_recent_tweets_count,
+                                      endpoint=COUNTS_RECENT, **kwargs)
+            for bucket in response.data or ():
+                counts.append((_as_utc(bucket['start']), int(bucket['tweet_count'])))
+            next_token = (response.meta or {}).get('next_token')
+            if not next_token:
+                return counts
+
+    def sample(self, query, symptom_name, start_time, end_time, budget):
+        """時間帯の標本を取得して (標本数, 有効数) を返す"""
+        analyzer = self.analyzer
+        sampled = valid = 0
+        for tweet in analyzer.collector.paginate(
+                analyzer.client.search_recent_tweets,
+                budget=budget,
+                time_limit=analyzer.bucket_time_limit,
+                query=query,
+                start_time=start_time.isoformat(),
+                end_time=end_time.isoformat(),
+                tweet_fields=['created_at', 'author_id', 'text']):
+            reason = analyzer.rejection_reason(tweet.text, symptom_name, tweet_id=tweet.id)
+            metrics.classified(reason)
+            sampled += 1
+            if reason is None:
+                valid += 1
+        metrics.incr('estimate.sampled', sampled)
+        return sampled, valid
+
+    def run(self, start_time, end_time):
+        """({症状名: Estimate}, {症状名: 例外}) を返す（件数と標本は並列に取得）"""
+        analyzer = self.analyzer
+        windows = split_window(start_time, end_time, self.strata)
+        # search_recent_tweets の max_results は 10 以上
+        budget = max(10, -(-self.sample_size // self.strata))
+
+        jobs = {}
+        for symptom_name in analyzer.symptom_names:
+            query = analyzer.build_symptom_query(symptom_name)
+            jobs[(symptom_name, 'counts')] = functools.partial(self.hourly_counts, query, start_time, end_time)
+            for i, (window_start, window_end) in enumerate(windows):
+                jobs[(symptom_name, i)] = functools.partial(
+                    self.sample, query, symptom_name, window_start, window_end, budget)
+        results, errors = analyzer.collector.run(jobs)
+
+        estimates = {}
+        failures = {}
+        for symptom_name in analyzer.symptom_names:
+            failed = [e for key, e in errors.items() if key[0] == symptom_name]
+            if failed:
+                failures[symptom_name] = failed[0]
+                continue
+            volumes = [0] * len(windows)
+            bounds = [_as_utc(window_end) for _, window_end in windows]
+            hourly = []
+            for hour, count in results[(symptom_name, 'counts')]:
+                index = next((i for i, bound in enumerate(bounds) if hour < bound), len(windows) - 1)
+                volumes[index] += count
+                hourly.append((hour, count, index))
+            strata = [(volumes[i],) + results[(symptom_name, i)] for i in range(len(windows))]
+            estimate = stratified_estimate(strata)
+            estimates[symptom_name] = estimate
+
+            # 標本の無い時間帯は全体の有効率で配分する
+            rates = [k / n if n else estimate.precision for _, n, k in strata]
+            shares = apportion(estimate.count, [count * rates[index] for _, count, index in hourly])
+            self.hourly[symptom_name] = [(hour, share) for (hour, _, _), share in zip(hourly, shares)]
+        return estimates, failures
+
+
+def format_estimate(symptom_name, estimate):
+    """ログ用の1行（推定件数・信頼区間・総数・有効率）"""
+    return (f"{symptom_name}: 推定{estimate.count:,}件（95%信頼区間 {estimate.low:,}〜{estimate.high:,}件、"
+            f"総数{estimate.volume:,}件 × 有効率{estimate.precision:.1%}、標本{estimate.sampled}件）")
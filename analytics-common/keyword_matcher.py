@@ -0,0 +1,113 @@
+# -*- coding: utf-8 -*-
+"""複数のキーワードリストを1回の走査で照合するマッチャー（Aho-Corasick法）"""
+from collections import deque
+
+from textnorm import HIRA_TO_KATA, base_form, is_katakana_word, normalize
+
+
+class KeywordMatcher:
+    """カテゴリ別のキーワードリストを1つのオートマトンにまとめて照合する
+
+    本文・キーワードとも textnorm で正規化（NFKC・小文字化・カナ畳み込み）してから照合する。
+    「せき」は「セキ」「ｾｷ」にも一致する。ただしカタカナだけのキーワード
+    （スギ・イネ など）は、ひらがなの本文に誤って一致しないよう書かれたとおりにだけ一致させる。
+    正規化すると同じになるキーワードはオートマトン上で1つにまとまる。
+
+    カナの畳み込みは本文を変換せず、ひらがなの遷移に同じ行き先のカタカナの遷移を
+    加えることで行う（本文ごとの変換コストがかからない）。
+    """
+
+    def __init__(self, categories):
+        # categories: {カテゴリ名: [キーワード, ...]}
+        self.categories = tuple(categories)
+        self._goto = [{}]
+        self._fail = [0]
+        self._out = [[]]
+
+        for category, keywords in categories.items():
+            for keyword in keywords:
+                if keyword:
+                    self._add(keyword, category)
+
+        self._build()
+
+    def _add(self, keyword, category):
+        """トライにキーワードを追加（出力は (カテゴリ, キーワード, 照合し直す文字列)）"""
+        exact = base_form(keyword) if is_katakana_word(keyword) else None
+        node = 0
+        for ch in normalize(keyword):
+            nxt = self._goto[node].get(ch)
+            if nxt is None:
+                nxt = len(self._goto)
+                self._goto[node][ch] = nxt
+                self._goto.append({})
+                self._fail.append(0)
+                self._out.append([])
+            node = nxt
+        if (category, keyword, exact) not in self._out[node]:
+            self._out[node].append((category, keyword, exact))
+
+    def _build(self):
+        """失敗リンクを幅優先で張り、出力を失敗先から継承させる"""
+        queue = deque(self._goto[0].values())
+        while queue:
+            node = queue.popleft()
+            for ch, child in self._goto[node].items():
+                queue.append(child)
+                fail = self._fail[node]
+                while fail and ch not in self._goto[fail]:
+                    fail = self._fail[fail]
+                self._fail[child] = self._goto[fail].get(ch, 0)
+                self._out[child].extend(
+                    hit for hit in self._out[self._fail[child]]
+                    if hit not in self._out[child]
+                )
+
+        # カタカナの本文もひらがなと同じ遷移をたどるようにする
+        for edges in self._goto:
+            for ch, child in list(edges.items()):
+                kata = HIRA_TO_KATA.get(ch)
+                if kata is not None:
+                    edges[kata] = child
+
+        # 走査中の参照を軽くするためタプル化
+        self._out = [tuple(hits) for hits in self._out]
+
+    def scan(self, text):
+        """本文を1回走査し {カテゴリ名: {一致したキーワード}} を返す"""
+        goto, fail, out = self._goto, self._fail, self._out
+        text = base_form(text)
+        found = {}
+        node = 0
+        for ch in text:
+            while node and ch not in goto[node]:
+                node = fail[node]
+            node = goto[node].get(ch, 0)
+            for category, keyword, exact in out[node]:
+                # カタカナだけのキーワードは本文に表記どおり含まれるか確認
+                if exact is None or exact in text:
+                    found.setdefault(category, set()).add(keyword)
+        return found
+
+    def match(self, text):
+        """本文に一致したカテゴリ名の集合を返す"""
+        goto, fail, out = self._goto, self._fail, self._out
+        text = base_form(text)
+        matched = set()
+        node = 0
+        for ch in text:
+            while node and ch not in goto[node]:
+                node = fail[node]
+            node = goto[node].get(ch, 0)
+            for category, _, exact in out[node]:
+                if exact is None or exact in text:
+                    matched.add(category)
+        return matched
+
+    def scan_batch(self, texts):
+        """複数の本文をまとめて走査する"""
+        return [self.scan(text) for text in texts]
+
+    def match_batch(self, texts):
+        """複数の本文それぞれの一致カテゴリ集合を返す"""
+        return [self.match(text) for text in texts]
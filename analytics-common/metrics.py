@@ -0,0 +1,218 @@
+# -*- coding: utf-8 -*-
+"""1回の実行の計測値（処理段階ごとの時間・API呼び出し・件数）を記録してJSONに書き出す
+
+実行の入口（各スクリプトの __main__）で start() し、最後に finish() する。
+start() していない間の stage() / incr() などは何もしないため、
+ライブラリとして使う場合やベンチマークでは計測の負荷がかからない。
+
+  stages    段階ごとの回数・合計秒・最大秒（並列の時間帯ジョブは合計が経過時間を超える）
+  counters  件数（API呼び出し回数、取得件数、判定の採用・除外理由別の件数など）
+  values    量の合計・最大（レート制限の待ち秒数、アップロードバイト数など）
+  errors    発生した例外（段階名・種類・メッセージ）
+
+profile_path を指定すると、profiled() で囲んだ処理（収集ジョブ・スクレイプのループ）を
+スレッドごとに cProfile で計測し、まとめて .prof に保存する（上位の関数はJSONにも記録）。
+"""
+import cProfile
+import json
+import os
+import pstats
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime, timezone
+
+PROFILE_TOP = 25  # JSON に残すプロファイル上位の関数数
+
+
+class RunMetrics:
+    """1回の実行の計測値（スレッドセーフ）"""
+
+    def __init__(self, run, path=None, profile_path=None):
+        self.run = run
+        self.path = path
+        self.profile_path = profile_path
+        self.started_at = datetime.now(timezone.utc)
+        self.started = time.perf_counter()
+        self.stages = {}
+        self.counters = {}
+        self.values = {}
+        self.errors = []
+        self.lock = threading.Lock()
+        self.profiles = []
+        self.local = threading.local()
+
+    @contextmanager
+    def stage(self, name):
+        """with で囲んだ処理の時間を段階 name として記録"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            with self.lock:
+                entry = self.stages.setdefault(name, {'count': 0, 'total_sec': 0.0, 'max_sec': 0.0})
+                entry['count'] += 1
+                entry['total_sec'] += elapsed
+                entry['max_sec'] = max(entry['max_sec'], elapsed)
+
+    def incr(self, name, n=1):
+        with self.lock:
+            self.counters[name] = self.counters.get(name, 0) + n
+
+    def observe(self, name, value):
+        """量（秒・バイトなど）を1回分記録"""
+        with self.lock:
+            entry = self.values.setdefault(name, {'count': 0, 'sum': 0, 'max': 0})
+            entry['count'] += 1
+            entry['sum'] += value
+            entry['max'] = max(entry['max'], value)
+
+    def classified(self, reason):
+        """判定結果を記録（reason が None なら採用、それ以外は除外理由）"""
+        self.incr('classify.accepted' if reason is None else 'classify.rejected.' + reason)
+
+    def error(self, stage, exc):
+        with self.lock:
+            self.errors.append({'stage': stage, 'type': type(exc).__name__, 'message': str(exc)})
+
+    @contextmanager
+    def profiled(self):
+        """profile_path 指定時のみ、このスレッドの処理を cProfile で計測（入れ子は外側だけ）"""
+        if not self.profile_path or getattr(self.local, 'profile', None) is not None:
+            yield
+            return
+        profile = cProfile.Profile()
+        self.local.profile = profile
+        profile.enable()
+        try:
+            yield
+        finally:
+            profile.disable()
+            self.local.profile = None
+            with self.lock:
+                self.profiles.append(profile)
+
+    def _profile_summary(self):
+        if not self.profiles:
+            return None
+        stats = pstats.Stats(self.profiles[0])
+        for profile in self.profiles[1:]:
+            stats.add(profile)
+        stats.dump_stats(self.profile_path)
+
+        top = []
+        for (filename, line, func), (_, calls, tottime, cumtime, _) in sorted(
+                stats.stats.items(), key=lambda item: item[1][3], reverse=True)[:PROFILE_TOP]:
+            top.append({
+                'function': f'{os.path.basename(filename)}:{line}({func})',
+                'calls': calls,
+                'tottime_sec': round(tottime, 6),
+                'cumtime_sec': round(cumtime, 6),
+            })
+        return {'path': self.profile_path, 'top': top}
+
+    def snapshot(self):
+        with self.lock:
+            return {
+                'run': self.run,
+                'started_at': self.started_at.isoformat(),
+                'wall_sec': round(time.perf_counter() - self.started, 6),
+                'stages': {
+                    name: {key: round(value, 6) for key, value in entry.items()}
+                    for name, entry in self.stages.items()
+                },
+                'counters': dict(sorted(self.counters.items())),
+                'values': {name: dict(entry) for name, entry in sorted(self.values.items())},
+                'errors': list(self.errors),
+            }
+
+    def write(self):
+        """計測値をJSONに保存（profile_path 指定時は .prof も保存）"""
+        data = self.snapshot()
+        if self.profile_path:
+            data['profile'] = self._profile_summary()
+        if self.path:
+            directory = os.path.dirname(os.path.abspath(self.path))
+            fd, tmp = tempfile.mkstemp(dir=directory, prefix='.metrics-', suffix='.json')
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                json.dump(data, f, ensure_ascii=False, indent=1)
+            os.replace(tmp, self.path)
+        return data
+
+
+class _NullMetrics:
+    """start() していない間に使う、何もしない計測"""
+
+    @contextmanager
+    def stage(self, name):
+        yield
+
+    @contextmanager
+    def profiled(self):
+        yield
+
+    def incr(self, name, n=1):
+        pass
+
+    def observe(self, name, value):
+        pass
+
+    def classified(self, reason):
+        pass
+
+    def error(self, stage, exc):
+        pass
+
+
+_NULL = _NullMetrics()
+_active = None
+
+
+def start(run, path=None, profile_path=None):
+    """計測を開始する（path も profile_path も無ければ計測しない）"""
+    global _active
+    _active = RunMetrics(run, path, profile_path) if (path or profile_path) else None
+    return current()
+
+
+def current():
+    return _active if _active is not None else _NULL
+
+
+def finish():
+    """計測を終了して書き出す"""
+    global _active
+    metrics, _active = _active, None
+    if metrics is None:
+        return None
+    data = metrics.write()
+    if metrics.path:
+        print(f"計測結果を保存: {metrics.path}")
+    return data
+
+
+# 現在の計測への委譲（呼び出し側は metrics.incr(...) のように使う）
+def stage(name):
+    return current().stage(name)
+
+
+def profiled():
+    return current().profiled()
+
+
+def incr(name, n=1):
+    current().incr(name, n)
+
+
+def observe(name, value):
+    current().observe(name, value)
+
+
+def classified(reason):
+    current().classified(reason)
+
+
+def error(stage_name, exc):
+    current().error(stage_name, exc)
@@ -0,0 +1,181 @@
+# -*- coding: utf-8 -*-
+"""コピペ・bot の連投など、ほぼ同じ本文のツイートを逐次取り除くフィルター
+
+本文の文字 n-gram から MinHash（1回のハッシュで全ビンを埋める one permutation hashing）を
+作り、LSH（バンド分割）の索引で似た本文の候補だけを調べる。1件あたりの処理は
+n-gram 数とバンド数に比例し、比べる候補もバンドごとに max_bucket 件までなので
+これまでに見た件数には依存しない。
+
+索引は件数の上限（max_items）と保持時間（ttl 秒）を超えた古いものから捨てる。
+"""
+import operator
+import re
+import threading
+import time
+import zlib
+from collections import OrderedDict
+
+from textnorm import normalize
+
+NUM_PERM = 64      # 署名の長さ（ビン数）
+BANDS = 16         # LSH のバンド数（1バンド = NUM_PERM // BANDS 個の値）
+NGRAM = 3          # 文字 n-gram の長さ
+THRESHOLD = 0.6    # これ以上の推定 Jaccard 係数をほぼ重複とみなす
+MIN_LENGTH = 20    # これより短い本文は判定しない（「熱が出た」などの定型文は別人でも同じになる）
+MAX_ITEMS = 20000  # 索引に残す件数の上限
+MAX_BUCKET = 8     # 1つのバンドの値に残す件数（比べる候補の上限。古いものから外す）
+TTL = 24 * 3600    # 索引に残す秒数
+
+_URL = re.compile(r'https?://\S+')
+_MENTION = re.compile(r'@\w+')
+_SPACE = re.compile(r'\s+')
+
+_EMPTY = 1 << 32
+
+
+def shingles(text, ngram=NGRAM):
+    """URL・メンション・空白を除いて正規化した本文の n-gram 集合"""
+    text = _SPACE.sub('', _MENTION.sub('', _URL.sub('', normalize(text))))
+    if len(text) < ngram:
+        return {text} if text else set()
+    return {text[i:i + ngram] for i in range(len(text) - ngram + 1)}
+
+
+def signature(grams, num_perm=NUM_PERM):
+    """n-gram 集合の MinHash 署名（長さ num_perm のタプル）
+
+    各 n-gram を1回だけハッシュし、下位ビットでビン、残りを値として
+    ビンごとの最小値を取る。空のビンは右隣の値で埋める（densification）。
+    """
+    mins = [_EMPTY] * num_perm
+    for gram in grams:
+        h = zlib.crc32(gram.encode('utf-8'))
+        b = h % num_perm
+        v = h // num_perm
+        if v < mins[b]:
+            mins[b] = v
+    # 右端から左へ1周たどり、空のビンに右側で最も近い値（距離ごとにずらす）を入れる
+    last = num_perm - 1
+    while last >= 0 and mins[last] == _EMPTY:
+        last -= 1
+    if last < 0:
+        return tuple(mins)
+    value, distance = mins[last], 0
+    for b in range(last - 1, last - num_perm, -1):
+        if mins[b] == _EMPTY:
+            distance += 1
+            mins[b] = value + distance * _EMPTY
+        else:
+            value, distance = mins[b], 0
+    return tuple(mins)
+
+
+def similarity(a, b):
+    """署名から推定した Jaccard 係数"""
+    return sum(map(operator.eq, a, b)) / float(len(a))
+
+
+class NearDuplicateFilter:
+    """ほぼ同じ本文を逐次判定するフィルター（スレッドセーフ）
+
+    check(key, text) は、先に見た似た本文のキーを返す（初めての本文なら None を返し索引に追加）。
+    同じキー（ツイートID）で再度呼ばれた場合は前回と同じ結果を返すため、
+    症状ごとの検索で同じツイートが何度出てきても自分自身とは重複にならない。
+    """
+
+    def __init__(self, num_perm=NUM_PERM, bands=BANDS, ngram=NGRAM, threshold=THRESHOLD,
+                 min_length=MIN_LENGTH, max_items=MAX_ITEMS, max_bucket=MAX_BUCKET, ttl=TTL,
+                 clock=time.monotonic):
+        if num_perm % bands:
+            raise ValueError("num_perm は bands で割り切れる必要があります")
+        self.num_perm = num_perm
+        self.bands = bands
+        self.rows = num_perm // bands
+        self.ngram = ngram
+        self.threshold = threshold
+        self.min_length = min_length
+        self.max_items = max_items
+        self.max_bucket = max_bucket
+        self.ttl = ttl
+        self.clock = clock
+        # キー -> (登録時刻, 署名, 重複元のキー または None)
+        self.items = OrderedDict()
+        # バンドのハッシュ -> [キー, ...]（重複でない本文だけを登録）
+        self.index = {}
+        self.lock = threading.Lock()
+        self.checked = 0
+        self.duplicates = 0
+
+    def _band_keys(self, sig):
+        # 隣り合うビンは densification で同じ値から作られやすいため、
+        # バンドは bands 個おきのビンで組む
+        bands = self.bands
+        return [hash((band,) + sig[band::bands]) for band in range(bands)]
+
+    def _evict(self, now):
+        while self.items:
+            key, (added, sig, dup_of) = next(iter(self.items.items()))
+            # これから1件加えるので、上限より1件少なくなるまで捨てる
+            if len(self.items) < self.max_items and now - added <= self.ttl:
+                break
+            self.items.popitem(last=False)
+            if dup_of is None:
+                for band_key in self._band_keys(sig):
+                    keys = self.index.get(band_key)
+                    if keys is None:
+                        continue
+                    try:
+                        keys.remove(key)
+                    except ValueError:
+                        pass
+                    if not keys:
+                        del self.index[band_key]
+
+    def check(self, key, text):
+        """似た本文が先にあればそのキーを、無ければ None を返す"""
+        grams = shingles(text, self.ngram)
+        # 短い本文（同じ文字の繰り返しなど n-gram の種類が少ないものを含む）は対象外
+        if len(grams) + self.ngram - 1 < self.min_length:
+            return None
+
+        sig = signature(grams, self.num_perm)
+        band_keys = self._band_keys(sig)
+        with self.lock:
+            if key is not None and key in self.items:
+                return self.items[key][2]
+
+            now = self.clock()
+            self._evict(now)
+            self.checked += 1
+
+            dup_of = None
+            seen = set()
+            for band_key in band_keys:
+                for candidate in self.index.get(band_key, ()):
+                    if candidate in seen:
+                        continue
+                    seen.add(candidate)
+                    if similarity(sig, self.items[candidate][1]) >= self.threshold:
+                        dup_of = candidate
+                        break
+                if dup_of is not None:
+                    break
+
+            if key is None:
+                key = ('anon', self.checked)
+            self.items[key] = (now, sig, dup_of)
+            if dup_of is None:
+                for band_key in band_keys:
+                    keys = self.index.setdefault(band_key, [])
+                    keys.append(key)
+                    if len(keys) > self.max_bucket:
+                        del keys[0]
+            else:
+                self.duplicates += 1
+            return dup_of
+
+    def is_duplicate(self, key, text):
+        return self.check(key, text) is not None
+
+    def __len__(self):
+        return len(self.items)
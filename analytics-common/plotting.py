@@ -0,0 +1,45 @@
+# -*- coding: utf-8 -*-
+"""matplotlib の遅延読み込み
+
+matplotlib はチャート作成時に初めて読み込む（収集だけの実行や --no-chart では読み込まない）。
+バックエンドは画面なしの Agg、フォント設定はプロセスで1回だけ行う。
+"""
+import functools
+import os
+
+CHART_WIDTH = 1200  # 投稿するチャート画像の幅（ピクセル）
+
+
+@functools.lru_cache(maxsize=1)
+def get_pyplot():
+    """Agg バックエンドで matplotlib.pyplot を読み込んで返す"""
+    import matplotlib
+    # MPLBACKEND が指定されていればそちらを優先
+    if not os.environ.get('MPLBACKEND'):
+        matplotlib.use('Agg')
+    import matplotlib.pyplot as plt
+    return plt
+
+
+@functools.lru_cache(maxsize=None)
+def setup_fonts(*families, japanize=False):
+    """フォントを設定した pyplot を返す（同じ指定では2回目以降何もしない）
+
+    japanize=True の場合は japanize_matplotlib を使い、無ければ families を設定する。
+    """
+    plt = get_pyplot()
+    if japanize:
+        try:
+            import japanize_matplotlib
+            japanize_matplotlib.japanize()
+            return plt
+        except ImportError:
+            pass
+    if families:
+        plt.rcParams['font.family'] = list(families) if len(families) > 1 else families[0]
+    return plt
+
+
+def figure_dpi(fig, width=CHART_WIDTH):
+    """図の幅が width ピクセルになる dpi"""
+    return width / fig.get_figwidth()
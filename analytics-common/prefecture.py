@@ -0,0 +1,161 @@
+# -*- coding: utf-8 -*-
+"""プロフィールの自由記述の地域（「都内」「Tokyo」「札幌在住」など）を都道府県に解決する
+
+都道府県名・主な市区・通称を1つのトライにまとめ、地域の文字列を先頭から走査して
+最初に見つかった（同じ位置なら最長の）都道府県を採用する。「東京都」の中の「京都」のように
+後ろに含まれる地名は使わない。都道府県が見つからず地方だけ分かる場合（「関西」など）は
+地方だけを返す。
+
+同じ地域の文字列は多くのユーザーで繰り返し現れるため、結果をキャッシュする。
+"""
+from collections import namedtuple
+from functools import lru_cache
+
+from textnorm import normalize
+
+CACHE_SIZE = 4096
+
+# code: JIS X 0401 の都道府県コード（'13' など。地方だけ分かる場合は None）
+Place = namedtuple('Place', ('code', 'name', 'region'))
+
+REGIONS = {
+    '北海道': ('01',),
+    '東北': ('02', '03', '04', '05', '06', '07'),
+    '関東': ('08', '09', '10', '11', '12', '13', '14'),
+    '中部': ('15', '16', '17', '18', '19', '20', '21', '22', '23'),
+    '近畿': ('24', '25', '26', '27', '28', '29', '30'),
+    '中国': ('31', '32', '33', '34', '35'),
+    '四国': ('36', '37', '38', '39'),
+    '九州・沖縄': ('40', '41', '42', '43', '44', '45', '46', '47'),
+}
+
+# (コード, 正式名, 別名・主な市区…)。ローマ字は単語として現れた場合だけ一致させる
+PREFECTURES = [
+    ('01', '北海道', 'hokkaido', '道民', '道産子', '札幌', 'sapporo', '函館', '旭川', '小樽', '釧路', '帯広'),
+    ('02', '青森県', '青森', 'aomori', '八戸', '弘前'),
+    ('03', '岩手県', '岩手', 'iwate', '盛岡'),
+    ('04', '宮城県', '宮城', 'miyagi', '仙台', 'sendai'),
+    ('05', '秋田県', '秋田', 'akita'),
+    ('06', '山形県', '山形', 'yamagata'),
+    ('07', '福島県', '福島', 'fukushima', '郡山', 'いわき市'),
+    ('08', '茨城県', '茨城', 'ibaraki', '水戸', 'つくば'),
+    ('09', '栃木県', '栃木', 'tochigi', '宇都宮'),
+    ('10', '群馬県', '群馬', 'gunma', '前橋', '高崎'),
+    ('11', '埼玉県', '埼玉', 'saitama', 'さいたま', '大宮', '浦和', '川越', '所沢', '川口'),
+    ('12', '千葉県', '千葉', 'chiba', '船橋', '松戸', '柏市', '幕張', '浦安'),
+    ('13', '東京都', '東京', 'tokyo', 'とうきょう', '都内', '23区', '新宿', '渋谷', '池袋', '秋葉原',
+     '世田谷', '練馬', '吉祥寺', '八王子', '町田', '立川'),
+    ('14', '神奈川県', '神奈川', 'kanagawa', '横浜', 'yokohama', '川崎', '相模原', '横須賀', '藤沢', '湘南', '鎌倉'),
+    ('15', '新潟県', '新潟', 'niigata'),
+    ('16', '富山県', '富山', 'toyama'),
+    ('17', '石川県', '石川', 'ishikawa', '金沢', 'kanazawa'),
+    ('18', '福井県', '福井', 'fukui'),
+    ('19', '山梨県', '山梨', 'yamanashi', '甲府'),
+    ('20', '長野県', '長野', 'nagano', '松本', '軽井沢'),
+    ('21', '岐阜県', '岐阜', 'gifu'),
+    ('22', '静岡県', '静岡', 'shizuoka', '浜松', '沼津'),
+    ('23', '愛知県', '愛知', 'aichi', '名古屋', 'なごや', 'nagoya', '豊橋', '豊田', '岡崎'),
+    ('24', '三重県', '三重', 'mie', '四日市', '伊勢'),
+    ('25', '滋賀県', '滋賀', 'shiga', '大津'),
+    ('26', '京都府', '京都', 'kyoto'),
+    ('27', '大阪府', '大阪', 'osaka', 'おおさか', '梅田', '難波', 'なんば', '堺', '天王寺'),
+    ('28', '兵庫県', '兵庫', 'hyogo', '神戸', 'kobe', '姫路', '西宮', '尼崎'),
+    ('29', '奈良県', '奈良', 'nara'),
+    ('30', '和歌山県', '和歌山', 'wakayama'),
+    ('31', '鳥取県', '鳥取', 'tottori'),
+    ('32', '島根県', '島根', 'shimane', '松江', '出雲'),
+    ('33', '岡山県', '岡山', 'okayama', '倉敷'),
+    ('34', '広島県', '広島', 'hiroshima', '福山'),
+    ('35', '山口県', '山口', 'yamaguchi', '下関'),
+    ('36', '徳島県', '徳島', 'tokushima'),
+    ('37', '香川県', '香川', 'kagawa', '高松'),
+    ('38', '愛媛県', '愛媛', 'ehime', '松山'),
+    ('39', '高知県', '高知', 'kochi'),
+    ('40', '福岡県', '福岡', 'fukuoka', '北九州', '博多', '天神', '久留米'),
+    ('41', '佐賀県', '佐賀', 'saga'),
+    ('42', '長崎県', '長崎', 'nagasaki', '佐世保'),
+    ('43', '熊本県', '熊本', 'kumamoto'),
+    ('44', '大分県', '大分', 'oita', '別府'),
+    ('45', '宮崎県', '宮崎', 'miyazaki'),
+    ('46', '鹿児島県', '鹿児島', 'kagoshima'),
+    ('47', '沖縄県', '沖縄', 'okinawa', '那覇'),
+]
+
+# 都道府県が決まらない地方名
+REGION_ALIASES = {
+    '東北': '東北', '関東': '関東', '首都圏': '関東', '北陸': '中部', '甲信越': '中部', '東海': '中部',
+    '中部': '中部', '関西': '近畿', '近畿': '近畿', 'kansai': '近畿', '中国地方': '中国', '山陰': '中国',
+    '山陽': '中国', '四国': '四国', '九州': '九州・沖縄', 'kyushu': '九州・沖縄',
+}
+
+_END = ''  # トライの終端キー
+
+
+def _is_word_char(ch):
+    return ch.isascii() and ch.isalnum()
+
+
+class PrefectureResolver:
+    """地域の文字列を Place に解決する（解決できなければ None）"""
+
+    def __init__(self, prefectures=PREFECTURES, region_aliases=REGION_ALIASES, cache_size=CACHE_SIZE):
+        region_of = {code: region for region, codes in REGIONS.items() for code in codes}
+        self.places = {}
+        self.trie = {}
+        for code, name, *aliases in prefectures:
+            place = Place(code, name, region_of[code])
+            self.places[code] = place
+            for alias in (name,) + tuple(aliases):
+                self._add(alias, place)
+        for alias, region in region_aliases.items():
+            self._add(alias, Place(None, None, region))
+
+        # インスタンスごとにキャッシュする（地名表を差し替えたリゾルバーと混ざらない）
+        self.resolve = lru_cache(maxsize=cache_size)(self._resolve)
+
+    def _add(self, alias, place):
+        node = self.trie
+        for ch in normalize(alias):
+            node = node.setdefault(ch, {})
+        node[_END] = place
+
+    def _resolve(self, location):
+        """先頭から走査し、最初に見つかった（同じ位置なら最長の）都道府県を返す"""
+        if not location:
+            return None
+        text = normalize(location)
+        trie = self.trie
+        region_only = None
+        for start in range(len(text)):
+            if start and _is_word_char(text[start]) and _is_word_char(text[start - 1]):
+                continue
+            node = trie
+            found = None
+            for end in range(start, len(text)):
+                node = node.get(text[end])
+                if node is None:
+                    break
+                place = node.get(_END)
+                # ローマ字は後ろも単語の区切りであること（"jamie" の "mie" などを除く）
+                if place is not None and not (
+                    _is_word_char(text[end]) and end + 1 < len(text) and _is_word_char(text[end + 1])
+                ):
+                    found = place
+            if found is None:
+                continue
+            if found.code is not None:
+                return found
+            if region_only is None:
+                region_only = found
+        return region_only
+
+
+_default = None
+
+
+def resolve(location):
+    """既定の地名表で地域の文字列を解決する"""
+    global _default
+    if _default is None:
+        _default = PrefectureResolver()
+    return _default.resolve(location)
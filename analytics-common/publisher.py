@@ -0,0 +1,186 @@
+# -*- coding: utf-8 -*-
+"""集計結果の投稿（認証済みセッションの使い回し・画像の軽量化・再試行つきアップロード）
+
+画像アップロード用の tweepy.API（OAuth1）は認証情報ごとに1つだけ作り、
+同じプロセス内の投稿で接続ごと使い回す。チャート画像は Pillow でパレット化
+（または WebP / JPEG に変換）してから分割アップロードし、レート制限・サーバーエラー・
+接続エラーは RateLimitedCollector と同じバックオフで再試行する。
+ツイートの作成は冪等でないため、再試行するのはレート制限（429）だけにする
+（サーバーエラー・接続エラーでは投稿済みの可能性があり、再送すると二重投稿になる）。
+
+再試行しても投稿できなかった本文と画像は outbox ディレクトリに保存し、
+resend_outbox() で後から送り直せる（集計をやり直さずに済む）。
+"""
+import glob
+import io
+import json
+import os
+import tempfile
+import threading
+from datetime import datetime
+
+import metrics
+from collector import CREATE_TWEET, MEDIA_UPLOAD, RateLimitedCollector
+
+# 形式名 -> (Pillow の形式, 拡張子)
+IMAGE_FORMATS = {
+    'png': ('PNG', '.png'),
+    'webp': ('WEBP', '.webp'),
+    'jpeg': ('JPEG', '.jpg'),
+}
+PALETTE_COLORS = 64  # PNG のパレット色数（棒グラフは数色＋文字のアンチエイリアス）
+WEBP_QUALITY = 90
+JPEG_QUALITY = 88
+
+_sessions = {}
+_sessions_lock = threading.Lock()
+
+
+def v1_api(api_key, api_secret, access_token, access_token_secret):
+    """画像アップロード用の tweepy.API を認証情報ごとに1つだけ作って返す"""
+    key = (api_key, api_secret, access_token, access_token_secret)
+    with _sessions_lock:
+        api = _sessions.get(key)
+        if api is None:
+            import tweepy
+            api = tweepy.API(tweepy.OAuth1UserHandler(*key))
+            _sessions[key] = api
+        return api
+
+
+def optimize_image(image_buffer, image_format='png', colors=PALETTE_COLORS):
+    """チャート画像（PNG）を投稿用に軽くした BytesIO を返す
+
+    png はパレット化して最適化、webp / jpeg は変換する。
+    Pillow が無い場合や、軽くならなかった場合は元の画像をそのまま返す。
+    """
+    image_buffer.seek(0)
+    try:
+        from PIL import Image
+    except ImportError:
+        return image_buffer
+
+    pil_format = IMAGE_FORMATS[image_format][0]
+    output = io.BytesIO()
+    with Image.open(image_buffer) as image:
+        image = image.convert('RGB')
+        if image_format == 'png':
+            image = image.quantize(colors=colors, dither=Image.Dither.NONE)
+            image.save(output, format=pil_format, optimize=True)
+        elif image_format == 'webp':
+            image.save(output, format=pil_format, quality=WEBP_QUALITY, method=6)
+        else:
+            image.save(output, format=pil_format, quality=JPEG_QUALITY, optimize=True, progressive=True)
+
+    image_buffer.seek(0)
+    if image_format == 'png' and output.getbuffer().nbytes >= image_buffer.getbuffer().nbytes:
+        return image_buffer
+    output.seek(0)
+    return output
+
+
+class Publisher:
+    """1つのアカウントへの投稿
+
+    client は投稿に使う tweepy.Client、credentials は画像アップロード用の
+    (api_key, api_secret, access_token, access_token_secret)。
+    collector を渡すと、検索と同じレート制限のバケット・再試行設定を使う。
+    """
+
+    def __init__(self, client, credentials, collector=None, image_format='png', outbox=None,
+                 campaign='post'):
+        if image_format not in IMAGE_FORMATS:
+            raise ValueError(f"未対応の画像形式です: {image_format}")
+        self.client = client
+        self.credentials = credentials
+        self.collector = collector or RateLimitedCollector(client)
+        self.image_format = image_format
+        self.outbox = outbox
+        self.campaign = campaign
+
+    @property
+    def api(self):
+        api = v1_api(*self.credentials)
+        self.collector.watch(getattr(api, 'session', None))
+        return api
+
+    def upload(self, image_buffer, name):
+        """画像を軽くして分割アップロードし、media_id を返す"""
+        image = optimize_image(image_buffer, self.image_format)
+        metrics.observe('upload.original_bytes', image_buffer.getbuffer().nbytes)
+        metrics.observe('upload.bytes', image.getbuffer().nbytes)
+        extension = IMAGE_FORMATS[self.image_format][1] if image is not image_buffer else '.png'
+        api = self.api
+
+        def send():
+            # 再試行のたびに先頭から送り直す
+            image.seek(0)
+            return api.media_upload(filename=name + extension, file=image, chunked=True,
+                                    media_category='tweet_image')
+
+        return self.collector.call(send, endpoint=MEDIA_UPLOAD).media_id
+
+    def post(self, text, image_buffer=None, name='chart', save_on_failure=True):
+        """本文（と画像）を投稿する。失敗した場合は outbox に保存して False を返す"""
+        try:
+            kwargs = {'text': text}
+            # チャートなし（--no-chart）の場合は本文のみ投稿
+            if image_buffer is not None:
+                with metrics.stage('upload'):
+                    kwargs['media_ids'] = [self.upload(image_buffer, name)]
+            # 429 以外の失敗は再試行せず outbox に回す（二重投稿を避ける）
+            response = self.collector.call(self.client.create_tweet, endpoint=CREATE_TWEET,
+                                           idempotent=False, **kwargs)
+            print(f"ツイート投稿成功: {response.data['id']}")
+            return True
+
+        except Exception as e:
+            metrics.error("post", e)
+            print(f"ツイート投稿エラー: {str(e)}")
+            if save_on_failure:
+                self.save_to_outbox(text, image_buffer, name)
+            return False
+
+    def save_to_outbox(self, text, image_buffer=None, name='chart'):
+        """投稿できなかった本文と画像を outbox に保存（outbox 未指定なら何もしない）"""
+        if not self.outbox:
+            return None
+        os.makedirs(self.outbox, exist_ok=True)
+        base = os.path.join(self.outbox, f"{self.campaign}_{datetime.now().strftime('%Y%m%d_%H%M%S_%f')}")
+        entry = {'campaign': self.campaign, 'created_at': datetime.now().isoformat(),
+                 'text': text, 'name': name, 'image': None}
+        if image_buffer is not None:
+            entry['image'] = os.path.basename(base) + '.png'
+            with open(base + '.png', 'wb') as f:
+                f.write(image_buffer.getvalue())
+
+        # 本文は一時ファイルから置き換える（画像より後に書くため、JSON があれば画像も揃っている）
+        fd, tmp = tempfile.mkstemp(dir=self.outbox, prefix='.outbox-', suffix='.json')
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            json.dump(entry, f, ensure_ascii=False, indent=1)
+        os.replace(tmp, base + '.json')
+        print(f"投稿できなかった内容を保存: {base}.json")
+        return base + '.json'
+
+    def resend_outbox(self):
+        """outbox に残っている投稿を古い順に送り直す（成功したものは削除）。(送信数, 残り数) を返す"""
+        if not self.outbox:
+            return 0, 0
+        paths = sorted(glob.glob(os.path.join(self.outbox, f'{self.campaign}_*.json')))
+        sent = 0
+        for path in paths:
+            with open(path, encoding='utf-8') as f:
+                entry = json.load(f)
+            image_path = os.path.join(self.outbox, entry['image']) if entry['image'] else None
+            image_buffer = None
+            if image_path:
+                with open(image_path, 'rb') as f:
+                    image_buffer = io.BytesIO(f.read())
+            if not self.post(entry['text'], image_buffer, entry['name'], save_on_failure=False):
+                # 失敗した場合は順番を保つため以降も送らない
+                break
+            os.remove(path)
+            if image_path:
+                os.remove(image_path)
+            sent += 1
+        return sent, len(paths) - sent
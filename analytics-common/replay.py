@@ -0,0 +1,353 @@
+# -*- coding: utf-8 -*-
+"""ネットワークなしで動かすための記録・再生用ツイートソース
+
+フィクスチャは1行1ツイートのJSONL:
+  {"id": 1, "text": "...", "created_at": "2024-01-01T00:00:00+00:00",
+   "author_id": 1, "location": "東京", "like_count": 0, "retweet_count": 0}
+
+ReplayClient は tweepy.Client、ReplayScraper は snscrape の
+TwitterSearchScraper の代わりに使える。
+"""
+import bisect
+import itertools
+import json
+import threading
+import time
+from collections import deque, namedtuple
+from datetime import datetime, timedelta, timezone
+from functools import lru_cache
+from types import SimpleNamespace
+
+from collector import COUNTS_RECENT, SEARCH_RECENT
+
+# tweepy.Response と同じ形
+Response = namedtuple("Response", ("data", "includes", "errors", "meta"))
+
+
+class FixtureTweet:
+    """tweepy.Tweet / snscrape の Tweet 両方の属性を持つツイート"""
+
+    def __init__(self, record):
+        self.id = int(record['id'])
+        self.text = record['text']
+        self.created_at = _parse_time(record['created_at'])
+        self.author_id = record.get('author_id')
+        self.location = record.get('location') or ''
+        self.like_count = int(record.get('like_count') or 0)
+        self.retweet_count = int(record.get('retweet_count') or 0)
+
+    # snscrape 互換
+    @property
+    def rawContent(self):
+        return self.text
+
+    @property
+    def date(self):
+        return self.created_at
+
+    @property
+    def user(self):
+        return SimpleNamespace(location=self.location)
+
+    @property
+    def likeCount(self):
+        return self.like_count
+
+    @property
+    def retweetCount(self):
+        return self.retweet_count
+
+    def to_record(self):
+        return {
+            'id': self.id, 'text': self.text, 'created_at': self.created_at.isoformat(),
+            'author_id': self.author_id, 'location': self.location,
+            'like_count': self.like_count, 'retweet_count': self.retweet_count,
+        }
+
+
+def _parse_time(value):
+    if isinstance(value, datetime):
+        dt = value
+    else:
+        dt = datetime.fromisoformat(str(value).replace('Z', '+00:00'))
+    return dt if dt.tzinfo is not None else dt.replace(tzinfo=timezone.utc)
+
+
+def load_fixture(path, rebase_to=None):
+    """フィクスチャを読み込み、作成日時の古い順に並べて返す
+
+    rebase_to を指定すると、最新ツイートがその時刻になるよう全体をずらす
+    （相対的な時間分布は保つ）。
+    """
+    with open(path, encoding='utf-8') as f:
+        tweets = [FixtureTweet(json.loads(line)) for line in f if line.strip()]
+    tweets.sort(key=lambda t: (t.created_at, t.id))
+    if rebase_to is not None and tweets:
+        shift = _parse_time(rebase_to) - tweets[-1].created_at
+        for tweet in tweets:
+            tweet.created_at += shift
+    return tweets
+
+
+# ===== 検索クエリの簡易評価 =====
+
+def _tokenize(query):
+    tokens = []
+    for part in query.replace('(', ' ( ').replace(')', ' ) ').split():
+        tokens.append(part)
+    return tokens
+
+
+@lru_cache(maxsize=256)
+def compile_query(query):
+    """検索クエリ（OR / 空白AND / 括弧 / -否定 / is:retweet / lang:）を判定関数にする"""
+    tokens = _tokenize(query)
+    pos = [0]
+
+    def peek():
+        return tokens[pos[0]] if pos[0] < len(tokens) else None
+
+    def take():
+        token = tokens[pos[0]]
+        pos[0] += 1
+        return token
+
+    def parse_or():
+        terms = [parse_and()]
+        while peek() == 'OR':
+            take()
+            terms.append(parse_and())
+        return terms[0] if len(terms) == 1 else (lambda text, fs=terms: any(f(text) for f in fs))
+
+    def parse_and():
+        terms = []
+        while peek() not in (None, 'OR', ')'):
+            terms.append(parse_unary())
+        return lambda text, fs=terms: all(f(text) for f in fs)
+
+    def parse_unary():
+        token = peek()
+        if token == '-':
+            take()
+            inner = parse_unary()
+            return lambda text: not inner(text)
+        if token.startswith('-') and len(token) > 1:
+            tokens[pos[0]] = token[1:]
+            inner = parse_unary()
+            return lambda text: not inner(text)
+        if token == '(':
+            take()
+            inner = parse_or()
+            if peek() == ')':
+                take()
+            return inner
+        return parse_term(take())
+
+    def parse_term(term):
+        if term == 'is:retweet':
+            return lambda text: text.startswith('RT @')
+        if ':' in term and not term.startswith('http'):
+            # lang: などの演算子はフィクスチャ側で満たされているものとする
+            return lambda text: True
+        needle = term.strip('"').lower()
+        return lambda text: needle in text.lower()
+
+    return parse_or()
+
+
+# ===== レート制限の模擬 =====
+
+class ReplayRateLimitError(Exception):
+    """429 Too Many Requests を模した例外（tweepy.TooManyRequests と同じく .response を持つ）"""
+
+    def __init__(self, response):
+        super().__init__("429 Too Many Requests (replay)")
+        self.response = response
+
+
+class _FakeHttpResponse:
+    def __init__(self, status_code, headers, url):
+        self.status_code = status_code
+        self.headers = headers
+        self.url = url
+
+
+class _FixedWindowLimit:
+    def __init__(self, limit, window):
+        self.limit = limit
+        self.window = window
+        self.calls = deque()
+        self.lock = threading.Lock()
+
+    def hit(self):
+        """呼び出しを1回数え、(残り回数, 復帰時刻, 許可されたか) を返す"""
+        now = time.time()
+        with self.lock:
+            while self.calls and self.calls[0] <= now - self.window:
+                self.calls.popleft()
+            reset = int((self.calls[0] if self.calls else now) + self.window)
+            if len(self.calls) >= self.limit:
+                return 0, reset, False
+            self.calls.append(now)
+            return self.limit - len(self.calls), reset, True
+
+
+class ReplayClient:
+    """JSONLフィクスチャから検索結果を返す tweepy.Client の代替
+
+    latency: 1リクエストあたりの疑似遅延（秒）
+    rate_limit: (回数, 秒) を指定すると超過時に429を返す
+    """
+
+    def __init__(self, path, latency=0.0, rate_limit=None, rebase_to=None):
+        self.tweets = load_fixture(path, rebase_to=rebase_to)
+        self.times = [t.created_at for t in self.tweets]
+        self.latency = latency
+        self.limit = _FixedWindowLimit(*rate_limit) if rate_limit else None
+        self.session = SimpleNamespace(hooks={'response': []})
+        self.posted = []
+        self.lock = threading.Lock()
+        self.calls = 0
+        self.rate_limited = 0
+        self.tweets_served = 0
+        self._ids = itertools.count(1)
+
+    def _emit(self, status_code, remaining, reset, path):
+        headers = {}
+        if self.limit is not None:
+            headers = {
+                'x-rate-limit-limit': str(self.limit.limit),
+                'x-rate-limit-remaining': str(remaining),
+                'x-rate-limit-reset': str(reset),
+            }
+        response = _FakeHttpResponse(status_code, headers, 'https://api.twitter.com' + path)
+        for hook in list(self.session.hooks.get('response', [])):
+            hook(response)
+        return response
+
+    def _request(self, path):
+        """疑似遅延とレート制限を適用し (remaining, reset) を返す"""
+        if self.latency:
+            time.sleep(self.latency)
+
+        remaining, reset = 0, 0
+        if self.limit is not None:
+            remaining, reset, allowed = self.limit.hit()
+            if not allowed:
+                with self.lock:
+                    self.rate_limited += 1
+                raise ReplayRateLimitError(self._emit(429, 0, reset, path))
+        return remaining, reset
+
+    def search_recent_tweets(self, query, start_time=None, end_time=None, max_results=10,
+                             next_token=None, **kwargs):
+        remaining, reset = self._request(SEARCH_RECENT)
+
+        lo = bisect.bisect_left(self.times, _parse_time(start_time)) if start_time else 0
+        hi = bisect.bisect_left(self.times, _parse_time(end_time)) if end_time else len(self.times)
+        matches = compile_query(query)
+
+        # 新しい順に返す（APIと同じ）。next_token は次に調べる位置
+        index = int(next_token) if next_token else hi - 1
+        page = []
+        while index >= lo and len(page) < max_results:
+            tweet = self.tweets[index]
+            index -= 1
+            if matches(tweet.text):
+                page.append(tweet)
+
+        while index >= lo and not matches(self.tweets[index].text):
+            index -= 1
+        meta = {'result_count': len(page)}
+        if index >= lo:
+            meta['next_token'] = str(index)
+
+        with self.lock:
+            self.calls += 1
+            self.tweets_served += len(page)
+        self._emit(200, remaining, reset, SEARCH_RECENT)
+        return Response(page or None, {}, [], meta)
+
+    def get_recent_tweets_count(self, query, start_time=None, end_time=None, granularity='hour', **kwargs):
+        """クエリに一致する件数を1時間ごとに返す（granularity は hour のみ対応）"""
+        remaining, reset = self._request(COUNTS_RECENT)
+        start = _parse_time(start_time) if start_time else self.times[0]
+        end = _parse_time(end_time) if end_time else self.times[-1] + timedelta(seconds=1)
+        lo = bisect.bisect_left(self.times, start)
+        hi = bisect.bisect_left(self.times, end)
+        matches = compile_query(query)
+
+        data = []
+        hour_start = start.replace(minute=0, second=0, microsecond=0)
+        while hour_start < end:
+            hour_end = hour_start + timedelta(hours=1)
+            bucket_lo = max(lo, bisect.bisect_left(self.times, hour_start))
+            bucket_hi = min(hi, bisect.bisect_left(self.times, hour_end))
+            data.append({
+                'start': max(hour_start, start).isoformat(),
+                'end': min(hour_end, end).isoformat(),
+                'tweet_count': sum(1 for t in self.tweets[bucket_lo:bucket_hi] if matches(t.text)),
+            })
+            hour_start = hour_end
+
+        with self.lock:
+            self.calls += 1
+        self._emit(200, remaining, reset, COUNTS_RECENT)
+        return Response(data, {}, [], {'total_tweet_count': sum(b['tweet_count'] for b in data)})
+
+    def create_tweet(self, text=None, media_ids=None, **kwargs):
+        tweet_id = f"replay-{next(self._ids)}"
+        self.posted.append({'id': tweet_id, 'text': text, 'media_ids': media_ids})
+        return Response({'id': tweet_id, 'text': text}, {}, [], {})
+
+
+class RecordingClient:
+    """実際の tweepy.Client をラップし、検索結果をフィクスチャに追記する"""
+
+    def __init__(self, client, path):
+        self.client = client
+        self.path = path
+        self.seen = set()
+        self.lock = threading.Lock()
+
+    def __getattr__(self, name):
+        return getattr(self.client, name)
+
+    def search_recent_tweets(self, **kwargs):
+        fields = set(kwargs.get('tweet_fields') or []) | {'created_at', 'author_id'}
+        kwargs['tweet_fields'] = sorted(fields)
+        response = self.client.search_recent_tweets(**kwargs)
+
+        lines = []
+        for tweet in response.data or []:
+            if tweet.id in self.seen:
+                continue
+            self.seen.add(tweet.id)
+            lines.append(json.dumps({
+                'id': tweet.id, 'text': tweet.text,
+                'created_at': tweet.created_at.isoformat() if tweet.created_at else None,
+                'author_id': tweet.author_id,
+            }, ensure_ascii=False))
+        if lines:
+            with self.lock, open(self.path, 'a', encoding='utf-8') as f:
+                f.write('\n'.join(lines) + '\n')
+        return response
+
+
+class ReplayScraper:
+    """snscrape の TwitterSearchScraper の代替。新しい順にツイートを返す"""
+
+    def __init__(self, path, query=None, latency=0.0, rebase_to=None):
+        self.tweets = load_fixture(path, rebase_to=rebase_to)
+        self.matches = compile_query(query) if query else (lambda text: True)
+        self.latency = latency
+        self.tweets_served = 0
+
+    def get_items(self):
+        for tweet in sorted(self.tweets, key=lambda t: t.id, reverse=True):
+            if not self.matches(tweet.text):
+                continue
+            if self.latency:
+                time.sleep(self.latency)
+            self.tweets_served += 1
+            yield tweet
@@ -0,0 +1,227 @@
+# -*- coding: utf-8 -*-
+"""症状 × 都道府県 × 1時間 の有効件数をまとめた集計キューブ
+
+判定済みのツイートを1件ずつ（またはまとめて）加え、期間・症状・都道府県・地方の
+切り出しと合計を、ツイートを読み直さずに返す。件数は1本の array('I')
+（時間枠 × 都道府県 × 症状 の順）に持ち、時間は保持時間分の枠を使い回す
+リングバッファにする（古い時間の枠は新しい時間を書くときに0から使い直す）。
+
+  都道府県  0 は不明（地域が無い・地方だけ分かる場合）、1〜47 は JIS コード
+  時間      UTC の正時（1970-01-01 からの時間数）ごと
+
+save() / load() でファイルに保存し、実行をまたいで使い回す。同じ期間を集計し直す場合は
+先に clear() でその期間の時間を0にしてから加える（再実行しても二重に数えない）。
+"""
+import json
+import os
+import sys
+import tempfile
+import threading
+from array import array
+from datetime import datetime, timedelta, timezone
+
+from prefecture import REGIONS, resolve
+
+RETENTION_HOURS = 24 * 35  # 保持する時間数（平常値の比較に使う5週分）
+PREFECTURES = 48           # 0: 不明、1〜47: 都道府県
+UNKNOWN_REGION = '不明'
+VERSION = 1
+
+_EPOCH = datetime(1970, 1, 1)
+
+
+def _naive_utc(value):
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value.replace('Z', '+00:00'))
+    if value.tzinfo is not None:
+        value = value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
+
+
+def hour_index(value):
+    """datetime / ISO文字列（タイムゾーン無しは UTC）を 1970-01-01 からの時間数にする"""
+    return int((_naive_utc(value) - _EPOCH).total_seconds() // 3600)
+
+
+def hour_start(index):
+    """時間数を UTC の datetime（タイムゾーン無し）に戻す"""
+    return _EPOCH + timedelta(hours=index)
+
+
+def prefecture_index(location):
+    """地域の自由記述・JIS コード（'13' など）を都道府県の番号にする（不明は 0）"""
+    if not location:
+        return 0
+    if isinstance(location, int):
+        return location
+    if len(location) == 2 and location.isdigit() and 1 <= int(location) < PREFECTURES:
+        return int(location)
+    place = resolve(location)
+    return int(place.code) if place is not None and place.code else 0
+
+
+class SymptomCube:
+    """症状 × 都道府県 × 時間 の件数（スレッドセーフ）"""
+
+    def __init__(self, symptoms, hours=RETENTION_HOURS):
+        self.symptoms = list(symptoms)
+        self.symptom_index = {name: i for i, name in enumerate(self.symptoms)}
+        self.hours = hours
+        self.block = PREFECTURES * len(self.symptoms)  # 1時間分の要素数
+        self.counts = array('I', bytes(4 * hours * self.block))
+        # 枠ごとに入っている時間（-1 は未使用）
+        self.slot_hours = array('q', [-1]) * hours
+        self.lock = threading.Lock()
+
+    @classmethod
+    def load(cls, path, symptoms, hours=RETENTION_HOURS):
+        """保存済みのキューブを読み込む（無い場合・症状や保持時間が変わった場合は空から）"""
+        cube = cls(symptoms, hours)
+        if not os.path.exists(path):
+            return cube
+        with open(path, 'rb') as f:
+            header = json.loads(f.readline())
+            if header.get('version') != VERSION or header['symptoms'] != cube.symptoms \
+                    or header['hours'] != hours or header['prefectures'] != PREFECTURES:
+                print(f"キューブの形が変わったため作り直します: {path}")
+                return cube
+            cube.slot_hours = array('q')
+            cube.slot_hours.frombytes(f.read(8 * hours))
+            cube.counts = array('I')
+            cube.counts.frombytes(f.read(4 * hours * cube.block))
+        if header['byteorder'] != sys.byteorder:
+            cube.slot_hours.byteswap()
+            cube.counts.byteswap()
+        return cube
+
+    def save(self, path):
+        """ファイルに保存（一時ファイルから置き換える）"""
+        header = {'version': VERSION, 'symptoms': self.symptoms, 'hours': self.hours,
+                  'prefectures': PREFECTURES, 'byteorder': sys.byteorder}
+        directory = os.path.dirname(os.path.abspath(path))
+        fd, tmp = tempfile.mkstemp(dir=directory, prefix='.cube-', suffix='.bin')
+        with os.fdopen(fd, 'wb') as f:
+            f.write(json.dumps(header, ensure_ascii=False).encode('utf-8') + b'\n')
+            with self.lock:
+                f.write(self.slot_hours.tobytes())
+                f.write(self.counts.tobytes())
+        os.replace(tmp, path)
+
+    def _hours(self, start_time, end_time):
+        """期間 [start_time, end_time) にかかる時間数の range"""
+        first = hour_index(start_time)
+        last = hour_index(end_time)
+        if hour_start(last) < _naive_utc(end_time):
+            last += 1
+        return range(first, last)
+
+    def _slot(self, hour, create=False):
+        """時間の枠の先頭位置（保持していない時間は None。create なら古い枠を使い直す）"""
+        slot = hour % self.hours
+        held = self.slot_hours[slot]
+        if held == hour:
+            return slot * self.block
+        if not create or held > hour:
+            return None
+        base = slot * self.block
+        self.counts[base:base + self.block] = array('I', bytes(4 * self.block))
+        self.slot_hours[slot] = hour
+        return base
+
+    def clear(self, start_time, end_time):
+        """期間にかかる時間の件数を0にする"""
+        with self.lock:
+            for hour in self._hours(start_time, end_time):
+                base = self._slot(hour, create=True)
+                if base is not None:
+                    self.counts[base:base + self.block] = array('I', bytes(4 * self.block))
+
+    def add(self, symptom, created_at, location=None, n=1):
+        self.update({(symptom, created_at, location): n})
+
+    def update(self, counts):
+        """{(症状名, 日時, 地域): 件数} を加える（保持時間より古い日時は加えない）"""
+        cells = {}
+        for (symptom, created_at, location), n in counts.items():
+            key = (hour_index(created_at), prefecture_index(location), self.symptom_index[symptom])
+            cells[key] = cells.get(key, 0) + n
+        with self.lock:
+            for (hour, pref, symptom), n in cells.items():
+                base = self._slot(hour, create=True)
+                if base is not None:
+                    self.counts[base + pref * len(self.symptoms) + symptom] += n
+
+    def _blocks(self, start_time, end_time):
+        """期間内の (時間数, 1時間分の件数) を返す（保持していない時間は除く）"""
+        blocks = []
+        with self.lock:
+            for hour in self._hours(start_time, end_time):
+                base = self._slot(hour)
+                if base is not None:
+                    blocks.append((hour, self.counts[base:base + self.block]))
+        return blocks
+
+    def _rows(self, prefectures):
+        """都道府県コードの並びを行番号にする（None は全国）"""
+        if prefectures is None:
+            return None
+        return sorted({prefecture_index(code) for code in prefectures})
+
+    def _sum(self, block, rows, symptom=None):
+        """1時間分の件数を症状ごと（symptom 指定時はその症状だけ）に合計する"""
+        width = len(self.symptoms)
+        if rows is None:
+            if symptom is not None:
+                return sum(block[symptom::width])
+            return [sum(block[i::width]) for i in range(width)]
+        if symptom is not None:
+            return sum(block[row * width + symptom] for row in rows)
+        totals = [0] * width
+        for row in rows:
+            for i, n in enumerate(block[row * width:(row + 1) * width]):
+                totals[i] += n
+        return totals
+
+    def totals(self, start_time, end_time, prefectures=None):
+        """期間内の {症状名: 件数}（prefectures: 都道府県コードの並びで絞り込み）"""
+        rows = self._rows(prefectures)
+        totals = [0] * len(self.symptoms)
+        for _, block in self._blocks(start_time, end_time):
+            for i, n in enumerate(self._sum(block, rows)):
+                totals[i] += n
+        return dict(zip(self.symptoms, totals))
+
+    def ranking(self, start_time, end_time, prefectures=None):
+        """期間内の [(症状名, 件数)]（件数の多い順）"""
+        return sorted(self.totals(start_time, end_time, prefectures).items(),
+                      key=lambda x: x[1], reverse=True)
+
+    def by_hour(self, start_time, end_time, symptom=None, prefectures=None):
+        """期間内の [(時間の開始（UTC）, 件数)]（symptom 未指定は全症状の合計）"""
+        rows = self._rows(prefectures)
+        index = None if symptom is None else self.symptom_index[symptom]
+        series = []
+        for hour, block in self._blocks(start_time, end_time):
+            total = self._sum(block, rows, index)
+            series.append((hour_start(hour), total if index is not None else sum(total)))
+        return series
+
+    def by_prefecture(self, start_time, end_time, symptom=None):
+        """期間内の {都道府県コード: 件数}（不明は None）"""
+        width = len(self.symptoms)
+        index = None if symptom is None else self.symptom_index[symptom]
+        totals = [0] * PREFECTURES
+        for _, block in self._blocks(start_time, end_time):
+            for row in range(PREFECTURES):
+                cells = block[row * width:(row + 1) * width]
+                totals[row] += cells[index] if index is not None else sum(cells)
+        return {(f'{row:02d}' if row else None): n for row, n in enumerate(totals) if n}
+
+    def by_region(self, start_time, end_time, symptom=None):
+        """期間内の {地方: 件数}（都道府県が不明なものは '不明'）"""
+        by_prefecture = self.by_prefecture(start_time, end_time, symptom)
+        regions = {region: sum(by_prefecture.get(code, 0) for code in codes)
+                   for region, codes in REGIONS.items()}
+        regions[UNKNOWN_REGION] = by_prefecture.get(None, 0)
+        return regions
+
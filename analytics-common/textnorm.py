@@ -0,0 +1,43 @@
+# -*- coding: utf-8 -*-
+"""照合前の日本語テキスト正規化
+
+NFKC（全角英数・半角カナの統一）→ 小文字化 → カタカナをひらがなに畳み込む。
+同じ本文は複数のマッチャー・キャンペーンから何度も照合されるため結果をキャッシュする。
+
+KeywordMatcher はカナの畳み込みをオートマトン側（ひらがな・カタカナの両方の遷移）で
+行うため、本文には base_form（NFKC・小文字化）だけを適用する。
+"""
+import unicodedata
+from functools import lru_cache
+
+CACHE_SIZE = 1024  # 同じ本文を続けて照合する間だけ使えればよい
+
+# ァ(U+30A1)〜ヶ(U+30F6) とひらがなの対応（ヷ〜ヺ・ー などはそのまま）
+HIRA_TO_KATA = {chr(code - 0x60): chr(code) for code in range(0x30A1, 0x30F7)}
+_KATA_TO_HIRA = str.maketrans({kata: hira for hira, kata in HIRA_TO_KATA.items()})
+
+
+@lru_cache(maxsize=CACHE_SIZE)
+def base_form(text):
+    """NFKC で正規化して小文字にした本文"""
+    return unicodedata.normalize('NFKC', text).lower()
+
+
+def fold_kana(text):
+    """カタカナをひらがなにする（文字数は変わらない）"""
+    return text.translate(_KATA_TO_HIRA)
+
+
+def normalize(text):
+    """保存・比較用に正規化した本文（NFKC・小文字化・カナ畳み込み）"""
+    return fold_kana(base_form(text))
+
+
+def is_katakana_word(keyword):
+    """カタカナ（と長音符）だけのキーワードか
+
+    スギ・イネ などは畳み込むと「食べすぎ」「いいね」に一致してしまうため、
+    カタカナだけのキーワードは書かれたとおりのカタカナにだけ一致させる。
+    """
+    base = unicodedata.normalize('NFKC', keyword)
+    return bool(base) and all('ァ' <= ch <= 'ヺ' or ch == 'ー' for ch in base)
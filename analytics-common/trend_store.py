@@ -0,0 +1,219 @@
+# -*- coding: utf-8 -*-
+"""症状ごとの件数の平常値（ベースライン）を実行ごとに逐次更新して保存する
+
+過去の件数そのものは持たず、キャンペーン×症状ごとに
+指数加重移動平均・分散と曜日別の平均だけを JSON に保存する。
+1回の更新は症状数に比例する処理だけで、履歴を読み直すことはない。
+"""
+import json
+import math
+import os
+import tempfile
+import threading
+from collections import namedtuple
+
+# expected: 平常値、ratio: 平常値との比、z: 平常値からのずれ（標準偏差単位）
+Trend = namedtuple("Trend", ("count", "expected", "ratio", "z"))
+
+ALPHA = 0.3           # 全体平均の重み（直近ほど重く）
+SEASONAL_ALPHA = 0.3  # 曜日別平均の重み
+MIN_RUNS = 3          # ベースラインとして使う最小実行回数
+MIN_SEASONAL_RUNS = 2  # 曜日別平均を使う最小回数（その曜日の回数）
+
+_lock = threading.Lock()
+
+
+def _empty():
+    return {"mean": 0.0, "var": 0.0, "n": 0, "dow": {}}
+
+
+def _apply(entry, count, weekday, alpha, seasonal_alpha):
+    """1回分の件数を反映した新しい状態を返す（指数加重の平均・分散）"""
+    entry = {"mean": entry["mean"], "var": entry["var"], "n": entry["n"], "dow": dict(entry["dow"])}
+    if entry["n"] == 0:
+        entry["mean"] = float(count)
+    else:
+        diff = count - entry["mean"]
+        increment = alpha * diff
+        entry["mean"] += increment
+        entry["var"] = (1 - alpha) * (entry["var"] + diff * increment)
+    entry["n"] += 1
+
+    key = str(weekday)
+    mean, n = entry["dow"].get(key, (0.0, 0))
+    mean = float(count) if n == 0 else mean + seasonal_alpha * (count - mean)
+    entry["dow"][key] = (mean, n + 1)
+    return entry
+
+
+class TrendStore:
+    """キャンペーン×症状ごとの平常値を JSON ファイルに保存する"""
+
+    def __init__(self, path, alpha=ALPHA, seasonal_alpha=SEASONAL_ALPHA):
+        self.path = path
+        self.alpha = alpha
+        self.seasonal_alpha = seasonal_alpha
+        self.state = self._load()
+
+    def _load(self):
+        if not os.path.exists(self.path):
+            return {}
+        with open(self.path, encoding="utf-8") as f:
+            return json.load(f)
+
+    def _save(self, state):
+        directory = os.path.dirname(os.path.abspath(self.path))
+        fd, tmp = tempfile.mkstemp(dir=directory, prefix=".trend-", suffix=".json")
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(state, f, ensure_ascii=False, indent=1, sort_keys=True)
+        os.replace(tmp, self.path)
+
+    def compare(self, campaign, symptom, count, day):
+        """day（date）の件数 count を平常値と比べた Trend を返す（履歴不足なら None）"""
+        record = self.state.get(campaign, {}).get("symptoms", {}).get(symptom)
+        if not record:
+            return None
+        entry = record["current"]
+        if entry["n"] < MIN_RUNS:
+            return None
+
+        expected = entry["mean"]
+        seasonal = entry["dow"].get(str(day.weekday()))
+        if seasonal and seasonal[1] >= MIN_SEASONAL_RUNS:
+            expected = seasonal[0]
+
+        # 件数が少ないときにずれを過大に見ないよう、ポアソン分布のばらつきを下限にする
+        scale = max(math.sqrt(entry["var"]), math.sqrt(max(expected, 1.0)))
+        ratio = count / expected if expected > 0 else None
+        return Trend(count, expected, ratio, (count - expected) / scale)
+
+    def compare_all(self, campaign, counts, day):
+        """{症状名: Trend または None}"""
+        return {symptom: self.compare(campaign, symptom, count, day) for symptom, count in counts.items()}
+
+    def update(self, campaign, counts, day):
+        """day の集計結果 {症状名: 件数} を反映して保存する
+
+        同じ日付で再実行した場合は、前回の反映を取り消してから反映し直す。
+        """
+        day_text = day.isoformat()
+        with _lock:
+            # 他のキャンペーンが同じファイルを更新している場合に備えて読み直す
+            state = self._load()
+            symptoms = state.setdefault(campaign, {}).setdefault("symptoms", {})
+            for symptom, count in counts.items():
+                record = symptoms.get(symptom) or {"current": _empty(), "previous": None, "day": None}
+                base = record["previous"] if record["day"] == day_text else record["current"]
+                base = base or _empty()
+                symptoms[symptom] = {
+                    "current": _apply(base, count, day.weekday(), self.alpha, self.seasonal_alpha),
+                    "previous": base,
+                    "day": day_text,
+                }
+            self._save(state)
+            self.state = state
+
+
+def trend_arrow(trend, up=1.0, down=-1.0):
+    """平常値からのずれを矢印にする"""
+    if trend.z >= up:
+        return "📈"
+    if trend.z <= down:
+        return "📉"
+    return "→"
+
+
+def format_change(trend):
+    """平常値との比を「+45%」の形にする"""
+    if trend.ratio is None:
+        return "新規"
+    return f"{(trend.ratio - 1) * 100:+.0f}%"
+
+
+MAX_TWEET_WEIGHT = 280
+
+# X の文字数（twitter-text の重み付き文字数）で1と数える範囲（それ以外は2）
+_LIGHT_RANGES = ((0x0000, 0x10FF), (0x2000, 0x200D), (0x2010, 0x201F), (0x2032, 0x2037))
+
+
+# 絵文字として表示される文字の範囲（ZWJ でつないだ列・肌の色などの修飾を1つとして数える起点）
+_EMOJI_RANGES = (
+    (0x1F000, 0x1FAFF),  # 麻雀牌・顔文字・記号と絵文字など
+    (0x2190, 0x21FF),    # 矢印
+    (0x2300, 0x23FF),    # ⌚ ⏰ など
+    (0x2600, 0x27BF),    # ☀ ⚠ ✅ など
+    (0x2B00, 0x2BFF),    # ⬆ ⭐ など
+    (0x203C, 0x203C), (0x2049, 0x2049), (0x2122, 0x2122), (0x2139, 0x2139),
+    (0x3030, 0x3030), (0x303D, 0x303D), (0x3297, 0x3297), (0x3299, 0x3299),
+)
+
+
+def _is_emoji_modifier(cp):
+    """直前の文字と1つの絵文字として数える修飾（異体字セレクタ・囲み記号・肌の色・タグ）"""
+    return cp in (0xFE0E, 0xFE0F, 0x20E3) or 0x1F3FB <= cp <= 0x1F3FF or 0xE0020 <= cp <= 0xE007F
+
+
+def _is_emoji(cp):
+    return any(lo <= cp <= hi for lo, hi in _EMOJI_RANGES)
+
+
+def tweet_weight(text):
+    """X の重み付き文字数（上限280）
+
+    半角英数などは1、かな・漢字・記号は2。絵文字は修飾（U+FE0F など）や ZWJ でつないだ列、
+    国旗（地域指示記号2文字）も含めて1つ2と数える。絵文字の間以外の ZWJ は表示されないため
+    数えない（URL の短縮は考慮しない）。
+    """
+    weight = 0
+    in_emoji = False   # 直前の文字から絵文字の列が続いているか
+    after_zwj = False  # 絵文字の直後の ZWJ の次か
+    flag_half = False  # 国旗の1文字目の直後か
+    last = 0           # 直前に数えた文字の重み
+    for c in text:
+        cp = ord(c)
+        if cp == 0x200D:
+            after_zwj = in_emoji
+            continue
+        if after_zwj:
+            after_zwj = False
+            if _is_emoji(cp):
+                # ZWJ でつながった絵文字は前の絵文字と合わせて2
+                continue
+        if _is_emoji_modifier(cp):
+            if not in_emoji:
+                # 数字・記号 + U+FE0F などで絵文字になる場合も2にそろえる
+                weight += 2 - last
+                last = 2
+                in_emoji = True
+            continue
+        if 0x1F1E6 <= cp <= 0x1F1FF:
+            if not flag_half:
+                weight += 2
+            flag_half = not flag_half
+            in_emoji = True
+            last = 2
+            continue
+        flag_half = False
+        last = 1 if any(lo <= cp <= hi for lo, hi in _LIGHT_RANGES) else 2
+        weight += last
+        in_emoji = _is_emoji(cp)
+    return weight
+
+
+def truncate_tweet(text, limit=MAX_TWEET_WEIGHT):
+    """重み付き文字数が limit を超える場合は末尾を切り詰めて「…」を付ける"""
+    if tweet_weight(text) <= limit:
+        return text
+    end = len(text)
+    while end and tweet_weight(text[:end].rstrip() + "…") > limit:
+        end -= 1
+    return text[:end].rstrip() + "…"
+
+
+def fit_tweet(candidates, limit=MAX_TWEET_WEIGHT):
+    """本文の候補を順に試し、limit 以内に収まる最初のものを返す（どれも超える場合は最後の候補を切り詰める）"""
+    text = ""
+    for text in candidates:
+        if tweet_weight(text) <= limit:
+            return text
+    return truncate_tweet(text, limit)
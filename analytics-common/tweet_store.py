@@ -0,0 +1,294 @@
+# -*- coding: utf-8 -*-
+"""ツイートIDをキーにしたローカル保存（SQLite）"""
+import sqlite3
+import threading
+from datetime import datetime, timezone
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS tweets (
+    id INTEGER PRIMARY KEY,
+    text TEXT NOT NULL,
+    created_at TEXT,
+    source TEXT,
+    location TEXT,
+    like_count INTEGER,
+    retweet_count INTEGER
+);
+CREATE INDEX IF NOT EXISTS idx_tweets_created_at ON tweets (created_at);
+
+CREATE TABLE IF NOT EXISTS tweet_queries (
+    tweet_id INTEGER NOT NULL,
+    query TEXT NOT NULL,
+    PRIMARY KEY (tweet_id, query)
+);
+CREATE INDEX IF NOT EXISTS idx_tweet_queries_query ON tweet_queries (query);
+
+CREATE TABLE IF NOT EXISTS classifications (
+    tweet_id INTEGER NOT NULL,
+    campaign TEXT NOT NULL,
+    symptom TEXT NOT NULL,
+    valid INTEGER NOT NULL,
+    PRIMARY KEY (tweet_id, campaign, symptom)
+);
+CREATE INDEX IF NOT EXISTS idx_classifications_symptom ON classifications (campaign, symptom);
+
+CREATE TABLE IF NOT EXISTS coverage (
+    query TEXT NOT NULL,
+    start_time TEXT NOT NULL,
+    end_time TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_coverage_query ON coverage (query);
+"""
+
+
+def to_utc_text(value):
+    """datetime / ISO文字列をUTCの 'YYYY-MM-DDTHH:MM:SS' にそろえる"""
+    if value is None:
+        return None
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value.replace('Z', '+00:00'))
+    if value.tzinfo is not None:
+        value = value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value.isoformat(timespec='seconds')
+
+
+def from_utc_text(text):
+    return datetime.fromisoformat(text)
+
+
+class TweetStore:
+    """取得済みツイート・分類結果・取得済み期間をまとめて保存する
+
+    分析（kaze / pollen）とスクレイパーで同じファイルを共有できる。
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.executescript(SCHEMA)
+        self.conn.commit()
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
+
+    def add_tweets(self, tweets, query=None, source='api'):
+        """ツイートを追加（同じIDは1件にまとめる）
+
+        tweets: dict の iterable
+          (id, text, created_at, location, like_count, retweet_count)
+        """
+        rows = [
+            (
+                int(t['id']), t['text'], to_utc_text(t.get('created_at')), source,
+                t.get('location'), t.get('like_count'), t.get('retweet_count'),
+            )
+            for t in tweets
+        ]
+        with self.lock:
+            self.conn.executemany(
+                "INSERT OR IGNORE INTO tweets "
+                "(id, text, created_at, source, location, like_count, retweet_count) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                rows,
+            )
+            if query is not None:
+                self.conn.executemany(
+                    "INSERT OR IGNORE INTO tweet_queries (tweet_id, query) VALUES (?, ?)",
+                    [(row[0], query) for row in rows],
+                )
+            self.conn.commit()
+
+    def set_classifications(self, campaign, results):
+        """分類結果を保存。results: (tweet_id, 症状名, 有効か) の iterable"""
+        with self.lock:
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO classifications (tweet_id, campaign, symptom, valid) "
+                "VALUES (?, ?, ?, ?)",
+                [(int(tweet_id), campaign, symptom, int(bool(valid))) for tweet_id, symptom, valid in results],
+            )
+            self.conn.commit()
+
+    def reclassify(self, campaign, classify, batch_size=1000):
+        """保存済みの全ツイートをAPIを使わずに分類し直す
+
+        classify(text, queries, tweet_id) は (症状名, 有効か) のリストを返す関数。
+        ほぼ重複の判定で古い方が残るよう、投稿日時の順に渡す。
+        結果は一時テーブルにためておき、全件の分類が終わってから1つのトランザクションで
+        差し替える（途中で失敗しても前回の分類結果が残る）。
+        """
+        with self.lock:
+            self.conn.execute(
+                "CREATE TEMP TABLE IF NOT EXISTS reclassify_staging ("
+                "tweet_id INTEGER NOT NULL, campaign TEXT NOT NULL, symptom TEXT NOT NULL, "
+                "valid INTEGER NOT NULL, PRIMARY KEY (tweet_id, campaign, symptom))"
+            )
+            self.conn.execute("DELETE FROM reclassify_staging WHERE campaign = ?", (campaign,))
+            self.conn.commit()
+            cursor = self.conn.execute(
+                "SELECT t.id, t.text, GROUP_CONCAT(q.query, char(31)) "
+                "FROM tweets t LEFT JOIN tweet_queries q ON q.tweet_id = t.id "
+                "GROUP BY t.id ORDER BY t.created_at, t.id"
+            )
+            rows = cursor.fetchmany(batch_size)
+
+        total = 0
+        try:
+            while rows:
+                results = []
+                for tweet_id, text, queries in rows:
+                    query_list = queries.split('\x1f') if queries else []
+                    for symptom, valid in classify(text, query_list, tweet_id):
+                        results.append((int(tweet_id), campaign, symptom, int(bool(valid))))
+                with self.lock:
+                    self.conn.executemany(
+                        "INSERT OR REPLACE INTO reclassify_staging (tweet_id, campaign, symptom, valid) "
+                        "VALUES (?, ?, ?, ?)",
+                        results,
+                    )
+                    self.conn.commit()
+                total += len(rows)
+                with self.lock:
+                    rows = cursor.fetchmany(batch_size)
+
+            with self.lock:
+                self.conn.execute("DELETE FROM classifications WHERE campaign = ?", (campaign,))
+                self.conn.execute(
+                    "INSERT INTO classifications (tweet_id, campaign, symptom, valid) "
+                    "SELECT tweet_id, campaign, symptom, valid FROM reclassify_staging WHERE campaign = ?",
+                    (campaign,),
+                )
+                self.conn.commit()
+        finally:
+            with self.lock:
+                cursor.close()
+                self.conn.execute("DELETE FROM reclassify_staging WHERE campaign = ?", (campaign,))
+                self.conn.commit()
+        return total
+
+    def uncovered(self, query, start_time, end_time):
+        """指定期間のうち、まだ取得していない区間のリストを返す"""
+        start, end = to_utc_text(start_time), to_utc_text(end_time)
+        with self.lock:
+            covered = self.conn.execute(
+                "SELECT start_time, end_time FROM coverage "
+                "WHERE query = ? AND end_time > ? AND start_time < ? ORDER BY start_time",
+                (query, start, end),
+            ).fetchall()
+
+        gaps = []
+        cursor = start
+        for c_start, c_end in covered:
+            if c_start > cursor:
+                gaps.append((cursor, min(c_start, end)))
+            cursor = max(cursor, c_end)
+            if cursor >= end:
+                break
+        if cursor < end:
+            gaps.append((cursor, end))
+        return [(from_utc_text(s), from_utc_text(e)) for s, e in gaps if s < e]
+
+    def mark_covered(self, query, start_time, end_time):
+        """取得済み区間を記録（重なる区間は1つにまとめる）"""
+        start, end = to_utc_text(start_time), to_utc_text(end_time)
+        if start >= end:
+            return
+        with self.lock:
+            overlapping = self.conn.execute(
+                "SELECT rowid, start_time, end_time FROM coverage "
+                "WHERE query = ? AND end_time >= ? AND start_time <= ?",
+                (query, start, end),
+            ).fetchall()
+            for rowid, c_start, c_end in overlapping:
+                start, end = min(start, c_start), max(end, c_end)
+            self.conn.executemany("DELETE FROM coverage WHERE rowid = ?", [(r[0],) for r in overlapping])
+            self.conn.execute(
+                "INSERT INTO coverage (query, start_time, end_time) VALUES (?, ?, ?)",
+                (query, start, end),
+            )
+            self.conn.commit()
+
+    def fill(self, query, start_time, end_time, fetch, on_batch, batch_size=100):
+        """未取得の区間だけ取得して保存する
+
+        fetch(開始, 終了, progress) は新しい順にツイートを返すイテレーター、
+        on_batch(ツイートのリスト) は保存処理。途中で打ち切られた場合は
+        取得できた最古の時刻から終了時刻までを取得済みとして記録する。
+        """
+        fetched = 0
+        for gap_start, gap_end in self.uncovered(query, start_time, end_time):
+            progress = {}
+            oldest = to_utc_text(gap_end)
+            batch = []
+            for tweet in fetch(gap_start, gap_end, progress):
+                batch.append(tweet)
+                created_at = to_utc_text(getattr(tweet, 'created_at', None))
+                if created_at is not None and created_at < oldest:
+                    oldest = created_at
+                if len(batch) >= batch_size:
+                    on_batch(batch)
+                    fetched += len(batch)
+                    batch = []
+            if batch:
+                on_batch(batch)
+                fetched += len(batch)
+
+            self.mark_covered(query, gap_start if progress.get('complete') else oldest, gap_end)
+        return fetched
+
+    def count_by_symptom(self, campaign, start_time, end_time, query=None):
+        """期間内の有効ツイート数を症状ごとに返す（query 指定時はその検索結果に限定）"""
+        sql = (
+            "SELECT c.symptom, COUNT(DISTINCT c.tweet_id) FROM classifications c "
+            "JOIN tweets t ON t.id = c.tweet_id "
+        )
+        params = []
+        if query is not None:
+            sql += "JOIN tweet_queries q ON q.tweet_id = c.tweet_id AND q.query = ? "
+            params.append(query)
+        sql += "WHERE c.campaign = ? AND c.valid = 1 AND t.created_at >= ? AND t.created_at < ? GROUP BY c.symptom"
+        params += [campaign, to_utc_text(start_time), to_utc_text(end_time)]
+
+        with self.lock:
+            return dict(self.conn.execute(sql, params).fetchall())
+
+    def count_by_symptom_hour(self, campaign, start_time, end_time, query=None):
+        """期間内の有効ツイート数を {(症状名, 時間の開始, 地域): 件数} で返す（集計キューブ用）"""
+        sql = (
+            "SELECT c.symptom, substr(t.created_at, 1, 13), t.location, COUNT(DISTINCT c.tweet_id) "
+            "FROM classifications c JOIN tweets t ON t.id = c.tweet_id "
+        )
+        params = []
+        if query is not None:
+            sql += "JOIN tweet_queries q ON q.tweet_id = c.tweet_id AND q.query = ? "
+            params.append(query)
+        sql += ("WHERE c.campaign = ? AND c.valid = 1 AND t.created_at >= ? AND t.created_at < ? "
+                "GROUP BY 1, 2, 3")
+        params += [campaign, to_utc_text(start_time), to_utc_text(end_time)]
+
+        with self.lock:
+            rows = self.conn.execute(sql, params).fetchall()
+        return {(symptom, from_utc_text(hour + ':00:00'), location): n for symptom, hour, location, n in rows}
+
+    def iter_tweets(self, start_time=None, end_time=None, batch_size=1000):
+        """保存済みツイートを (id, text, created_at, location) で順に返す"""
+        sql = "SELECT id, text, created_at, location FROM tweets WHERE 1 = 1"
+        params = []
+        if start_time is not None:
+            sql += " AND created_at >= ?"
+            params.append(to_utc_text(start_time))
+        if end_time is not None:
+            sql += " AND created_at < ?"
+            params.append(to_utc_text(end_time))
+        sql += " ORDER BY id"
+
+        with self.lock:
+            cursor = self.conn.execute(sql, params)
+            rows = cursor.fetchmany(batch_size)
+        while rows:
+            for row in rows:
+                yield row
+            with self.lock:
+                rows = cursor.fetchmany(batch_size)
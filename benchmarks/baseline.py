@@ -0,0 +1,46 @@
+# -*- coding: utf-8 -*-
+"""ベンチマーク結果の保存と基準値との比較"""
+import json
+import os
+
+# 値が大きいほど良い指標（それ以外は小さいほど良い）
+HIGHER_IS_BETTER = {'tweets_per_sec', 'texts_per_sec'}
+
+
+def load(path):
+    """基準値を読み込む（ファイルが無い場合は比較せずに通らないようエラーにする）"""
+    if not path:
+        return {}
+    if not os.path.exists(path):
+        raise SystemExit(f'基準値ファイルがありません: {path}（先に --save-baseline で作成してください）')
+    with open(path, encoding='utf-8') as f:
+        return json.load(f)
+
+
+def save(path, results):
+    """results: {ケース名: {指標名: 値}} を基準値として保存"""
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(results, f, ensure_ascii=False, indent=2, sort_keys=True)
+        f.write('\n')
+
+
+def compare(results, baseline, threshold, metrics):
+    """基準値より threshold（割合）以上悪化した指標のメッセージ一覧を返す"""
+    regressions = []
+    for name, values in results.items():
+        base = baseline.get(name)
+        if not base:
+            continue
+        for metric in metrics:
+            if metric not in values or not base.get(metric):
+                continue
+            current, reference = values[metric], base[metric]
+            if metric in HIGHER_IS_BETTER:
+                change = (reference - current) / reference
+            else:
+                change = (current - reference) / reference
+            if change > threshold:
+                regressions.append(
+                    f'{name}: {metric} {reference:.4g} -> {current:.4g} ({change:+.0%} 悪化)'
+                )
+    return regressions
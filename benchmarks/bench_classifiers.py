@@ -0,0 +1,131 @@
+# -*- coding: utf-8 -*-
+"""判定処理（有効性・頭痛/花粉の文脈判定・症状振り分け）の処理性能を計測する
+
+使い方:
+  python benchmarks/bench_classifiers.py --sizes 1000,100000
+  python benchmarks/bench_classifiers.py --save-baseline benchmarks/classifier_baseline.json
+  python benchmarks/bench_classifiers.py --baseline benchmarks/classifier_baseline.json --threshold 0.2
+
+判定処理を変更したときは、変更前後の数値をこのスクリプトで比較すること。
+"""
+import argparse
+import gc
+import itertools
+import os
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import baseline
+from corpus import ROOT, CorpusGenerator, load_analyzers, load_vocab, parse_mix
+from near_dup import NearDuplicateFilter
+
+DEFAULT_BASELINE = os.path.join(ROOT, 'benchmarks', 'classifier_baseline.json')
+CHUNK = 100000     # 生成と計測を交互に行う単位（メモリを一定に保つ）
+ALLOC_SAMPLE = 2000  # メモリ確保量を測る件数
+
+
+def filters(kaze, pollen):
+    """計測対象: {名前: 1件を判定する関数}"""
+    # ほぼ重複の判定は索引が上限件数まで育った状態も含めて計測する（キーは通し番号）
+    near_dups = NearDuplicateFilter()
+    keys = itertools.count()
+    return {
+        'kaze.is_valid_tweet': lambda text: kaze.is_valid_tweet(text),
+        'kaze.is_valid_tweet(頭痛)': lambda text: kaze.is_valid_tweet(text, "風邪による頭痛"),
+        'kaze.is_cold_related_headache': kaze.is_cold_related_headache,
+        'kaze.classify_symptoms': kaze.classify_symptoms,
+        'pollen.is_valid_tweet': lambda text: pollen.is_valid_tweet(text, None),
+        'pollen.is_pollen_related_symptom': pollen.is_pollen_related_symptom,
+        'pollen.classify_symptoms': pollen.classify_symptoms,
+        'near_dup.check': lambda text: near_dups.check(next(keys), text),
+    }
+
+
+def measure_throughput(func, size, generator_factory):
+    """size 件を判定する時間を計測（コーパス生成の時間は含めない）"""
+    elapsed = 0.0
+    done = 0
+    generator = generator_factory()
+    while done < size:
+        n = min(CHUNK, size - done)
+        texts = list(generator.texts(n))
+        gc.collect()
+        start = time.perf_counter()
+        for text in texts:
+            func(text)
+        elapsed += time.perf_counter() - start
+        done += n
+    return size / elapsed if elapsed else 0.0
+
+
+def measure_allocations(func, texts):
+    """判定中のピーク確保量（KB）と、判定後も残ったメモリブロック数を計測
+
+    残ったブロックはキャッシュやリークの目安になる。
+    """
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    tracemalloc.reset_peak()
+    for text in texts:
+        func(text)
+    _, peak = tracemalloc.get_traced_memory()
+    after = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+
+    retained = sum(stat.count_diff for stat in after.compare_to(before, 'filename') if stat.count_diff > 0)
+    return peak / 1024.0, retained
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='判定処理のマイクロベンチマーク')
+    parser.add_argument('--sizes', default='1000,100000', help='計測件数（カンマ区切り、最大1000万件程度）')
+    parser.add_argument('--mix', help='コーパスの種類の割合（corpus.py と同じ形式）')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--only', help='名前にこの文字列を含む判定だけ計測')
+    parser.add_argument('--baseline', help='比較する基準値ファイル')
+    parser.add_argument('--save-baseline', nargs='?', const=DEFAULT_BASELINE, help='結果を基準値として保存')
+    parser.add_argument('--threshold', type=float, default=0.2, help='悪化とみなす割合')
+    args = parser.parse_args(argv)
+
+    sizes = [int(s) for s in args.sizes.split(',')]
+    mix = parse_mix(args.mix)
+    kaze, pollen = load_analyzers()
+    vocab = load_vocab(kaze, pollen)
+
+    def generator_factory():
+        return CorpusGenerator(vocab, mix, seed=args.seed)
+
+    sample = list(generator_factory().texts(ALLOC_SAMPLE))
+
+    results = {}
+    for name, func in filters(kaze, pollen).items():
+        if args.only and args.only not in name:
+            continue
+        peak_kb, retained = measure_allocations(func, sample)
+        for size in sizes:
+            rate = measure_throughput(func, size, generator_factory)
+            key = f'{name}@{size}'
+            results[key] = {'texts_per_sec': rate, 'peak_alloc_kb': peak_kb, 'retained_blocks': retained}
+            print(f'{key:<45} {rate:>12,.0f}件/秒  ピーク確保 {peak_kb:>8.1f}KB  残存 {retained:>6}ブロック')
+
+    if args.save_baseline:
+        baseline.save(args.save_baseline, results)
+        print(f'基準値を保存: {args.save_baseline}')
+    if args.baseline:
+        regressions = baseline.compare(
+            results, baseline.load(args.baseline), args.threshold,
+            metrics=['texts_per_sec', 'peak_alloc_kb'],
+        )
+        for message in regressions:
+            print(f'性能劣化: {message}')
+        if regressions:
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,141 @@
+# -*- coding: utf-8 -*-
+"""起動時の import 時間を `python -X importtime` の出力から集計する
+
+使い方:
+  python benchmarks/bench_import.py
+  python benchmarks/bench_import.py --target kaze --top 15
+  python benchmarks/bench_import.py --save-baseline
+  python benchmarks/bench_import.py --baseline benchmarks/import_baseline.json --threshold 0.3
+
+モジュール読み込みの時点で重いパッケージ（matplotlib / pandas）が読み込まれていれば
+失敗とする。チャート作成時の matplotlib 読み込みは chart として別に計測する。
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import baseline
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_BASELINE = os.path.join(ROOT, 'benchmarks', 'import_baseline.json')
+
+# 各スクリプトの読み込み時に import されてはいけないパッケージ
+HEAVY_AT_LOAD = ('matplotlib', 'pandas')
+
+_LOAD = (
+    "import importlib.util, sys; sys.path.insert(0, {dir!r}); "
+    "spec = importlib.util.spec_from_file_location('bench_main', {path!r}); "
+    "module = importlib.util.module_from_spec(spec); spec.loader.exec_module(module)"
+)
+
+# 対象: 計測する Python コード
+TARGETS = {
+    'kaze': _LOAD.format(dir=os.path.join(ROOT, 'kaze-analytics'),
+                         path=os.path.join(ROOT, 'kaze-analytics', 'main.py')),
+    'pollen': _LOAD.format(dir=os.path.join(ROOT, 'pollen-analytics'),
+                           path=os.path.join(ROOT, 'pollen-analytics', 'main.py')),
+    'scrape': _LOAD.format(dir=os.path.join(ROOT, 'kaze-analytics-scrape', 'src'),
+                           path=os.path.join(ROOT, 'kaze-analytics-scrape', 'src', 'scrape_to_csv.py')),
+    # チャート作成段階で初めて払うコスト
+    'chart': (
+        f"import sys; sys.path.insert(0, {os.path.join(ROOT, 'analytics-common')!r}); "
+        "import plotting; plotting.get_pyplot()"
+    ),
+}
+
+
+def parse_importtime(stderr):
+    """-X importtime の出力を [(深さ, モジュール名, 自身us, 累積us)] にする"""
+    entries = []
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'imported package' in line:
+            continue
+        fields = line[len('import time:'):].split('|')
+        if len(fields) != 3:
+            continue
+        self_us, cumulative_us, name = fields
+        depth = (len(name) - len(name.lstrip(' ')) - 1) // 2
+        entries.append((depth, name.strip(), int(self_us), int(cumulative_us)))
+    return entries
+
+
+def run_importtime(code):
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', code],
+        capture_output=True, text=True, cwd=ROOT,
+    )
+    entries = parse_importtime(result.stderr)
+    if result.returncode != 0:
+        errors = [line for line in result.stderr.splitlines() if not line.startswith('import time:')]
+        raise RuntimeError('\n'.join(errors[-5:]))
+    return entries
+
+
+def measure(code, startup, repeat):
+    """インタプリタ起動分（startup）を除いた import 時間の中央値と内訳を返す"""
+    totals = []
+    modules = {}
+    loaded = set()
+    for _ in range(repeat):
+        entries = [e for e in run_importtime(code) if e[1] not in startup]
+        top = [e for e in entries if e[0] == 0]
+        totals.append(sum(e[3] for e in top) / 1000.0)
+        for _, name, _, cumulative in top:
+            modules.setdefault(name, []).append(cumulative / 1000.0)
+        loaded.update(e[1].split('.')[0] for e in entries)
+    breakdown = sorted(((statistics.median(v), k) for k, v in modules.items()), reverse=True)
+    return statistics.median(totals), breakdown, loaded
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='起動時の import 時間の計測')
+    parser.add_argument('--target', choices=list(TARGETS) + ['all'], default='all')
+    parser.add_argument('--repeat', type=int, default=5, help='計測回数（中央値を使用）')
+    parser.add_argument('--top', type=int, default=8, help='内訳を表示する件数')
+    parser.add_argument('--baseline', help='比較する基準値ファイル')
+    parser.add_argument('--save-baseline', nargs='?', const=DEFAULT_BASELINE, help='結果を基準値として保存')
+    parser.add_argument('--threshold', type=float, default=0.3, help='悪化とみなす割合')
+    args = parser.parse_args(argv)
+
+    # インタプリタ起動時に読み込まれるモジュールは除外する
+    startup = {name for _, name, _, _ in run_importtime('import importlib.util, sys')}
+
+    targets = list(TARGETS) if args.target == 'all' else [args.target]
+    results = {}
+    failures = []
+    for target in targets:
+        try:
+            total, breakdown, loaded = measure(TARGETS[target], startup, args.repeat)
+        except RuntimeError as e:
+            print(f'[{target}] 読み込み失敗: {e}')
+            failures.append(target)
+            continue
+        results[target] = {'import_ms': total}
+        print(f'[{target}] import {total:.1f}ms')
+        for ms, name in breakdown[:args.top]:
+            print(f'    {name:<30} {ms:8.1f}ms')
+        if target != 'chart':
+            heavy = sorted(loaded & set(HEAVY_AT_LOAD))
+            if heavy:
+                print(f'    読み込み時に重いパッケージを import しています: {", ".join(heavy)}')
+                failures.append(target)
+
+    if args.save_baseline:
+        baseline.save(args.save_baseline, results)
+        print(f'基準値を保存: {args.save_baseline}')
+    if args.baseline:
+        regressions = baseline.compare(results, baseline.load(args.baseline), args.threshold,
+                                       metrics=['import_ms'])
+        for message in regressions:
+            print(f'性能劣化: {message}')
+        if regressions:
+            return 1
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
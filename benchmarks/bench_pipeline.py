@@ -0,0 +1,239 @@
+# -*- coding: utf-8 -*-
+"""分析・スクレイプ処理をオフライン（再生用フィクスチャ）で通しで計測する
+
+使い方:
+  python benchmarks/bench_pipeline.py --fixture benchmarks/fixtures/sample_tweets.jsonl
+  python benchmarks/bench_pipeline.py --target kaze --latency 0.2 --rate-limit 30/60
+  python benchmarks/bench_pipeline.py --save-baseline benchmarks/pipeline_baseline.json
+  python benchmarks/bench_pipeline.py --baseline benchmarks/pipeline_baseline.json --threshold 0.25
+
+各対象は別プロセスで実行し、段階ごとの所要時間・ツイート/秒・ピークRSSを表示する。
+"""
+import argparse
+import contextlib
+import functools
+import importlib.util
+import io
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta, timezone
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, 'analytics-common'))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import baseline
+from replay import ReplayClient, ReplayScraper
+
+DEFAULT_FIXTURE = os.path.join(ROOT, 'benchmarks', 'fixtures', 'sample_tweets.jsonl')
+
+# 対象: (スクリプト, クラス名, {段階名: メソッド名})
+ANALYZERS = {
+    'kaze': (
+        os.path.join(ROOT, 'kaze-analytics', 'main.py'), 'FinalKazeAnalyzer',
+        {'collect': 'collect_symptom_data_with_time_distribution',
+         'chart': 'finish_charts', 'text': 'generate_tweet_text'},
+    ),
+    'pollen': (
+        os.path.join(ROOT, 'pollen-analytics', 'main.py'), 'PollenAnalyzer',
+        {'collect': 'collect_yesterday_pollen_data',
+         'chart': 'finish_charts', 'text': 'generate_pollen_tweet'},
+    ),
+}
+SCRAPER = os.path.join(ROOT, 'kaze-analytics-scrape', 'src', 'scrape_to_csv.py')
+TARGETS = list(ANALYZERS) + ['scrape']
+
+
+def load_module(name, path):
+    """同名の main.py を別名で読み込む"""
+    spec = importlib.util.spec_from_file_location(name, path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def _maxrss_mb(who):
+    rss = resource.getrusage(who).ru_maxrss
+    # Linux は KB、macOS は bytes
+    return rss / (1024 * 1024) if sys.platform == 'darwin' else rss / 1024
+
+
+def peak_rss_mb():
+    """(本体＋子プロセス, 子プロセス) のピークRSS
+
+    子プロセス（チャートの描画プロセス）は終了済みのもののうち最大の1つ分。
+    描画プロセスは run_analysis の終わりで終了を待つため、計測時には回収済み。
+    """
+    children = _maxrss_mb(resource.RUSAGE_CHILDREN)
+    return _maxrss_mb(resource.RUSAGE_SELF) + children, children
+
+
+class StageTimer:
+    """インスタンスのメソッドを包んで段階ごとの所要時間を集計する"""
+
+    def __init__(self):
+        self.stages = {}
+
+    def wrap(self, obj, attr, stage):
+        func = getattr(obj, attr)
+
+        @functools.wraps(func)
+        def timed(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                self.stages[stage] = self.stages.get(stage, 0.0) + time.perf_counter() - start
+
+        setattr(obj, attr, timed)
+
+
+def parse_rate_limit(value):
+    if not value:
+        return None
+    limit, window = value.split('/')
+    return int(limit), float(window)
+
+
+def bench_analyzer(target, args):
+    path, class_name, stages = ANALYZERS[target]
+    module = load_module(f'bench_{target}', path)
+
+    client = ReplayClient(
+        args.fixture, latency=args.latency, rate_limit=parse_rate_limit(args.rate_limit),
+        rebase_to=datetime.now(timezone.utc) - timedelta(minutes=5),
+    )
+    analyzer = getattr(module, class_name)(
+        client=client,
+        consolidate_queries=args.consolidate,
+        max_tweets_per_bucket=args.depth,
+    )
+
+    timer = StageTimer()
+    for stage, method in stages.items():
+        timer.wrap(analyzer, method, stage)
+
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        analyzer.run_analysis(post=False)
+    wall = time.perf_counter() - start
+    rss, child_rss = peak_rss_mb()
+
+    return {
+        'wall': wall,
+        'stages': timer.stages,
+        'api_calls': client.calls,
+        'rate_limited': client.rate_limited,
+        'tweets': client.tweets_served,
+        'tweets_per_sec': client.tweets_served / wall if wall else 0.0,
+        'peak_rss_mb': rss,
+        'child_rss_mb': child_rss,
+    }
+
+
+def bench_scrape(args):
+    sys.path.insert(0, os.path.dirname(SCRAPER))
+    module = load_module('bench_scrape', SCRAPER)
+    module.MAX_TWEETS = args.max_tweets
+    scraper = ReplayScraper(args.fixture, query=module.QUERY, latency=args.latency)
+
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory() as tmp:
+        os.chdir(tmp)
+        try:
+            start = time.perf_counter()
+            with contextlib.redirect_stdout(io.StringIO()):
+                module.run(scraper=scraper)
+            wall = time.perf_counter() - start
+        finally:
+            os.chdir(cwd)
+    rss, child_rss = peak_rss_mb()
+
+    return {
+        'wall': wall,
+        'stages': {'scrape': wall},
+        'tweets': scraper.tweets_served,
+        'tweets_per_sec': scraper.tweets_served / wall if wall else 0.0,
+        'peak_rss_mb': rss,
+        'child_rss_mb': child_rss,
+    }
+
+
+def run_child(target, args):
+    """対象を別プロセスで実行し、結果のJSONを受け取る（RSSを対象ごとに分ける）"""
+    command = [
+        sys.executable, os.path.abspath(__file__), '--child', target,
+        '--fixture', args.fixture, '--latency', str(args.latency),
+        '--depth', str(args.depth), '--max-tweets', str(args.max_tweets),
+    ]
+    if args.rate_limit:
+        command += ['--rate-limit', args.rate_limit]
+    if args.consolidate:
+        command.append('--consolidate')
+    result = subprocess.run(command, capture_output=True, text=True)
+    if result.returncode != 0:
+        raise RuntimeError(f'{target}: {result.stderr.strip()}')
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def print_report(results):
+    for target, r in results.items():
+        print(f'[{target}] 合計 {r["wall"]:.3f}s  {r["tweets"]}件  '
+              f'{r["tweets_per_sec"]:.1f}件/秒  ピークRSS {r["peak_rss_mb"]:.1f}MB'
+              f'（うち子プロセス {r.get("child_rss_mb", 0.0):.1f}MB）')
+        for stage, seconds in r['stages'].items():
+            print(f'    {stage:<8} {seconds:.3f}s')
+        if 'api_calls' in r:
+            print(f'    API呼び出し {r["api_calls"]}回 (レート制限 {r["rate_limited"]}回)')
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='パイプラインのオフライン計測')
+    parser.add_argument('--target', choices=TARGETS + ['all'], default='all')
+    parser.add_argument('--fixture', default=DEFAULT_FIXTURE)
+    parser.add_argument('--latency', type=float, default=0.0, help='1リクエストあたりの疑似遅延（秒）')
+    parser.add_argument('--rate-limit', help='疑似レート制限 回数/秒（例: 180/900）')
+    parser.add_argument('--depth', type=int, default=500)
+    parser.add_argument('--max-tweets', type=int, default=250)
+    parser.add_argument('--consolidate', action='store_true')
+    parser.add_argument('--json', help='結果をJSONで保存')
+    parser.add_argument('--baseline', help='比較する基準値ファイル')
+    parser.add_argument('--save-baseline', help='結果を基準値として保存')
+    parser.add_argument('--threshold', type=float, default=0.25, help='悪化とみなす割合')
+    parser.add_argument('--child', choices=TARGETS, help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.child:
+        result = bench_scrape(args) if args.child == 'scrape' else bench_analyzer(args.child, args)
+        print(json.dumps(result))
+        return 0
+
+    targets = TARGETS if args.target == 'all' else [args.target]
+    results = {target: run_child(target, args) for target in targets}
+    print_report(results)
+
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+    if args.save_baseline:
+        baseline.save(args.save_baseline, results)
+        print(f'基準値を保存: {args.save_baseline}')
+    if args.baseline:
+        regressions = baseline.compare(
+            results, baseline.load(args.baseline), args.threshold,
+            metrics=['wall', 'tweets_per_sec', 'peak_rss_mb'],
+        )
+        for message in regressions:
+            print(f'性能劣化: {message}')
+        if regressions:
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
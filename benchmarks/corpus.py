@@ -0,0 +1,175 @@
+# -*- coding: utf-8 -*-
+"""分析側の辞書から合成ツイートコーパスを作る
+
+症状パターン・ノイズ・除外語は kaze / pollen の分析クラスから読み込むため、
+辞書を変更すればコーパスにも反映される。
+
+使い方:
+  python benchmarks/corpus.py --size 100000 --out /tmp/corpus.jsonl
+  python benchmarks/corpus.py --size 10000000 --out /tmp/corpus.jsonl --mix cold=0.3,pollen=0.2,noise=0.2,exclusion=0.1,retweet=0.05,neutral=0.15
+
+出力は replay.py のフィクスチャ形式（bench_pipeline.py の --fixture に渡せる）。
+"""
+import argparse
+import importlib.util
+import json
+import os
+import random
+import sys
+from datetime import datetime, timedelta, timezone
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, 'analytics-common'))
+
+# 種類ごとの既定の割合
+DEFAULT_MIX = {
+    'cold': 0.30,       # 風邪症状（有効）
+    'pollen': 0.20,     # 花粉症症状（有効）
+    'noise': 0.20,      # 症状＋ノイズ語（除外）
+    'exclusion': 0.10,  # 症状＋他原因・風邪語（文脈判定で除外）
+    'retweet': 0.05,    # RT / リプライ（除外）
+    'neutral': 0.15,    # 症状と無関係
+}
+
+FILLERS = [
+    "今日は", "朝から", "なんか", "やっぱり", "昨夜から", "仕事中に", "電車で",
+    "ずっと", "さっきから", "家族みんな", "久しぶりに", "寝る前に",
+]
+ENDINGS = [
+    "つらい", "しんどい…", "早く寝よう", "薬飲んだ", "病院行ってくる", "最悪",
+    "どうしよう", "明日休みたい", "😷", "🤧", "！", "。",
+]
+NEUTRAL = [
+    "ランチのパスタが美味しかった", "新しいスニーカー買った", "今日は良い天気",
+    "週末はどこに行こうかな", "電車が遅れてる", "コーヒー飲みたい", "猫がかわいい",
+]
+LOCATIONS = ["東京都", "大阪", "Tokyo", "北海道札幌市", "", "福岡", "横浜", "都内", "名古屋市", "沖縄"]
+
+
+def load_analyzers():
+    """kaze / pollen の分析クラスを (kaze, pollen) で返す"""
+    analyzers = []
+    for name, path, class_name in [
+        ('kaze', os.path.join(ROOT, 'kaze-analytics', 'main.py'), 'FinalKazeAnalyzer'),
+        ('pollen', os.path.join(ROOT, 'pollen-analytics', 'main.py'), 'PollenAnalyzer'),
+    ]:
+        spec = importlib.util.spec_from_file_location(f'corpus_{name}', path)
+        module = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(module)
+        # 検索はしないのでクライアントはダミー
+        analyzers.append(getattr(module, class_name)(client=object()))
+    return tuple(analyzers)
+
+
+def load_vocab(kaze=None, pollen=None):
+    """kaze / pollen の分析クラスから辞書を取り出す"""
+    if kaze is None or pollen is None:
+        kaze, pollen = load_analyzers()
+
+    cold_terms = []
+    for groups in kaze.symptom_terms.values():
+        cold_terms.extend(groups)
+    return {
+        'cold_groups': cold_terms,
+        'pollen_terms': [kw for kws in pollen.pollen_symptoms.values() for kw in kws],
+        'pollen_context': list(pollen.pollen_indicators),
+        'noise': sorted(set(kaze.noise_patterns) | set(pollen.noise_words)),
+        'non_cold_headache': list(kaze.non_cold_headache_indicators),
+        'cold_exclusions': list(pollen.cold_exclusions),
+    }
+
+
+def parse_mix(value):
+    if not value:
+        return dict(DEFAULT_MIX)
+    mix = {}
+    for part in value.split(','):
+        key, _, ratio = part.partition('=')
+        if key not in DEFAULT_MIX:
+            raise ValueError(f'不明な種類: {key}')
+        mix[key] = float(ratio)
+    return mix
+
+
+class CorpusGenerator:
+    """種類の割合を指定して合成ツイート本文を作る"""
+
+    def __init__(self, vocab, mix=None, seed=0):
+        self.vocab = vocab
+        self.rng = random.Random(seed)
+        mix = mix or DEFAULT_MIX
+        self.kinds = [k for k, v in mix.items() if v > 0]
+        self.weights = [mix[k] for k in self.kinds]
+
+    def _wrap(self, *parts):
+        rng = self.rng
+        body = "".join(parts)
+        return f"{rng.choice(FILLERS)}{body}{rng.choice(ENDINGS)}"
+
+    def cold(self):
+        group = self.rng.choice(self.vocab['cold_groups'])
+        return self._wrap(*(term + self.rng.choice(["", "で", "と", "が", "、"]) for term in group))
+
+    def pollen(self):
+        return self._wrap(
+            self.rng.choice(self.vocab['pollen_context']), "で",
+            self.rng.choice(self.vocab['pollen_terms']),
+        )
+
+    def noise(self):
+        base = self.cold() if self.rng.random() < 0.5 else self.pollen()
+        return base + self.rng.choice(self.vocab['noise'])
+
+    def exclusion(self):
+        if self.rng.random() < 0.5:
+            return self._wrap("頭痛", self.rng.choice(["と", "、"]),
+                              self.rng.choice(self.vocab['non_cold_headache']), "で風邪かも")
+        return self.pollen() + self.rng.choice(self.vocab['cold_exclusions'])
+
+    def retweet(self):
+        prefix = self.rng.choice(["RT @news_jp: ", "@friend "])
+        return prefix + (self.cold() if self.rng.random() < 0.5 else self.pollen())
+
+    def neutral(self):
+        return self.rng.choice(NEUTRAL) + self.rng.choice(ENDINGS)
+
+    def texts(self, n):
+        """本文を n 件、1件ずつ返す"""
+        makers = [getattr(self, kind) for kind in self.kinds]
+        for _ in range(n):
+            yield self.rng.choices(makers, self.weights)[0]()
+
+    def records(self, n, hours=48, start=None):
+        """フィクスチャ形式のレコードを n 件返す（hours 時間に均等に分布）"""
+        start = start or datetime(2024, 1, 1, tzinfo=timezone.utc)
+        step = hours * 3600.0 / max(n, 1)
+        for i, text in enumerate(self.texts(n)):
+            yield {
+                'id': 1700000000000000000 + i,
+                'text': text,
+                'created_at': (start + timedelta(seconds=i * step)).isoformat(),
+                'author_id': self.rng.randint(1, max(n // 5, 1)),
+                'location': self.rng.choice(LOCATIONS),
+                'like_count': int(self.rng.expovariate(0.2)),
+                'retweet_count': int(self.rng.expovariate(0.5)),
+            }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='合成ツイートコーパスの生成')
+    parser.add_argument('--size', type=int, default=10000)
+    parser.add_argument('--out', required=True)
+    parser.add_argument('--mix', help='種類=割合 をカンマ区切りで（例: cold=0.5,neutral=0.5）')
+    parser.add_argument('--hours', type=float, default=48)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args(argv)
+
+    generator = CorpusGenerator(load_vocab(), parse_mix(args.mix), seed=args.seed)
+    with open(args.out, 'w', encoding='utf-8') as f:
+        for record in generator.records(args.size, hours=args.hours):
+            f.write(json.dumps(record, ensure_ascii=False) + '\n')
+    print(f'{args.size}件 -> {args.out}')
+
+
+if __name__ == '__main__':
+    main()
@@ -1,79 +1,558 @@
-# -*- coding: utf-8 -*-
-import csv
-from datetime import datetime, timedelta, timezone
-import sys
-
-import pandas as pd
-import snscrape.modules.twitter as sntwitter
-
-# ===== 設定 =====
-# 必須: 「風邪」 + いずれかの症状ワード、言語は日本語
-QUERY = '(風邪) (咳 OR 喉 OR 熱 OR 倦怠感 OR 頭痛 OR 鼻水 OR 鼻づまり OR 痰) lang:ja'
-MAX_TWEETS = 250   # 1回の取得上限（控えめに）
-# =================
-
-def jst_now():
-    # JST時刻関数
-    return datetime.now(timezone.utc).astimezone(timezone(timedelta(hours=9)))
-
-def run():
-    jst = jst_now()
-    ts = jst.strftime('%Y%m%d_%H%M')
-    out_csv = f'kaze_{ts}.csv'
-
-    scraper = sntwitter.TwitterSearchScraper(QUERY)
-
-    # 1. 前回の last_id を読み込み
-    last_id = None
-    try:
-        with open("last_id.txt", "r") as f:
-            last_id = int(f.read().strip())
-    except FileNotFoundError:
-        pass
-
-    new_last_id = last_id
-
-    rows = []
-    count = 0
-    for i, tweet in enumerate(scraper.get_items()):
-        # 2. 前回までに取得したものはスキップ
-        if last_id and tweet.id <= last_id:
-            break
-
-        # 3. ツイートを追加
-        rows.append({
-            '日時': tweet.date.astimezone(timezone(timedelta(hours=9))).strftime('%Y-%m-%d %H:%M:%S'),
-            '本文': tweet.rawContent.replace('\n', ' ').replace('\r', ' ').strip(),
-            '地域': tweet.user.location or '',
-            'リツイート数': tweet.retweetCount,
-            'いいね数': tweet.likeCount,
-        })
-        count += 1
-
-        # 4. 上限件数に達したら終了
-        if i >= MAX_TWEETS:
-            break
-
-        # 今回の最大IDを更新
-        if not new_last_id or tweet.id > new_last_id:
-            new_last_id = tweet.id
-
-    # 5. ソートしてCSVに保存
-    df = pd.DataFrame(rows)
-    if not df.empty:
-        df.sort_values(by=['いいね数', 'リツイート数'], ascending=[False, False], inplace=True)
-        df.to_csv(out_csv, index=False, encoding='utf-8-sig', quoting=csv.QUOTE_MINIMAL)
-
-    print(f'[{jst.strftime("%Y-%m-%d %H:%M:%S")}] 取得件数: {count}件 -> {out_csv}')
-
-    # 6. 新しい last_id を保存
-    if new_last_id:
-        with open("last_id.txt", "w") as f:
-            f.write(str(new_last_id))
-
-if __name__ == '__main__':
-    try:
-        run()
-    except Exception as e:
-        print(f'ERROR: {e}', file=sys.stderr)
-        sys.exit(1)
+# -*- coding: utf-8 -*-
+import argparse
+from datetime import datetime, timedelta, timezone
+import heapq
+import json
+import os
+import queue
+import sys
+import threading
+import time
+
+from writers import StreamingCsvWriter, iter_rows, write_atomic
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', 'analytics-common'))
+import metrics
+from tweet_store import TweetStore
+from near_dup import NearDuplicateFilter
+from prefecture import resolve as resolve_prefecture
+
+# ===== 設定 =====
+# 必須: 「風邪」 + いずれかの症状ワード、言語は日本語
+SYMPTOM_TERMS = ('咳', '喉', '熱', '倦怠感', '頭痛', '鼻水', '鼻づまり', '痰')
+QUERY = f'(風邪) ({" OR ".join(SYMPTOM_TERMS)}) lang:ja'
+MAX_TWEETS = 250   # 1回の取得上限（控えめに。シャード取得ではシャードごと）
+STORE_BATCH = 100  # 共有ストアへの書き込み単位
+TOP_N = 100        # いいね数・リツイート数の上位として別ファイルに残す件数
+CHECKPOINT_EVERY = 100  # この件数を取得するごとに途中の出力と取得位置を保存
+LAST_ID_PATH = 'last_id.txt'
+CHECKPOINT_PATH = 'scrape_checkpoint.json'
+SHARD_WORKERS = 4       # シャード取得の同時実行数
+SHARD_TIME_LIMIT = 300  # シャード取得の時間上限（実行開始からの秒数）
+SHARD_STATE_PATH = 'shard_last_ids.json'
+SHARD_WRITTEN_PATH = 'shard_written_ids.json'  # 取り直しになるシャードから書き出し済みのID
+SHARD_QUEUE_SIZE = 100  # シャードごとに取得済みでマージ待ちのツイート数の上限
+# =================
+
+def jst_now():
+    # JST時刻関数
+    return datetime.now(timezone.utc).astimezone(timezone(timedelta(hours=9)))
+
+def _timed_items(items):
+    """取得元から1件ずつ受け取るまでの時間を fetch 段階として記録"""
+    iterator = iter(items)
+    while True:
+        with metrics.stage('fetch'):
+            try:
+                item = next(iterator)
+            except StopIteration:
+                return
+        yield item
+
+def _slotted(items, slots):
+    """slots（セマフォ）を取得している間だけ取得元から次の1件を受け取る（同時に取得するシャード数の制限）"""
+    iterator = iter(items)
+    while True:
+        with slots:
+            try:
+                item = next(iterator)
+            except StopIteration:
+                return
+        yield item
+
+def search_query(max_id=None):
+    """検索クエリ（再開時は max_id: で続きの位置から取得）"""
+    return f'{QUERY} max_id:{max_id}' if max_id else QUERY
+
+def load_checkpoint(path=CHECKPOINT_PATH):
+    try:
+        with open(path, encoding='utf-8') as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+def save_checkpoint(state, path=CHECKPOINT_PATH):
+    write_atomic(path, lambda f: json.dump(state, f, ensure_ascii=False, indent=1))
+
+def _make_writers(output_format, ts, parquet_root):
+    """出力形式に応じたライター（CSVの上位行はヒープで保持し別ファイルへ）"""
+    writers = []
+    if output_format in ('csv', 'both'):
+        writers.append(StreamingCsvWriter(f'kaze_{ts}.csv', top_path=f'kaze_{ts}_top.csv', top_n=TOP_N))
+    if output_format in ('parquet', 'both'):
+        from tweet_dataset import ParquetDatasetWriter
+        writers.append(ParquetDatasetWriter(parquet_root, run_id=ts))
+    return writers
+
+def tweet_row(tweet):
+    """書き出す1行と、自由記述の地域を解決した Place（解決できなければ None）"""
+    location = tweet.user.location or ''
+    # 自由記述の地域を都道府県コード（JIS）・地方に解決（同じ文字列はキャッシュ）
+    place = resolve_prefecture(location)
+    row = {
+        'ツイートID': tweet.id,
+        '日時': tweet.date.astimezone(timezone(timedelta(hours=9))).strftime('%Y-%m-%d %H:%M:%S'),
+        '本文': tweet.rawContent.replace('\n', ' ').replace('\r', ' ').strip(),
+        '地域': location,
+        '都道府県コード': (place and place.code) or '',
+        '地方': (place and place.region) or '',
+        'リツイート数': tweet.retweetCount,
+        'いいね数': tweet.likeCount,
+    }
+    return row, place
+
+def store_record(tweet):
+    """共有ストアに保存する1件"""
+    return {
+        'id': tweet.id,
+        'text': tweet.rawContent,
+        'created_at': tweet.date,
+        'location': tweet.user.location or '',
+        'like_count': tweet.likeCount,
+        'retweet_count': tweet.retweetCount,
+    }
+
+def discard_checkpoint(path=CHECKPOINT_PATH):
+    """中断した実行のチェックポイントと書きかけの出力を削除"""
+    state = load_checkpoint(path)
+    if state is None:
+        return
+    for writer in _make_writers(state['format'], state['run_id'], state['parquet_root']):
+        writer.discard()
+    os.remove(path)
+
+def run(store_path=None, output_format='csv', parquet_root='data/parquet', scraper=None, near_dup=True,
+        resume=True, checkpoint_every=CHECKPOINT_EVERY):
+    """前回の last_id より新しいツイートを新しい順に取得して書き出す
+
+    checkpoint_every 件ごとに、書き出し済みの出力・取得位置（最小ID）・最大IDを
+    チェックポイントに保存する。resume=True でチェックポイントが残っていれば、
+    同じ出力ファイルに追記する形でその位置から取得を続ける（取得済みの分は取り直さない）。
+    """
+    checkpoint = load_checkpoint() if resume else None
+    if checkpoint is not None:
+        # 中断した実行の続き（出力先・形式・前回の last_id はチェックポイントのものを使う）
+        ts = checkpoint['run_id']
+        output_format = checkpoint['format']
+        parquet_root = checkpoint['parquet_root']
+        last_id = checkpoint['since_id']
+        print(f'[再開] {ts} の実行を続けます（取得済み {checkpoint["fetched"]}件'
+              + (f'、ID {checkpoint["cursor"]} より前から）' if checkpoint['cursor'] else '）'))
+    else:
+        discard_checkpoint()
+        ts = jst_now().strftime('%Y%m%d_%H%M')
+        # 1. 前回の last_id を読み込み
+        last_id = None
+        try:
+            with open(LAST_ID_PATH, "r") as f:
+                last_id = int(f.read().strip())
+        except FileNotFoundError:
+            pass
+    out_csv = f'kaze_{ts}.csv'
+
+    cursor = checkpoint['cursor'] if checkpoint else None  # これまでに処理した最小ID
+    new_last_id = checkpoint['high_id'] if checkpoint else last_id
+    fetched = checkpoint['fetched'] if checkpoint else 0
+    count = checkpoint['count'] if checkpoint else 0
+    skipped = checkpoint['skipped'] if checkpoint else 0
+
+    # 取得元（ReplayScraper などに差し替え可能）
+    if scraper is None:
+        import snscrape.modules.twitter as sntwitter
+        scraper = sntwitter.TwitterSearchScraper(search_query(cursor - 1 if cursor else None))
+
+    # 分析側と共有するツイートストア（指定時のみ。IDで重複排除されるため再開時の取り直しも安全）
+    store = TweetStore(store_path) if store_path else None
+    pending = []
+
+    # 取得した順に書き出す
+    writers = _make_writers(output_format, ts, parquet_root)
+
+    # コピペ・bot連投などほぼ同じ本文のツイートは書き出さない（指定時は残す）
+    near_dups = NearDuplicateFilter() if near_dup else None
+
+    if checkpoint is not None:
+        for writer, state in zip(writers, checkpoint['writers']):
+            writer.resume(state)
+        # 再開前に書き出した本文で、ほぼ重複の索引を作り直す（CSV出力時のみ）
+        if near_dups is not None and output_format in ('csv', 'both') and os.path.exists(out_csv + '.part'):
+            for row in iter_rows(out_csv + '.part'):
+                near_dups.check(None, row['本文'])
+
+    def save_progress():
+        nonlocal pending
+        with metrics.stage('checkpoint'):
+            if store is not None and pending:
+                store.add_tweets(pending, query=QUERY, source='scrape')
+                pending = []
+            save_checkpoint({
+                'run_id': ts,
+                'format': output_format,
+                'parquet_root': parquet_root,
+                'since_id': last_id,
+                'high_id': new_last_id,
+                'cursor': cursor,
+                'fetched': fetched,
+                'count': count,
+                'skipped': skipped,
+                'writers': [writer.checkpoint() for writer in writers],
+            })
+        metrics.incr('checkpoint.saved')
+
+    if checkpoint is None:
+        # 最初の1件より前に落ちた場合も書きかけの出力を追跡できるようにする
+        save_progress()
+
+    items = _timed_items(scraper.get_items())
+    if cursor:
+        # max_id: を解釈しない取得元でも、処理済みの位置より新しいものは飛ばす
+        items = (tweet for tweet in items if tweet.id < cursor)
+    for tweet in items:
+        metrics.incr('tweets.fetched')
+        # 2. 前回までに取得したものはスキップ
+        if last_id and tweet.id <= last_id:
+            break
+
+        # 今回の最大ID・処理済みの位置を更新（上限での打ち切りより前に行う）
+        if not new_last_id or tweet.id > new_last_id:
+            new_last_id = tweet.id
+        if not cursor or tweet.id < cursor:
+            cursor = tweet.id
+        fetched += 1
+
+        # 3. ツイートを書き出し（ほぼ重複の本文は件数・ID更新のみ）
+        if near_dups is not None and near_dups.is_duplicate(tweet.id, tweet.rawContent):
+            metrics.incr('tweets.rejected.near_duplicate')
+            skipped += 1
+        else:
+            row, place = tweet_row(tweet)
+            with metrics.stage('write'):
+                for writer in writers:
+                    writer.write(row)
+            metrics.incr('tweets.written')
+            if place is not None and place.code:
+                metrics.incr('location.resolved')
+            count += 1
+
+            if store is not None:
+                pending.append(store_record(tweet))
+                if len(pending) >= STORE_BATCH:
+                    with metrics.stage('store'):
+                        store.add_tweets(pending, query=QUERY, source='scrape')
+                    pending = []
+
+        # 4. 上限件数に達したら終了
+        if fetched >= MAX_TWEETS:
+            break
+
+        if checkpoint_every and fetched % checkpoint_every == 0:
+            save_progress()
+
+    if store is not None:
+        with metrics.stage('store'):
+            if pending:
+                store.add_tweets(pending, query=QUERY, source='scrape')
+            store.close()
+
+    # 5. 出力を閉じる（CSVは書きかけの .part を置き換え、上位行を並べて保存）
+    with metrics.stage('close'):
+        for writer in writers:
+            writer.close()
+
+    outputs = []
+    if output_format in ('csv', 'both'):
+        outputs.append(out_csv)
+    if output_format in ('parquet', 'both'):
+        outputs.append(parquet_root)
+    print(f'[{jst_now().strftime("%Y-%m-%d %H:%M:%S")}] 取得件数: {count}件 -> {", ".join(outputs)}')
+    if skipped:
+        print(f'  ほぼ重複の本文として除外: {skipped}件')
+
+    # 6. 新しい last_id を保存してからチェックポイントを消す（この順なら途中で落ちても取り直しで済む）
+    if new_last_id:
+        write_atomic(LAST_ID_PATH, lambda f: f.write(str(new_last_id)))
+    if os.path.exists(CHECKPOINT_PATH):
+        os.remove(CHECKPOINT_PATH)
+
+_SHARD_END = object()  # シャードの取得スレッドの終了の印
+
+def shard_query(term):
+    """1つの症状ワードに絞ったシャードの検索クエリ"""
+    return f'(風邪) ({term}) lang:ja'
+
+def load_shard_state(path=SHARD_STATE_PATH):
+    """シャードごとの取得済み最大ID {症状ワード: ID}"""
+    try:
+        with open(path, encoding='utf-8') as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+
+class ShardFetch:
+    """1シャードの取得スレッド。since_id より新しいツイートを上限つきのキューで1件ずつ渡す
+
+    マージ側は取得できた分から順に受け取るため、シャード全体をメモリに溜めない。
+    取得は time_limit 秒で打ち切り、その時刻を過ぎても次の1件が届かないシャードは
+    待たずに見捨てる（snscrape の取得中の呼び出しは中断できないため、スレッドはデーモンにする）。
+    slots（セマフォ）を渡すと、取得元から1件受け取る間だけ枠を使う（キューが一杯で待つ間は
+    枠を空けるため、マージ待ちのシャードが他のシャードの取得を止めない）。
+    """
+
+    def __init__(self, term, scraper, since_id, limit=MAX_TWEETS, time_limit=SHARD_TIME_LIMIT, slots=None):
+        self.term = term
+        self.scraper = scraper
+        self.since_id = since_id
+        self.limit = limit
+        self.slots = slots
+        self.deadline = time.monotonic() + time_limit if time_limit else None
+        self.queue = queue.Queue(maxsize=SHARD_QUEUE_SIZE)
+        self.stopped = threading.Event()
+        self.count = 0
+        self.max_id = None
+        self.timed_out = False
+        self.error = None
+        self.thread = threading.Thread(target=self._fetch, name=f'shard-{term}', daemon=True)
+
+    def start(self):
+        self.thread.start()
+        return self
+
+    @property
+    def complete(self):
+        """最後まで（since_id まで、または件数の上限まで）取得できたか"""
+        return self.error is None and not self.timed_out
+
+    def _put(self, item):
+        """キューに入れる（マージ側が見捨てた場合は False）"""
+        while not self.stopped.is_set():
+            try:
+                self.queue.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    def _fetch(self):
+        fetched = 0
+        try:
+            with metrics.profiled():
+                items = _timed_items(self.scraper.get_items())
+                if self.slots is not None:
+                    items = _slotted(items, self.slots)
+                for tweet in items:
+                    if self.since_id and tweet.id <= self.since_id:
+                        break
+                    if not self._put(tweet):
+                        return
+                    fetched += 1
+                    if fetched >= self.limit:
+                        break
+                    if self.deadline is not None and time.monotonic() >= self.deadline:
+                        metrics.incr('shard.time_limited')
+                        self.timed_out = True
+                        break
+        except Exception as e:
+            self.error = e
+        self._put(_SHARD_END)
+
+    def abandon(self):
+        """応答しないシャードを見捨てる（取得位置は進めない）"""
+        if not self.timed_out:
+            metrics.incr('shard.abandoned')
+        self.timed_out = True
+        self.stopped.set()
+
+    def __iter__(self):
+        """取得したツイートを順に返す。時間の上限を過ぎてキューが空になったら打ち切る"""
+        while True:
+            timeout = None if self.deadline is None else max(self.deadline - time.monotonic(), 0)
+            try:
+                item = self.queue.get(timeout=timeout)
+            except queue.Empty:
+                self.abandon()
+                return
+            if item is _SHARD_END:
+                return
+            self.count += 1
+            self.max_id = max(self.max_id or 0, item.id)
+            yield item
+
+def merge_shards(shards):
+    """新しい順の各シャードをIDでk-wayマージし、複数のシャードに現れたツイートは1件にする"""
+    last_id = None
+    for tweet in heapq.merge(*shards, key=lambda tweet: tweet.id, reverse=True):
+        if tweet.id == last_id:
+            metrics.incr('shard.duplicates')
+            continue
+        last_id = tweet.id
+        yield tweet
+
+def load_written_ids(path=SHARD_WRITTEN_PATH):
+    """取り直しになるシャードから前回までに書き出したツイートID"""
+    try:
+        with open(path, encoding='utf-8') as f:
+            return set(json.load(f))
+    except FileNotFoundError:
+        return set()
+
+def run_sharded(store_path=None, output_format='csv', parquet_root='data/parquet', scraper_factory=None,
+                near_dup=True, workers=SHARD_WORKERS, limit=MAX_TWEETS, time_limit=SHARD_TIME_LIMIT,
+                terms=SYMPTOM_TERMS):
+    """症状ワードごとのシャードを並列に取得し、IDの新しい順にマージして書き出す
+
+    全シャードの取得を始め、同時に取得元へ問い合わせるのは workers 個までに制限する
+    （1件受け取るごとに枠を返すため、応答の遅いシャードがあっても空いた枠で他のシャードの取得が進む）。
+    全シャードを1回のマージで書き出す（各シャードは上限つきのキューで渡すため、
+    メモリ使用量は取得件数によらない）。time_limit は実行の開始からの秒数で、全シャードに共通。
+    シャードごとに取得済みの最大IDを SHARD_STATE_PATH に持つ（初回は last_id.txt の値から）。
+    失敗したシャードと、time_limit 秒で打ち切った（または応答しなくなった）シャードは
+    取得位置を進めずに次回取り直す。取り直しで再び届くツイートを二重に書き出さないよう、
+    まだ取り直しの範囲にある書き出し済みのIDを SHARD_WRITTEN_PATH に残して除外する。
+    チェックポイントは使わない。
+    """
+    if scraper_factory is None:
+        import snscrape.modules.twitter as sntwitter
+        scraper_factory = sntwitter.TwitterSearchScraper
+
+    ts = jst_now().strftime('%Y%m%d_%H%M')
+    out_csv = f'kaze_{ts}.csv'
+    last_id = None
+    try:
+        with open(LAST_ID_PATH, "r") as f:
+            last_id = int(f.read().strip())
+    except FileNotFoundError:
+        pass
+    state = load_shard_state()
+    # 前回までに書き出したIDのうち、取り直しで再び届きうるもの（今回の書き出し分も加える）
+    written = load_written_ids()
+
+    store = TweetStore(store_path) if store_path else None
+    pending = []
+    writers = _make_writers(output_format, ts, parquet_root)
+    near_dups = NearDuplicateFilter() if near_dup else None
+    count = 0
+    skipped = 0
+    terms = list(terms)
+    slots = threading.BoundedSemaphore(max(1, workers))
+
+    # 1. 全シャードを（取得元へ同時に問い合わせるのは workers 個まで）取得し、IDの新しい順にマージして書き出す
+    #    （同じツイートは1件、前回までに書き出したツイートとほぼ重複の本文は書き出さない）
+    shards = [ShardFetch(term, scraper_factory(shard_query(term)), state.get(term, last_id), limit,
+                         time_limit, slots).start()
+              for term in terms]
+    for tweet in merge_shards(shards):
+        metrics.incr('tweets.fetched')
+        if tweet.id in written:
+            metrics.incr('shard.duplicates')
+            continue
+        written.add(tweet.id)
+        if near_dups is not None and near_dups.is_duplicate(tweet.id, tweet.rawContent):
+            metrics.incr('tweets.rejected.near_duplicate')
+            skipped += 1
+            continue
+        row, place = tweet_row(tweet)
+        with metrics.stage('write'):
+            for writer in writers:
+                writer.write(row)
+        metrics.incr('tweets.written')
+        if place is not None and place.code:
+            metrics.incr('location.resolved')
+        count += 1
+        if store is not None:
+            pending.append(store_record(tweet))
+            if len(pending) >= STORE_BATCH:
+                with metrics.stage('store'):
+                    store.add_tweets(pending, query=QUERY, source='scrape')
+                pending = []
+
+    for shard in shards:
+        metrics.incr('shard.fetched', shard.count)
+        if shard.error is not None:
+            metrics.error(f'shard {shard.term}', shard.error)
+            metrics.incr('shard.failed')
+            print(f'  シャード「{shard.term}」: 取得失敗 - {shard.error}（{shard.count}件まで取得）')
+        else:
+            note = '（時間の上限で打ち切り）' if shard.timed_out else ''
+            print(f'  シャード「{shard.term}」: {shard.count}件{note}')
+
+    if store is not None:
+        with metrics.stage('store'):
+            if pending:
+                store.add_tweets(pending, query=QUERY, source='scrape')
+            store.close()
+
+    with metrics.stage('close'):
+        for writer in writers:
+            writer.close()
+
+    outputs = []
+    if output_format in ('csv', 'both'):
+        outputs.append(out_csv)
+    if output_format in ('parquet', 'both'):
+        outputs.append(parquet_root)
+    completed = [shard for shard in shards if shard.complete]
+    print(f'[{jst_now().strftime("%Y-%m-%d %H:%M:%S")}] 取得件数: {count}件 -> {", ".join(outputs)}'
+          f'（最後まで取得したシャード {len(completed)}/{len(terms)}）')
+    if skipped:
+        print(f'  ほぼ重複の本文として除外: {skipped}件')
+
+    # 2. 書き出しを終えてから、最後まで取得できたシャードの取得位置を進める
+    #    （打ち切り・失敗したシャードは古い側が残っているため次回取り直す）
+    for shard in completed:
+        if shard.max_id:
+            state[shard.term] = max(state.get(shard.term) or 0, shard.max_id)
+    write_atomic(SHARD_STATE_PATH, lambda f: json.dump(state, f, ensure_ascii=False, indent=1))
+    # 全シャードを最後まで取得できた場合だけ、通常の取得の位置（last_id.txt）も進める
+    if len(completed) == len(terms) and state:
+        last_id = max([last_id or 0] + [state[term] for term in terms if term in state])
+        write_atomic(LAST_ID_PATH, lambda f: f.write(str(last_id)))
+
+    # 3. 次回どのシャードの取得位置よりも新しいIDだけ、書き出し済みとして残す
+    since_ids = [state.get(term, last_id) for term in terms]
+    if None not in since_ids:
+        floor = min(since_ids)
+        written = {tweet_id for tweet_id in written if tweet_id > floor}
+    write_atomic(SHARD_WRITTEN_PATH, lambda f: json.dump(sorted(written), f))
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='風邪関連ツイートをCSVに保存')
+    parser.add_argument('--store', default=os.getenv('TWEET_STORE_PATH'),
+                        help='分析側と共有するSQLiteツイートストア')
+    parser.add_argument('--format', choices=['csv', 'parquet', 'both'], default='csv',
+                        help='出力形式（parquet は日付パーティションのデータセットに追記）')
+    parser.add_argument('--parquet-root', default='data/parquet',
+                        help='Parquetデータセットの保存先')
+    parser.add_argument('--keep-near-duplicates', action='store_true',
+                        help='ほぼ同じ本文のツイート（コピペ・bot連投）も書き出す')
+    parser.add_argument('--no-resume', action='store_true',
+                        help='中断した実行のチェックポイントを捨てて最初から取得する')
+    parser.add_argument('--checkpoint-every', type=int, default=CHECKPOINT_EVERY,
+                        help='途中の出力と取得位置を保存する間隔（件数、0で保存しない）')
+    parser.add_argument('--shards', action='store_true',
+                        help='症状ワードごとのシャードを並列に取得し、IDの順にマージして書き出す（チェックポイントは使わない）')
+    parser.add_argument('--workers', type=int, default=SHARD_WORKERS,
+                        help='取得元へ同時に問い合わせるシャードの数')
+    parser.add_argument('--shard-time-limit', type=float, default=SHARD_TIME_LIMIT,
+                        help='シャード取得の時間上限（実行開始からの秒数、0で上限なし）')
+    parser.add_argument('--metrics', default=os.getenv('METRICS_PATH'),
+                        help='段階ごとの時間・件数を書き出すJSONファイル')
+    parser.add_argument('--profile', help='取得ループの cProfile 結果を保存するファイル（.prof）')
+    args = parser.parse_args()
+
+    metrics.start('scrape', args.metrics, args.profile)
+    try:
+        with metrics.stage('run'), metrics.profiled():
+            if args.shards:
+                run_sharded(store_path=args.store, output_format=args.format, parquet_root=args.parquet_root,
+                            near_dup=not args.keep_near_duplicates, workers=args.workers,
+                            time_limit=args.shard_time_limit)
+            else:
+                run(store_path=args.store, output_format=args.format, parquet_root=args.parquet_root,
+                    near_dup=not args.keep_near_duplicates, resume=not args.no_resume,
+                    checkpoint_every=args.checkpoint_every)
+    except Exception as e:
+        metrics.error('run', e)
+        metrics.finish()
+        print(f'ERROR: {e}', file=sys.stderr)
+        sys.exit(1)
+    metrics.finish()
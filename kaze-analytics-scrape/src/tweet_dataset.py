@@ -0,0 +1,281 @@
+# -*- coding: utf-8 -*-
+"""日付でパーティション分割したParquetデータセット
+
+レイアウト:
+  <root>/date=YYYY-MM-DD/run-<実行時刻>.parquet   … 各実行の書き出し
+  <root>/date=YYYY-MM-DD/run-<実行時刻>-<n>.parquet … チェックポイント以降の書き出し
+  <root>/date=YYYY-MM-DD/compacted.parquet        … 日次コンパクション後
+  <root>/week=YYYY-MM-DD/compacted.parquet        … 週次コンパクション後（週の月曜日）
+
+使い方:
+  python src/tweet_dataset.py compact --root data/parquet --by day
+  python src/tweet_dataset.py compact --root data/parquet --by week
+  python src/tweet_dataset.py query --root data/parquet --start 2024-01-01 --end 2024-01-08 --columns 日時 地域
+"""
+import argparse
+import glob
+import os
+import sys
+from datetime import date, datetime, timedelta, timezone
+
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+
+JST = timezone(timedelta(hours=9))
+
+SCHEMA = pa.schema([
+    ('ツイートID', pa.int64()),
+    ('日時', pa.timestamp('ms', tz='Asia/Tokyo')),
+    ('本文', pa.string()),
+    ('地域', pa.dictionary(pa.int32(), pa.string())),
+    ('都道府県コード', pa.dictionary(pa.int8(), pa.string())),
+    ('地方', pa.dictionary(pa.int8(), pa.string())),
+    ('リツイート数', pa.int32()),
+    ('いいね数', pa.int32()),
+])
+
+BATCH_ROWS = 5000  # 1 row group あたりの行数
+
+
+def _to_table(rows):
+    columns = {
+        'ツイートID': pa.array([r['ツイートID'] for r in rows], pa.int64()),
+        '日時': pa.array(
+            [datetime.strptime(r['日時'], '%Y-%m-%d %H:%M:%S').replace(tzinfo=JST) for r in rows],
+            SCHEMA.field('日時').type,
+        ),
+        '本文': pa.array([r['本文'] for r in rows], pa.string()),
+        '地域': pa.array([r['地域'] for r in rows], pa.string()).dictionary_encode(),
+        '都道府県コード': pa.array([r['都道府県コード'] or None for r in rows], SCHEMA.field('都道府県コード').type),
+        '地方': pa.array([r['地方'] or None for r in rows], SCHEMA.field('地方').type),
+        'リツイート数': pa.array([r['リツイート数'] for r in rows], pa.int32()),
+        'いいね数': pa.array([r['いいね数'] for r in rows], pa.int32()),
+    }
+    return pa.table(columns, schema=SCHEMA)
+
+
+class ParquetDatasetWriter:
+    """行を日付パーティションごとのParquetファイルへ逐次追記する
+
+    StreamingCsvWriter と同じく write(row) / close() / checkpoint() / resume() で使う。
+    書き出し中のファイルは .tmp とし、閉じてから .parquet に置き換えるため、
+    途中で止まっても読み込み対象に壊れたファイルは残らない。
+    checkpoint() はその時点のファイルを閉じ、以降は次の番号のファイルに書く。
+    """
+
+    def __init__(self, root, run_id, batch_rows=BATCH_ROWS):
+        self.root = root
+        self.run_id = run_id
+        self.batch_rows = batch_rows
+        self.buffers = {}
+        self.writers = {}
+        self.count = 0
+        self.segment = 0
+
+    def _segment_path(self, directory):
+        suffix = f'-{self.segment}' if self.segment else ''
+        return os.path.join(directory, f'run-{self.run_id}{suffix}.parquet')
+
+    def write(self, row):
+        day = row['日時'][:10]
+        buffer = self.buffers.setdefault(day, [])
+        buffer.append(row)
+        self.count += 1
+        if len(buffer) >= self.batch_rows:
+            self._flush(day)
+
+    def _flush(self, day):
+        rows = self.buffers.pop(day, None)
+        if not rows:
+            return
+        entry = self.writers.get(day)
+        if entry is None:
+            directory = os.path.join(self.root, f'date={day}')
+            os.makedirs(directory, exist_ok=True)
+            path = self._segment_path(directory)
+            entry = (pq.ParquetWriter(path + '.tmp', SCHEMA, compression='zstd'), path)
+            self.writers[day] = entry
+        entry[0].write_table(_to_table(rows))
+
+    def _close_segment(self):
+        for day in list(self.buffers):
+            self._flush(day)
+        for writer, path in self.writers.values():
+            writer.close()
+            os.replace(path + '.tmp', path)
+        self.writers = {}
+
+    def checkpoint(self):
+        """ここまでの行をファイルに確定し、再開用の状態を返す"""
+        if self.writers or self.buffers:
+            self._close_segment()
+            self.segment += 1
+        return {'segment': self.segment, 'rows': self.count}
+
+    def _run_files(self, pattern):
+        return [path for name in (f'run-{self.run_id}{pattern}', f'run-{self.run_id}-*{pattern}')
+                for path in glob.glob(os.path.join(self.root, '*=*', name))]
+
+    def resume(self, state):
+        """checkpoint() 以降の書きかけのファイルを捨て、次の番号から書き出す"""
+        for path in self._run_files('.parquet.tmp'):
+            os.remove(path)
+        self.segment = state['segment']
+        self.count = state['rows']
+
+    def discard(self):
+        """この実行で書き出したファイルをすべて削除（中断した実行をやり直す場合）"""
+        for path in self._run_files('.parquet.tmp') + self._run_files('.parquet'):
+            os.remove(path)
+
+    def close(self):
+        self._close_segment()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+
+def _partitions(root):
+    """(種別, 開始日, 終了日(含まない), ディレクトリ) のリストを返す"""
+    partitions = []
+    for directory in sorted(glob.glob(os.path.join(root, '*=*'))):
+        kind, _, value = os.path.basename(directory).partition('=')
+        try:
+            start = date.fromisoformat(value)
+        except ValueError:
+            continue
+        if kind == 'date':
+            partitions.append((kind, start, start + timedelta(days=1), directory))
+        elif kind == 'week':
+            partitions.append((kind, start, start + timedelta(days=7), directory))
+    return partitions
+
+
+def _read_file(path, columns=None, filters=None):
+    """1ファイルを読む（列が追加される前のファイルは、無い列を null で補う）"""
+    names = pq.read_schema(path).names
+    wanted = SCHEMA.names if columns is None else list(columns)
+    table = pq.read_table(path, columns=[c for c in wanted if c in names], filters=filters)
+    for name in wanted:
+        if name not in names:
+            field = SCHEMA.field(name)
+            table = table.append_column(field, pa.nulls(table.num_rows, field.type))
+    return table.select(wanted)
+
+
+def _replace_with_compacted(files, directory):
+    """複数ファイルをID順に1ファイルへまとめ、元ファイルを削除"""
+    table = pa.concat_tables([_read_file(path) for path in files])
+    table = table.sort_by('ツイートID')
+
+    os.makedirs(directory, exist_ok=True)
+    target = os.path.join(directory, 'compacted.parquet')
+    tmp = target + '.tmp'
+    pq.write_table(table, tmp, compression='zstd')
+    for path in files:
+        if os.path.abspath(path) != os.path.abspath(target):
+            os.remove(path)
+    os.replace(tmp, target)
+    return table.num_rows
+
+
+def compact(root, by='day'):
+    """小さな実行ファイルを日次または週次のファイルにまとめる"""
+    merged = 0
+    if by == 'day':
+        for kind, start, _, directory in _partitions(root):
+            files = sorted(glob.glob(os.path.join(directory, '*.parquet')))
+            if kind != 'date' or len(files) < 2:
+                continue
+            rows = _replace_with_compacted(files, directory)
+            print(f'{os.path.basename(directory)}: {len(files)}ファイル -> 1ファイル ({rows}行)')
+            merged += 1
+    elif by == 'week':
+        weeks = {}
+        for kind, start, _, directory in _partitions(root):
+            monday = start - timedelta(days=start.weekday())
+            weeks.setdefault(monday, []).extend(sorted(glob.glob(os.path.join(directory, '*.parquet'))))
+        for monday, files in sorted(weeks.items()):
+            target_dir = os.path.join(root, f'week={monday.isoformat()}')
+            if len(files) < 2:
+                continue
+            rows = _replace_with_compacted(files, target_dir)
+            for directory in {os.path.dirname(path) for path in files}:
+                if directory != target_dir and not os.listdir(directory):
+                    os.rmdir(directory)
+            print(f'week={monday.isoformat()}: {len(files)}ファイル -> 1ファイル ({rows}行)')
+            merged += 1
+    else:
+        raise ValueError(f'by は day か week: {by}')
+    return merged
+
+
+def _as_jst(value):
+    """date は JST の0時、タイムゾーンなしの datetime は JST とみなす"""
+    if not isinstance(value, datetime):
+        return datetime.combine(value, datetime.min.time(), JST)
+    return value if value.tzinfo is not None else value.replace(tzinfo=JST)
+
+
+def read_range(root, start, end, columns=None):
+    """[start, end) の行を、必要なパーティションと列だけ読んで返す"""
+    start_dt, end_dt = _as_jst(start), _as_jst(end)
+    read_columns = None
+    if columns is not None:
+        read_columns = list(columns) + ([] if '日時' in columns else ['日時'])
+
+    time_type = SCHEMA.field('日時').type
+    condition = (
+        (pc.field('日時') >= pa.scalar(start_dt, time_type))
+        & (pc.field('日時') < pa.scalar(end_dt, time_type))
+    )
+
+    tables = []
+    for _, p_start, p_end, directory in _partitions(root):
+        if _as_jst(p_end) <= start_dt or _as_jst(p_start) >= end_dt:
+            continue
+        for path in sorted(glob.glob(os.path.join(directory, '*.parquet'))):
+            tables.append(_read_file(path, columns=read_columns, filters=condition))
+
+    if not tables:
+        schema = SCHEMA if columns is None else pa.schema([SCHEMA.field(c) for c in columns])
+        return schema.empty_table()
+    table = pa.concat_tables(tables)
+    return table.select(list(columns)) if columns is not None else table
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='ツイートParquetデータセットの管理')
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    p_compact = sub.add_parser('compact', help='小さなファイルを日次/週次にまとめる')
+    p_compact.add_argument('--root', default='data/parquet')
+    p_compact.add_argument('--by', choices=['day', 'week'], default='day')
+
+    p_query = sub.add_parser('query', help='期間を指定して件数と先頭行を表示')
+    p_query.add_argument('--root', default='data/parquet')
+    p_query.add_argument('--start', required=True, type=date.fromisoformat)
+    p_query.add_argument('--end', required=True, type=date.fromisoformat)
+    p_query.add_argument('--columns', nargs='*')
+
+    args = parser.parse_args(argv)
+    if args.command == 'compact':
+        merged = compact(args.root, args.by)
+        print(f'コンパクション完了: {merged}パーティション')
+    else:
+        table = read_range(args.root, args.start, args.end, args.columns)
+        print(f'{table.num_rows}行')
+        for row in table.slice(0, 10).to_pylist():
+            print(row)
+
+
+if __name__ == '__main__':
+    try:
+        main()
+    except Exception as e:
+        print(f'ERROR: {e}', file=sys.stderr)
+        sys.exit(1)
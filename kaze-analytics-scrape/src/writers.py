@@ -0,0 +1,202 @@
+# -*- coding: utf-8 -*-
+"""取得したツイートを逐次ファイルへ書き出すライター"""
+import csv
+import heapq
+import itertools
+import os
+import tempfile
+
+# 従来の5列はそのままの順で先頭に置き、追加した列は後ろに足す（列の位置で読む処理を壊さない）
+FIELDS = ['日時', '本文', '地域', 'リツイート数', 'いいね数', '都道府県コード', '地方', 'ツイートID']
+COUNT_FIELDS = ('リツイート数', 'いいね数')
+SORT_CHUNK_ROWS = 50000  # 並べ替えで一度にメモリに持つ行数（超える分は一時ファイルに分けてマージ）
+
+
+def iter_rows(path):
+    """書き出したCSVの行を読み戻す（件数の列は int に戻す）"""
+    with open(path, encoding='utf-8-sig', newline='') as f:
+        for row in csv.DictReader(f):
+            for field in COUNT_FIELDS:
+                row[field] = int(row[field])
+            if row.get('ツイートID'):
+                row['ツイートID'] = int(row['ツイートID'])
+            yield row
+
+
+def engagement_order(row):
+    """いいね数・リツイート数の多い順（従来のCSVの並び）"""
+    return (-row['いいね数'], -row['リツイート数'])
+
+
+def fetch_order(row):
+    """取得した順（IDの新しい順）"""
+    return -row['ツイートID']
+
+
+def _write_rows(f, rows):
+    writer = csv.DictWriter(f, fieldnames=FIELDS, quoting=csv.QUOTE_MINIMAL, extrasaction='ignore')
+    writer.writeheader()
+    writer.writerows(rows)
+
+
+def sort_rows(src, dst, key, limit=None, chunk_rows=SORT_CHUNK_ROWS):
+    """CSV src の行を key の順に並べて dst に書く（同じ順位は src の順のまま。limit 指定時は先頭から limit 行）
+
+    chunk_rows 行ずつ並べて一時ファイルに書き、heapq.merge でまとめるため、
+    メモリに持つのは chunk_rows 行分まで。
+    """
+    directory = os.path.dirname(os.path.abspath(dst))
+    runs = []
+    readers = []
+    try:
+        chunk = []
+        for row in iter_rows(src):
+            chunk.append(row)
+            if len(chunk) >= chunk_rows:
+                runs.append(_write_run(directory, sorted(chunk, key=key)))
+                chunk = []
+        chunk.sort(key=key)
+        if runs:
+            if chunk:
+                runs.append(_write_run(directory, chunk))
+            readers = [iter_rows(path) for path in runs]
+            rows = heapq.merge(*readers, key=key)
+        else:
+            rows = chunk
+        if limit is not None:
+            rows = itertools.islice(rows, limit)
+        write_atomic(dst, lambda f: _write_rows(f, rows), encoding='utf-8-sig')
+    finally:
+        for reader in readers:
+            reader.close()
+        for path in runs:
+            os.remove(path)
+
+
+def _write_run(directory, rows):
+    fd, path = tempfile.mkstemp(dir=directory, prefix='.sort-', suffix='.csv')
+    with os.fdopen(fd, 'w', encoding='utf-8-sig', newline='') as f:
+        _write_rows(f, rows)
+    return path
+
+
+def write_atomic(path, write, encoding='utf-8'):
+    """同じディレクトリの一時ファイルに write(f) で書き、置き換える（途中で落ちても壊れない）"""
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp = tempfile.mkstemp(dir=directory, prefix='.' + os.path.basename(path) + '-')
+    try:
+        with os.fdopen(fd, 'w', encoding=encoding, newline='') as f:
+            write(f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, path)
+    except BaseException:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        raise
+
+
+class TopRows:
+    """いいね数・リツイート数の上位 n 件だけを保持するヒープ"""
+
+    def __init__(self, n):
+        self.n = n
+        self.heap = []
+        self.seq = itertools.count()
+
+    def push(self, row):
+        if self.n <= 0:
+            return
+        # 同数は先に取得した行を残す（本体の並べ替えと同じ）
+        key = (row['いいね数'], row['リツイート数'], -next(self.seq))
+        if len(self.heap) < self.n:
+            heapq.heappush(self.heap, (key, row))
+        elif key > self.heap[0][0]:
+            heapq.heapreplace(self.heap, (key, row))
+
+    def sorted_rows(self):
+        """上位から順に並べた行を返す（同数は先に取得したものが先）"""
+        ordered = sorted(self.heap, key=lambda item: (-item[0][0], -item[0][1], -item[0][2]))
+        return [row for _, row in ordered]
+
+
+class StreamingCsvWriter:
+    """行を受け取った順にCSVへ書き出し、close() でいいね数・リツイート数の多い順に並べ替える
+
+    全件をメモリに持たないため、取得件数が増えてもメモリ使用量は一定（上位 top_n 件と
+    並べ替えの1チャンク分）。書き出し中は path + '.part' に取得順で追記し、close() で
+    並べ替えた path に置き換える（上位行は top_path にも保存）。
+    checkpoint() で書き出し済みの位置を返し、resume() でその位置から追記を再開できる。
+    """
+
+    def __init__(self, path, top_path=None, top_n=100):
+        self.path = path
+        self.part_path = path + '.part'
+        self.top_path = top_path
+        self.top = TopRows(top_n if top_path else 0)
+        self.count = 0
+        self.file = None
+        self.writer = None
+
+    def _open(self, mode='w'):
+        self.file = open(self.part_path, mode, encoding='utf-8-sig', newline='')
+        self.writer = csv.DictWriter(self.file, fieldnames=FIELDS, quoting=csv.QUOTE_MINIMAL,
+                                     extrasaction='ignore')
+        if mode == 'w':
+            self.writer.writeheader()
+
+    def write(self, row):
+        # 1件も無い場合はファイルを作らない（従来と同じ）
+        if self.file is None:
+            self._open()
+        self.writer.writerow(row)
+        self.top.push(row)
+        self.count += 1
+
+    def checkpoint(self):
+        """書き出し済みの行をディスクに反映し、再開用の状態を返す"""
+        if self.file is None:
+            return {'bytes': 0, 'rows': self.count}
+        self.file.flush()
+        os.fsync(self.file.fileno())
+        return {'bytes': self.file.tell(), 'rows': self.count}
+
+    def resume(self, state):
+        """checkpoint() の位置まで戻して追記を再開する（それ以降の行は取得し直す前提で捨てる）"""
+        if not os.path.exists(self.part_path) and os.path.exists(self.path):
+            # 置き換え後・チェックポイント削除前に止まった場合（並べ替え済みの出力を取得順に戻す）
+            sort_rows(self.path, self.part_path, fetch_order, limit=state['rows'])
+            os.remove(self.path)
+        if not state['bytes'] or not os.path.exists(self.part_path):
+            return
+        with open(self.part_path, 'r+b') as f:
+            f.truncate(state['bytes'])
+        for row in iter_rows(self.part_path):
+            self.top.push(row)
+            self.count += 1
+        self._open('a')
+
+    def discard(self):
+        """書きかけのファイルを削除（中断した実行をやり直す場合）"""
+        if os.path.exists(self.part_path):
+            os.remove(self.part_path)
+
+    def close(self):
+        if self.file is None:
+            return
+        self.file.close()
+        self.file = None
+        # 従来の出力と同じく、いいね数・リツイート数の多い順に並べて置き換える
+        sort_rows(self.part_path, self.path, engagement_order)
+        os.remove(self.part_path)
+
+        if self.top_path:
+            def write_top(f):
+                _write_rows(f, self.top.sorted_rows())
+            write_atomic(self.top_path, write_top, encoding='utf-8-sig')
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
@@ -0,0 +1,161 @@
+# -*- coding: utf-8 -*-
+"""風邪の症状の分類と有効性の判定（main.py と reclassify_backlog.py で共用）
+
+tweepy・チャート・投稿に依存しないため、判定だけが必要なワーカープロセスでも軽く作れる。
+"""
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'analytics-common'))
+from keyword_matcher import KeywordMatcher
+
+
+class KazeClassifier:
+    """症状の表記ゆれ・文脈キーワードと、それを使った分類・除外判定"""
+
+    def __init__(self):
+        # 表記ゆれ対応の症状クエリ
+        self.symptom_patterns = {
+            "喉の症状": [
+                "のどの痛み", "喉の痛み", "喉が痛い", "喉痛い",
+                "のど痛い", "ノドが痛い", "のどいたい"
+            ],
+            "咳": [
+                "咳", "せき", "セキ", "咳が出る", "ゴホゴホ"
+            ],
+            "発熱": [
+                "発熱", "熱", "熱が出る", "熱っぽい", "微熱"
+            ],
+            "鼻の症状": [
+                "鼻水", "鼻づまり", "鼻が詰まる", "はなみず"
+            ],
+            "風邪による頭痛": [
+                "(頭痛 風邪)", "(頭が痛い 風邪)", "(ずつう 風邪)",
+                "(頭痛 鼻水)", "(頭痛 咳)", "(頭痛 発熱)",
+                "(頭が痛い 体調悪い)", "(頭痛 調子悪い)",
+                "(ずつう 鼻づまり)", "(頭痛 のど)"
+            ]
+        }
+
+        # 風邪関連の文脈キーワード
+        self.cold_indicators = [
+            "風邪", "鼻水", "咳", "発熱", "のど", "喉", "体調悪い", 
+            "調子悪い", "鼻づまり", "熱っぽい", "ゴホゴホ"
+        ]
+
+        # 風邪以外の頭痛原因（除外用）
+        self.non_cold_headache_indicators = [
+            "偏頭痛", "片頭痛", "緊張型頭痛", "肩こり", "眼精疲労",
+            "ストレス", "寝不足", "二日酔い", "生理", "低気圧",
+            "疲労", "肩が", "首が", "目が疲れ"
+        ]
+
+        # ノイズ除去キーワード
+        self.noise_patterns = [
+            "治った", "良くなった", "演技", "フリ", "嘘", "冗談",
+            "昨日", "去年", "先週", "歌詞", "小説", "ドラマ",
+            "映画", "アニメ", "ゲーム", "漫画", "bot"
+        ]
+
+        # 判定用キーワードを1つのマッチャーにまとめる（1ツイート1回の走査）
+        self.matcher = KeywordMatcher({
+            "noise": self.noise_patterns,
+            "cold": self.cold_indicators,
+            "non_cold_headache": self.non_cold_headache_indicators,
+        })
+
+        # 症状ごとの必須語の組（検索クエリと同じ条件をローカルで判定する）
+        self.symptom_terms = {}
+        for symptom_name, patterns in self.symptom_patterns.items():
+            if symptom_name == "風邪による頭痛":
+                groups = [tuple(pattern.strip("()").split()) for pattern in patterns]
+            else:
+                groups = [(pattern, "風邪") for pattern in patterns]
+            self.symptom_terms[symptom_name] = groups
+
+        all_terms = {term for groups in self.symptom_terms.values() for group in groups for term in group}
+        self.symptom_matcher = KeywordMatcher({term: [term] for term in all_terms})
+
+        # 組の先頭の語 -> [(症状名, 組)]（一致した語に関係する組だけを調べる）
+        self.groups_by_term = {}
+        for symptom_name, groups in self.symptom_terms.items():
+            for group in groups:
+                self.groups_by_term.setdefault(group[0], []).append((symptom_name, frozenset(group)))
+
+        # 症状別クエリから症状名への対応（保存データの分類用）
+        self.query_symptoms = {self.build_symptom_query(name): name for name in self.symptom_patterns}
+        self.symptom_names = list(self.symptom_patterns)
+
+    def is_cold_related_headache(self, tweet_text, matched=None):
+        """風邪関連の頭痛かどうか判定"""
+        if matched is None:
+            matched = self.matcher.match(tweet_text)
+
+        # 風邪の文脈があり、かつ他の原因がない場合のみ
+        return "cold" in matched and "non_cold_headache" not in matched
+
+    def build_symptom_query(self, symptom_name):
+        """表記ゆれを考慮したクエリ作成"""
+        if symptom_name == "風邪による頭痛":
+            # 頭痛の複合検索
+            keywords = " OR ".join(self.symptom_patterns[symptom_name])
+            return f"({keywords}) -is:retweet lang:ja"
+        else:
+            keywords = " OR ".join(self.symptom_patterns[symptom_name])
+            return f"({keywords}) 風邪 -is:retweet lang:ja"
+
+    def search_clauses(self):
+        """全症状を拾う検索条件（OR でつなぐ節）のリスト"""
+        keywords = []
+        headache_groups = []
+        for symptom_name, patterns in self.symptom_patterns.items():
+            if symptom_name == "風邪による頭痛":
+                headache_groups.extend(patterns)
+            else:
+                keywords.extend(p for p in patterns if p not in keywords)
+
+        return [f"(({' OR '.join(keywords)}) 風邪)"] + headache_groups
+
+    def build_combined_query(self):
+        """全症状を1回で検索するORクエリ作成"""
+        return f"({' OR '.join(self.search_clauses())}) -is:retweet lang:ja"
+
+    def classify_symptoms(self, text):
+        """ツイートが該当する症状名のリストを返す"""
+        present = self.symptom_matcher.match(text)
+        hits = set()
+        for term in present:
+            for symptom_name, group in self.groups_by_term.get(term, ()):
+                if group <= present:
+                    hits.add(symptom_name)
+        return [symptom_name for symptom_name in self.symptom_terms if symptom_name in hits]
+
+    def is_valid_tweet(self, text, symptom_name=None, matched=None, tweet_id=None):
+        """ツイートの有効性をチェック（tweet_id を渡すとほぼ重複の本文も除外）"""
+        return self.rejection_reason(text, symptom_name, matched, tweet_id) is None
+
+    def rejection_reason(self, text, symptom_name=None, matched=None, tweet_id=None):
+        """無効なツイートの除外理由（有効なら None）"""
+        # RTやメンションは除外
+        if text.startswith('RT') or text.startswith('@'):
+            return "retweet_or_reply"
+
+        if matched is None:
+            matched = self.matcher.match(text)
+
+        # ノイズパターンを含む場合は除外
+        if "noise" in matched:
+            return "noise"
+
+        # 風邪による頭痛の場合は追加チェック
+        if symptom_name == "風邪による頭痛" and not self.is_cold_related_headache(text, matched):
+            return "not_cold_headache"
+
+        # 先に数えたツイートとほぼ同じ本文は除外
+        if self.is_near_duplicate(text, tweet_id, symptom_name):
+            return "near_duplicate"
+        return None
+
+    def is_near_duplicate(self, text, tweet_id, symptom_name=None):
+        """ほぼ重複の判定（ここでは行わない。FinalKazeAnalyzer が症状ごとの索引で判定する）"""
+        return False
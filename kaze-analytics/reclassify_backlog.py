@@ -0,0 +1,214 @@
+# -*- coding: utf-8 -*-
+"""スクレイパーが貯めたCSV（kaze-analytics-scrape/data）を風邪の判定処理で一括集計する
+
+CSVを chunk 行ずつ読み、全コアのプロセスプールで main.py と同じ
+有効性・症状の判定を行い、日付×症状の有効件数にまとめる。
+処理中のチャンク数に上限を設けるため、メモリ使用量はファイルの大きさによらない。
+
+ファイルごとの集計結果はマニフェスト（JSON）に記録し、再実行時は
+内容が変わっていない処理済みファイルを読み直さない（途中で失敗しても続きから再開できる）。
+
+使い方:
+  python kaze-analytics/reclassify_backlog.py kaze-analytics-scrape/data
+  python kaze-analytics/reclassify_backlog.py data/ --workers 8 --chunk-size 5000 --output backlog_counts.csv
+  python kaze-analytics/reclassify_backlog.py data/ --fresh   # 判定処理を変更した後は全件やり直す
+"""
+import argparse
+import concurrent.futures
+import csv
+import glob
+import json
+import os
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+CHUNK_SIZE = 5000  # 1回にワーカーへ渡す行数
+DEFAULT_MANIFEST = 'reclassify_manifest.json'
+
+_classifier = None
+
+
+def _init_worker():
+    """ワーカーごとに1回だけ判定器を作る（tweepy・チャート・投稿は読み込まない）"""
+    global _classifier
+    from kaze_classifier import KazeClassifier
+    # ほぼ重複の除外はスクレイパーの書き出し時に済んでいる（チャンクをまたいだ判定もできない）
+    _classifier = KazeClassifier()
+
+
+def classify_chunk(rows):
+    """[(日付, 本文)] を判定し {日付: {症状名: 有効件数}} を返す"""
+    counts = {}
+    for day, text in rows:
+        matched = _classifier.matcher.match(text)
+        for symptom_name in _classifier.classify_symptoms(text):
+            if _classifier.is_valid_tweet(text, symptom_name, matched):
+                day_counts = counts.setdefault(day, {})
+                day_counts[symptom_name] = day_counts.get(symptom_name, 0) + 1
+    return counts
+
+
+def merge_counts(total, counts):
+    for day, day_counts in counts.items():
+        target = total.setdefault(day, {})
+        for symptom_name, count in day_counts.items():
+            target[symptom_name] = target.get(symptom_name, 0) + count
+    return total
+
+
+def find_csv_files(paths):
+    """対象CSVの一覧（ディレクトリは kaze_*.csv を探す。上位行だけの *_top.csv は本体と重複するため除く）"""
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            files.extend(glob.glob(os.path.join(path, '**', 'kaze_*.csv'), recursive=True))
+        else:
+            files.append(path)
+    return sorted(os.path.abspath(f) for f in files if not f.endswith('_top.csv'))
+
+
+def iter_chunks(path, chunk_size):
+    """CSVを chunk_size 行ずつ [(日付, 本文)] で返す"""
+    with open(path, encoding='utf-8-sig', newline='') as f:
+        chunk = []
+        for row in csv.DictReader(f):
+            text = row.get('本文')
+            if not text:
+                continue
+            chunk.append((row['日時'][:10], text))
+            if len(chunk) >= chunk_size:
+                yield chunk
+                chunk = []
+        if chunk:
+            yield chunk
+
+
+class Manifest:
+    """処理済みファイルと、その集計結果の記録"""
+
+    def __init__(self, path, fresh=False):
+        self.path = path
+        self.files = {}
+        if not fresh and os.path.exists(path):
+            with open(path, encoding='utf-8') as f:
+                self.files = json.load(f).get('files', {})
+
+    @staticmethod
+    def fingerprint(path):
+        stat = os.stat(path)
+        return {'size': stat.st_size, 'mtime': stat.st_mtime}
+
+    def is_done(self, path):
+        entry = self.files.get(path)
+        if entry is None:
+            return False
+        current = self.fingerprint(path)
+        return entry['size'] == current['size'] and entry['mtime'] == current['mtime']
+
+    def record(self, path, rows, counts):
+        self.files[path] = dict(self.fingerprint(path), rows=rows, counts=counts)
+        self.save()
+
+    def save(self):
+        directory = os.path.dirname(os.path.abspath(self.path))
+        fd, tmp = tempfile.mkstemp(dir=directory, prefix='.manifest-', suffix='.json')
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            json.dump({'files': self.files}, f, ensure_ascii=False, indent=1, sort_keys=True)
+        os.replace(tmp, self.path)
+
+    def totals(self, files):
+        total = {}
+        for path in files:
+            merge_counts(total, self.files[path]['counts'])
+        return total
+
+
+def reclassify(files, manifest, workers=None, chunk_size=CHUNK_SIZE):
+    """未処理のファイルをプロセスプールで判定し、全ファイルの {日付: {症状名: 件数}} を返す"""
+    pending_files = [path for path in files if not manifest.is_done(path)]
+    print(f"対象: {len(files)}ファイル（処理済み {len(files) - len(pending_files)}、今回 {len(pending_files)}）")
+    if not pending_files:
+        return manifest.totals(files)
+
+    workers = workers or os.cpu_count() or 1
+    max_inflight = workers * 2  # 読み込み済みで未処理のチャンク数の上限
+
+    # ファイルごとの途中経過: 未完了チャンク数・読み終えたか・行数・件数
+    progress = {path: {'pending': 0, 'read': False, 'rows': 0, 'counts': {}} for path in pending_files}
+
+    def finish(future):
+        path, n = inflight.pop(future)
+        state = progress[path]
+        merge_counts(state['counts'], future.result())
+        state['pending'] -= 1
+        state['rows'] += n
+        if state['read'] and state['pending'] == 0:
+            manifest.record(path, state['rows'], state['counts'])
+            print(f"  {os.path.basename(path)}: {state['rows']}行")
+
+    inflight = {}
+    with concurrent.futures.ProcessPoolExecutor(max_workers=workers, initializer=_init_worker) as pool:
+        for path in pending_files:
+            state = progress[path]
+            for chunk in iter_chunks(path, chunk_size):
+                while len(inflight) >= max_inflight:
+                    done, _ = concurrent.futures.wait(inflight, return_when=concurrent.futures.FIRST_COMPLETED)
+                    for future in done:
+                        finish(future)
+                inflight[pool.submit(classify_chunk, chunk)] = (path, len(chunk))
+                state['pending'] += 1
+            state['read'] = True
+            if state['pending'] == 0:
+                manifest.record(path, 0, {})
+        while inflight:
+            done, _ = concurrent.futures.wait(inflight, return_when=concurrent.futures.FIRST_COMPLETED)
+            for future in done:
+                finish(future)
+
+    return manifest.totals(files)
+
+
+def write_counts(path, counts, symptom_names):
+    with open(path, 'w', encoding='utf-8-sig', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(['日付'] + symptom_names)
+        for day in sorted(counts):
+            writer.writerow([day] + [counts[day].get(name, 0) for name in symptom_names])
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="スクレイピング済みCSVの一括再分類・日別集計")
+    parser.add_argument("paths", nargs="*",
+                        default=[os.path.join(os.path.dirname(os.path.abspath(__file__)), '..',
+                                              'kaze-analytics-scrape', 'data')],
+                        help="CSVファイルまたはディレクトリ（*_top.csv は除く）")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(), help="ワーカープロセス数")
+    parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE, help="1チャンクの行数")
+    parser.add_argument("--manifest", default=DEFAULT_MANIFEST, help="処理済みファイルの記録（再開用）")
+    parser.add_argument("--fresh", action="store_true", help="マニフェストを使わず全ファイルを処理し直す")
+    parser.add_argument("--output", help="日付×症状の件数を書き出すCSV")
+    args = parser.parse_args(argv)
+
+    files = find_csv_files(args.paths)
+    if not files:
+        print("対象のCSVがありません")
+        return 0
+
+    counts = reclassify(files, Manifest(args.manifest, fresh=args.fresh), args.workers, args.chunk_size)
+
+    # 症状名の一覧（表示順）は判定器から取る
+    _init_worker()
+    symptom_names = list(_classifier.symptom_patterns)
+    print("日付," + ",".join(symptom_names))
+    for day in sorted(counts):
+        print(day + "," + ",".join(str(counts[day].get(name, 0)) for name in symptom_names))
+    if args.output:
+        write_counts(args.output, counts, symptom_names)
+        print(f"保存: {args.output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,14 +1,32 @@
 import tweepy
-import matplotlib.pyplot as plt
-import pandas as pd
 import os
 from datetime import datetime, timedelta
-from collections import Counter
 import io
-import time
+import sys
+import functools
+import argparse
+import threading
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'analytics-common'))
+from keyword_matcher import KeywordMatcher
+from collector import RateLimitedCollector
+from tweet_store import TweetStore
+from near_dup import NearDuplicateFilter
+from estimation import SAMPLE_SIZE, SymptomEstimator, format_estimate
+from plotting import CHART_WIDTH
+from chart_service import CHART_WORKERS, ChartService, report_specs, save_report
+from publisher import Publisher
+from campaign_engine import build_query
+from symptom_cube import SymptomCube
+from trend_store import TrendStore, fit_tweet, format_change, trend_arrow
+import metrics
 
 class PollenAnalyzer:
-    def __init__(self):
+    def __init__(self, consolidate_queries=False, max_tweets_per_bucket=20, bucket_time_limit=60,
+                 store_path=None, offline=False, client=None, trend_path=None,
+                 near_dup=True, image_format='png', chart_width=CHART_WIDTH, outbox=None,
+                 estimate=False, sample_size=SAMPLE_SIZE, cube_path=None,
+                 chart_cache=None, chart_workers=CHART_WORKERS, report_dir=None):
         # Twitter API認証（花粉症版）
         self.bearer_token = os.getenv('POLLEN_TWITTER_BEARER_TOKEN')
         self.api_key = os.getenv('POLLEN_TWITTER_API_KEY')
@@ -16,15 +34,55 @@ class PollenAnalyzer:
         self.access_token = os.getenv('POLLEN_TWITTER_ACCESS_TOKEN')
         self.access_token_secret = os.getenv('POLLEN_TWITTER_ACCESS_TOKEN_SECRET')
         
-        self.client = tweepy.Client(
-            bearer_token=self.bearer_token,
-            consumer_key=self.api_key,
-            consumer_secret=self.api_secret,
-            access_token=self.access_token,
-            access_token_secret=self.access_token_secret,
-            wait_on_rate_limit=False
+        # 検索・投稿に使うクライアント（ReplayClient などに差し替え可能）
+        if client is None:
+            client = tweepy.Client(
+                bearer_token=self.bearer_token,
+                consumer_key=self.api_key,
+                consumer_secret=self.api_secret,
+                access_token=self.access_token,
+                access_token_secret=self.access_token_secret,
+                wait_on_rate_limit=False
+            )
+        self.client = client
+        
+        self.collector = RateLimitedCollector(self.client, max_workers=4)
+        self.max_tweets_per_bucket = max_tweets_per_bucket
+        self.bucket_time_limit = bucket_time_limit
+        
+        # 取得済みツイートのローカル保存（指定時のみ）
+        self.campaign = "pollen"
+        self.store = TweetStore(store_path) if store_path else None
+        self.offline = offline
+        
+        # 件数エンドポイントの総数 × 標本の有効率で推定するモード（検索は標本の分だけ）
+        self.estimate = estimate
+        self.sample_size = sample_size
+        
+        # チャートは別プロセスで描画し、同じ内容ならキャッシュを使う（--report-dir 指定時は時間別・地方別も保存）
+        self.chart_width = chart_width
+        self.charts = ChartService(cache_dir=chart_cache, workers=chart_workers)
+        self.report_dir = report_dir
+        # 日本語フォント（japanize_matplotlib が無い場合の候補）
+        self.chart_fonts = ['DejaVu Sans', 'Hiragino Sans', 'Yu Gothic', 'Meiryo', 'IPAexGothic']
+        
+        # 投稿（アップロード用の認証済みセッションを使い回し、画像は軽くしてから送る）
+        self.publisher = Publisher(
+            self.client,
+            (self.api_key, self.api_secret, self.access_token, self.access_token_secret),
+            collector=self.collector, image_format=image_format, outbox=outbox, campaign=self.campaign
         )
         
+        # 症状ごとの平常値（指定時のみ。ランキングの矢印・増減に使用）
+        self.trends = TrendStore(trend_path) if trend_path else None
+        # 推定モードの件数は全件の規模になるため、平常値は別の系列として記録する
+        self.trend_key = f"{self.campaign}:estimate" if estimate else self.campaign
+        
+        # コピペ・bot連投などほぼ同じ本文のツイートを1件として数える（無効化可能）
+        # 索引は症状ごとに分ける（並列に検索する別の症状で先に数えた本文に、この症状の件数を取られない）
+        self.near_dups = {} if near_dup else None
+        self.near_dups_lock = threading.Lock()
+        
         self.pollen_symptoms = {
             "くしゃみ": ["くしゃみ", "ハクション", "連続くしゃみ", "くしゃみが止まらない"],
             "鼻水": ["鼻水", "水っぽい鼻水", "透明な鼻水", "はなみず", "鼻がグズグズ"],
@@ -40,6 +98,26 @@ class PollenAnalyzer:
         self.cold_exclusions = [
             "風邪", "発熱", "のど", "喉", "体調悪い", "寒気", "関節痛", "咳"
         ]
+        
+        self.noise_words = ["治った", "良くなった", "演技", "フリ", "嘘", "冗談", "昨日", "去年"]
+        
+        # 判定用キーワードを1つのマッチャーにまとめる（1ツイート1回の走査）
+        self.matcher = KeywordMatcher({
+            "noise": self.noise_words,
+            "pollen": self.pollen_indicators,
+            "cold": self.cold_exclusions,
+        })
+        
+        # 1回の検索で全症状を取得し、ローカルで振り分けるモード
+        self.consolidate_queries = consolidate_queries
+        self.symptom_matcher = KeywordMatcher(self.pollen_symptoms)
+        self.query_symptoms = {self.build_symptom_query(name): name for name in self.pollen_symptoms}
+        self.symptom_names = list(self.pollen_symptoms)
+        
+        # 症状 × 都道府県 × 時間 の集計キューブ（チャート・投稿文はここから読む。ファイル指定時は実行をまたいで保存）
+        self.cube_path = cube_path
+        self.cube = SymptomCube.load(cube_path, self.symptom_names) if cube_path else SymptomCube(self.symptom_names)
+        self.cube_window = None
 
     def get_yesterday_timerange(self):
         """昨日24時間の時間範囲を取得"""
@@ -48,177 +126,481 @@ class PollenAnalyzer:
         yesterday_start = yesterday_end - timedelta(days=1)
         return yesterday_start, yesterday_end
 
-    def is_pollen_related_symptom(self, tweet_text):
-        text_lower = tweet_text.lower()
-        has_pollen_context = any(indicator in text_lower for indicator in self.pollen_indicators)
-        has_cold_context = any(exclusion in text_lower for exclusion in self.cold_exclusions)
-        return has_pollen_context and not has_cold_context
+    def collection_window(self):
+        """集計対象の期間 (開始, 終了)（UTC）"""
+        return self.get_yesterday_timerange()
+
+    def is_pollen_related_symptom(self, tweet_text, matched=None):
+        if matched is None:
+            matched = self.matcher.match(tweet_text)
+        return "pollen" in matched and "cold" not in matched
 
     def build_symptom_query(self, symptom_name):
         keywords = " OR ".join(self.pollen_symptoms[symptom_name])
         return f"({keywords}) (花粉 OR アレルギー OR 花粉症 OR ブタクサ) -is:retweet lang:ja"
 
-    def is_valid_tweet(self, text, symptom_name):
+    def search_clauses(self):
+        """全症状を拾う検索条件（OR でつなぐ節）のリスト"""
+        keywords = []
+        for patterns in self.pollen_symptoms.values():
+            keywords.extend(p for p in patterns if p not in keywords)
+        return [f"(({' OR '.join(keywords)}) (花粉 OR アレルギー OR 花粉症 OR ブタクサ))"]
+
+    def build_combined_query(self):
+        """全症状を1回で検索するORクエリ作成（統合エンジンと同じ節から組み立てる）"""
+        return build_query(self.search_clauses())
+
+    def classify_symptoms(self, text):
+        """ツイートが該当する症状名のリストを返す"""
+        matched = self.symptom_matcher.match(text)
+        return [symptom_name for symptom_name in self.pollen_symptoms if symptom_name in matched]
+
+    def is_valid_tweet(self, text, symptom_name, matched=None, tweet_id=None):
+        return self.rejection_reason(text, symptom_name, matched, tweet_id) is None
+
+    def rejection_reason(self, text, symptom_name, matched=None, tweet_id=None):
+        """無効なツイートの除外理由（有効なら None）"""
         if text.startswith('RT') or text.startswith('@'):
-            return False
+            return "retweet_or_reply"
+        
+        if matched is None:
+            matched = self.matcher.match(text)
+        if "noise" in matched:
+            return "noise"
         
-        noise_words = ["治った", "良くなった", "演技", "フリ", "嘘", "冗談", "昨日", "去年"]
-        text_lower = text.lower()
-        if any(noise in text_lower for noise in noise_words):
+        if not self.is_pollen_related_symptom(text, matched):
+            return "not_pollen"
+        
+        # 先に数えたツイートとほぼ同じ本文は除外
+        if self.is_near_duplicate(text, tweet_id, symptom_name):
+            return "near_duplicate"
+        return None
+
+    def is_near_duplicate(self, text, tweet_id, symptom_name=None):
+        """同じ症状で先に見たツイートとほぼ同じ本文か（同じツイートIDは同じ結果）"""
+        if self.near_dups is None or tweet_id is None:
             return False
+        with self.near_dups_lock:
+            near_dups = self.near_dups.get(symptom_name)
+            if near_dups is None:
+                near_dups = self.near_dups[symptom_name] = NearDuplicateFilter()
+        return near_dups.is_duplicate(tweet_id, text)
+
+    def filter_valid_tweets(self, texts, symptom_name=None):
+        return [self.is_valid_tweet(text, symptom_name) for text in texts]
+
+    def iter_tweets(self, query, start_time, end_time, progress=None):
+        """ページをたどって1件ずつツイートを返す"""
+        return self.collector.paginate(
+            self.client.search_recent_tweets,
+            budget=self.max_tweets_per_bucket,
+            time_limit=self.bucket_time_limit,
+            progress=progress,
+            query=query,
+            start_time=start_time.isoformat(),
+            end_time=end_time.isoformat(),
+            tweet_fields=['created_at', 'text']
+        )
+
+    def classify_for_store(self, text, queries, tweet_id=None):
+        """保存用の分類結果 [(症状名, 有効か)] を返す"""
+        symptoms = set(self.classify_symptoms(text))
+        symptoms.update(self.query_symptoms[q] for q in queries if q in self.query_symptoms)
         
-        return self.is_pollen_related_symptom(text)
+        matched = self.matcher.match(text)
+        results = []
+        for name in symptoms:
+            reason = self.rejection_reason(text, name, matched, tweet_id)
+            metrics.classified(reason)
+            results.append((name, reason is None))
+        return results
+
+    def save_tweets(self, query, tweets):
+        self.store.add_tweets(
+            [{'id': t.id, 'text': t.text, 'created_at': t.created_at} for t in tweets],
+            query=query
+        )
+        self.store.set_classifications(self.campaign, [
+            (t.id, name, valid)
+            for t in tweets
+            for name, valid in self.classify_for_store(t.text, [query], t.id)
+        ])
+
+    def fetch_into_store(self, query, start_time, end_time):
+        """未取得の区間だけAPIから取得して保存"""
+        return self.store.fill(
+            query, start_time, end_time,
+            fetch=lambda start, end, progress: self.iter_tweets(query, start, end, progress),
+            on_batch=functools.partial(self.save_tweets, query)
+        )
+
+    def begin_cube(self, start_time, end_time):
+        """今回の集計期間の時間をキューブから消す（集計し直しても二重に数えない）"""
+        self.cube_window = (start_time, end_time)
+        self.cube.clear(start_time, end_time)
+
+    def save_cube(self):
+        if self.cube_path:
+            self.cube.save(self.cube_path)
+
+    def ranking(self):
+        """集計期間の [(症状名, 件数)]（キューブから。件数の多い順）"""
+        start_time, end_time = self.cube_window or self.collection_window()
+        return self.cube.ranking(start_time, end_time)
+
+    def count_valid_tweets(self, query, start_time, end_time, symptom_name):
+        if self.store is not None:
+            self.fetch_into_store(query, start_time, end_time)
+            stored = self.store.count_by_symptom_hour(self.campaign, start_time, end_time, query)
+            cells = {key: n for key, n in stored.items() if key[0] == symptom_name}
+            self.cube.update(cells)
+            return sum(cells.values())
+        
+        cells = {}
+        for tweet in self.iter_tweets(query, start_time, end_time):
+            reason = self.rejection_reason(tweet.text, symptom_name, tweet_id=tweet.id)
+            metrics.classified(reason)
+            if reason is None:
+                key = (symptom_name, tweet.created_at, None)
+                cells[key] = cells.get(key, 0) + 1
+        # 取得し終えた分だけキューブに加える（途中で失敗した症状は件数と同じく数えない）
+        self.cube.update(cells)
+        return sum(cells.values())
+
+    def count_by_symptom(self, query, start_time, end_time):
+        """一括取得したツイートを症状ごとに振り分けて有効件数を返す"""
+        if self.store is not None:
+            self.fetch_into_store(query, start_time, end_time)
+            cells = self.store.count_by_symptom_hour(self.campaign, start_time, end_time, query)
+        else:
+            cells = {}
+            for tweet in self.iter_tweets(query, start_time, end_time):
+                matched = self.matcher.match(tweet.text)
+                for symptom_name in self.classify_symptoms(tweet.text):
+                    reason = self.rejection_reason(tweet.text, symptom_name, matched, tweet.id)
+                    metrics.classified(reason)
+                    if reason is None:
+                        key = (symptom_name, tweet.created_at, None)
+                        cells[key] = cells.get(key, 0) + 1
+        self.cube.update(cells)
+        
+        counts = {symptom_name: 0 for symptom_name in self.pollen_symptoms}
+        for (symptom_name, _, _), n in cells.items():
+            counts[symptom_name] += n
+        return counts
+
+    def collect_from_store(self):
+        """APIを使わず、保存済みツイートを分類し直して昨日分を集計"""
+        print("保存済みデータから再分類・集計...")
+        total = self.store.reclassify(self.campaign, self.classify_for_store)
+        print(f"再分類: {total}件")
+        
+        start_time, end_time = self.get_yesterday_timerange()
+        self.begin_cube(start_time, end_time)
+        self.cube.update(self.store.count_by_symptom_hour(self.campaign, start_time, end_time))
+        stored = self.cube.totals(start_time, end_time)
+        
+        symptom_counts = {}
+        for symptom_name in self.pollen_symptoms.keys():
+            symptom_counts[symptom_name] = stored.get(symptom_name, 0)
+            print(f"{symptom_name}: {symptom_counts[symptom_name]}件")
+        return symptom_counts
 
     def collect_yesterday_pollen_data(self):
         """昨日24時間の花粉症データ収集"""
         print("昨日の花粉症症状データ収集開始...")
         
         start_time, end_time = self.get_yesterday_timerange()
+        self.begin_cube(start_time, end_time)
         symptom_counts = {}
         
         print(f"対象期間: {start_time.strftime('%Y-%m-%d %H:%M')} - {end_time.strftime('%Y-%m-%d %H:%M')} (UTC)")
         
-        for symptom_name in self.pollen_symptoms.keys():
-            symptom_counts[symptom_name] = 0
-            query = self.build_symptom_query(symptom_name)
-            
-            try:
-                tweets = self.client.search_recent_tweets(
-                    query=query,
-                    start_time=start_time.isoformat(),
-                    end_time=end_time.isoformat(),
-                    max_results=20,
-                    tweet_fields=['created_at', 'text']
+        if self.consolidate_queries:
+            jobs = {
+                "all": functools.partial(
+                    self.count_by_symptom, self.build_combined_query(), start_time, end_time
                 )
-                
-                if tweets.data:
-                    valid_tweets = [tweet for tweet in tweets.data if self.is_valid_tweet(tweet.text, symptom_name)]
-                    symptom_counts[symptom_name] = len(valid_tweets)
-                    print(f"{symptom_name}: {len(valid_tweets)}件")
-                else:
-                    print(f"{symptom_name}: 0件")
-                
-                time.sleep(2)
-                
-            except Exception as e:
-                print(f"{symptom_name}: エラー - {str(e)}")
+            }
+            combined, combined_errors = self.collector.run(jobs)
+            results = combined.get("all", {})
+            errors = {symptom_name: e for e in combined_errors.values() for symptom_name in self.pollen_symptoms}
+        else:
+            jobs = {
+                symptom_name: functools.partial(
+                    self.count_valid_tweets, self.build_symptom_query(symptom_name),
+                    start_time, end_time, symptom_name
+                )
+                for symptom_name in self.pollen_symptoms.keys()
+            }
+            results, errors = self.collector.run(jobs)
+        
+        for symptom_name in self.pollen_symptoms.keys():
+            if symptom_name in errors:
+                print(f"{symptom_name}: 取得失敗 - {str(errors[symptom_name])}")
                 symptom_counts[symptom_name] = 0
+            else:
+                symptom_counts[symptom_name] = results[symptom_name]
+                print(f"{symptom_name}: {results[symptom_name]}件")
         
         return symptom_counts
 
-    def create_pollen_chart(self, symptom_counts):
-        try:
-            import japanize_matplotlib
-            japanize_matplotlib.japanize()
-        except ImportError:
-            plt.rcParams['font.family'] = ['DejaVu Sans', 'Hiragino Sans', 'Yu Gothic', 'Meiryo', 'IPAexGothic']
-        
-        sorted_symptoms = sorted(symptom_counts.items(), key=lambda x: x[1], reverse=True)
-        symptoms = [item[0] for item in sorted_symptoms]
-        counts = [item[1] for item in sorted_symptoms]
-        
-        fig, ax = plt.subplots(figsize=(10, 6))
-        bars = ax.bar(symptoms, counts, color=['#FF9999', '#66B2FF', '#99FF99', '#FFCC99'])
+    def collect_estimates(self):
+        """件数エンドポイントの総数と標本の有効率から症状ごとの件数を推定"""
+        print("症状データ推定開始（件数エンドポイント × 標本の有効率）...")
+        start_time, end_time = self.collection_window()
+        self.begin_cube(start_time, end_time)
+        estimator = SymptomEstimator(self, sample_size=self.sample_size)
+        estimates, errors = estimator.run(start_time, end_time)
         
+        symptom_counts = {}
+        for symptom_name in self.symptom_names:
+            if symptom_name in errors:
+                print(f"  {symptom_name}: 取得失敗 - {str(errors[symptom_name])}")
+                symptom_counts[symptom_name] = 0
+                continue
+            symptom_counts[symptom_name] = estimates[symptom_name].count
+            # 推定件数は時間ごとに配分してキューブに入れる（地域は不明）
+            self.cube.update({(symptom_name, hour, None): n for hour, n in estimator.hourly[symptom_name]})
+            print("  " + format_estimate(symptom_name, estimates[symptom_name]))
+        return symptom_counts
+
+    def pollen_chart_spec(self, ranking):
+        """ランキングチャートの (種類, データ, 体裁)（ranking: 件数の多い順の [(症状名, 件数)]）"""
         yesterday = datetime.now() - timedelta(days=1)
-        title = f"昨日の花粉症症状トレンド ({yesterday.strftime('%Y/%m/%d')})"
-        ax.set_title(title, fontsize=16, pad=20, fontweight='bold')
-        ax.set_ylabel('報告件数', fontsize=12)
-        ax.set_xlabel('症状', fontsize=12)
-        
-        ax.grid(True, alpha=0.3, axis='y')
-        
-        for bar, count in zip(bars, counts):
-            height = bar.get_height()
-            if height > 0:
-                ax.text(bar.get_x() + bar.get_width()/2., height + 0.1,
-                       f'{count}件', ha='center', va='bottom', fontsize=11, fontweight='bold')
-        
-        plt.xticks(rotation=0)
-        plt.tight_layout()
-        
-        img_buffer = io.BytesIO()
-        plt.savefig(img_buffer, format='png', dpi=300, bbox_inches='tight')
-        img_buffer.seek(0)
-        plt.close()
-        
-        return img_buffer
+        data = {'labels': [item[0] for item in ranking], 'values': [item[1] for item in ranking]}
+        style = {
+            'fonts': self.chart_fonts,
+            'japanize': True,
+            'figsize': [10, 6],
+            'width': self.chart_width,
+            'colors': ['#FF9999', '#66B2FF', '#99FF99', '#FFCC99'],
+            'title': f"昨日の花粉症症状トレンド ({yesterday.strftime('%Y/%m/%d')})",
+            'title_size': 16,
+            'title_weight': 'bold',
+            'ylabel': '報告件数',
+            'xlabel': '症状',
+            'grid': True,
+            'label_offset': 0.1,
+            'label_size': 11,
+            'label_weight': 'bold',
+            'skip_zero_labels': True,
+            'rotation': 0,
+        }
+        return 'bar', data, style
+
+    def create_pollen_chart(self, ranking):
+        return io.BytesIO(self.charts.render(*self.pollen_chart_spec(ranking)))
 
-    def generate_pollen_tweet(self, symptom_counts):
-        sorted_symptoms = sorted(symptom_counts.items(), key=lambda x: x[1], reverse=True)
+    def submit_charts(self, ranking):
+        """投稿用のランキング（--report-dir 指定時は時間別・地方別も）の描画を開始し {名前: Future} を返す"""
+        specs = {'ranking': self.pollen_chart_spec(ranking)}
+        if self.report_dir:
+            style = {'fonts': self.chart_fonts, 'japanize': True, 'width': self.chart_width}
+            specs.update(report_specs(self.cube, *self.cube_window or self.collection_window(),
+                                      title='花粉症症状トレンド', style=style))
+        return self.charts.submit_all(specs)
+
+    def finish_charts(self, futures):
+        """描画の完了を待ち、レポート用は保存して投稿用の画像を返す"""
+        images = {name: future.result() for name, future in futures.items()}
+        chart_image = io.BytesIO(images.pop('ranking'))
+        if images:
+            for path in save_report(self.report_dir, self.campaign, images):
+                print(f"レポート用チャートを保存: {path}")
+        return chart_image
+
+    def report_day(self):
+        """集計結果を記録する日付（昨日）"""
+        return (datetime.now() - timedelta(days=1)).date()
+
+    def format_ranking_line(self, rank, symptom, count, trend, change="all"):
+        if trend is None:
+            return f"{rank}位: {symptom} ({count}件)"
+        # change: "all" は全行、"moved" は増減した行だけ平常比を表示
+        arrow = trend_arrow(trend)
+        if change == "all" or (change == "moved" and arrow != "→"):
+            return f"{rank}位: {symptom} ({count}件 {format_change(trend)}) {arrow}"
+        return f"{rank}位: {symptom} ({count}件) {arrow}"
+
+    def generate_pollen_tweet(self, ranking):
         yesterday = datetime.now() - timedelta(days=1)
         date_str = yesterday.strftime('%Y/%m/%d')
+        trends = {}
+        if self.trends is not None:
+            trends = self.trends.compare_all(self.trend_key, dict(ranking), self.report_day())
         
-        ranking_text = ""
-        for i, (symptom, count) in enumerate(sorted_symptoms, 1):
-            ranking_text += f"{i}位: {symptom} ({count}件)\n"
-        
-        # 最も多い症状の特定
-        if sorted_symptoms[0][1] > 0:
-            top_symptom = sorted_symptoms[0][0]
+        # 最も多い症状の特定（平常より大きく増えた症状があれば優先）
+        rising = [(t.z, name) for name, t in trends.items() if t is not None and t.z >= 2]
+        if rising:
+            top_symptom = max(rising)[1]
+            ratio = trends[top_symptom].ratio
+            change = f"平常の{ratio:.1f}倍です" if ratio else "平常より増えています"
+            comment = f"{top_symptom}の報告が{change}。"
+        elif ranking[0][1] > 0:
+            top_symptom = ranking[0][0]
             comment = f"{top_symptom}の報告が多くなっています。"
         else:
             comment = "昨日は花粉症の症状報告が少なめでした。"
         
-        tweet_text = f"""花粉症症状トレンド ({date_str})
+        def compose(change, hashtags, advice):
+            ranking_text = ""
+            for i, (symptom, count) in enumerate(ranking, 1):
+                ranking_text += self.format_ranking_line(i, symptom, count, trends.get(symptom), change) + "\n"
+            
+            return f"""花粉症症状トレンド ({date_str})
 
 昨日のランキング:
 {ranking_text.rstrip()}
 
-{comment}
-外出時はマスクや眼鏡での対策をおすすめします。
+{comment}{advice}
 
-#花粉症 #アレルギー #健康管理 #花粉対策"""
+{hashtags}"""
         
-        return tweet_text
+        # 文字数（280）に収まらない場合は、ハッシュタグ → 対策の一文 → 平常比の表示の順に減らし、
+        # それでも超える場合は末尾を切り詰める
+        full_tags = "#花粉症 #アレルギー #健康管理 #花粉対策"
+        short_tags = "#花粉症 #花粉対策"
+        advice = "\n外出時はマスクや眼鏡での対策をおすすめします。"
+        return fit_tweet(compose(*variant) for variant in (
+            ("all", full_tags, advice),
+            ("all", short_tags, advice),
+            ("all", short_tags, ""),
+            ("moved", short_tags, ""),
+            (None, short_tags, ""),
+        ))
 
     def post_tweet_with_image(self, text, image_buffer):
-        try:
-            auth = tweepy.OAuth1UserHandler(
-                self.api_key, self.api_secret,
-                self.access_token, self.access_token_secret
-            )
-            api_v1 = tweepy.API(auth)
-            
-            image_buffer.seek(0)
-            media = api_v1.media_upload(filename="pollen_chart.png", file=image_buffer)
-            
-            response = self.client.create_tweet(
-                text=text,
-                media_ids=[media.media_id]
-            )
-            
-            print(f"ツイート投稿成功: {response.data['id']}")
-            return True
-            
-        except Exception as e:
-            print(f"ツイート投稿エラー: {str(e)}")
-            return False
+        return self.publisher.post(text, image_buffer, name="pollen_chart")
 
-    def run_analysis(self):
+    def publish(self, symptom_counts, post=True, chart=True):
+        """集計結果からチャート・ツイート文を作成して投稿（ランキングはキューブから読む）"""
+        ranking = self.ranking()
+        # 描画は別プロセスか描画スレッドで、本文の生成と並行して進める
+        chart_futures = None
+        if chart:
+            print("チャート作成中...")
+            chart_futures = self.submit_charts(ranking)
+        
+        print("ツイート文生成中...")
+        with metrics.stage("text"):
+            tweet_text = self.generate_pollen_tweet(ranking)
+        
+        chart_image = None
+        if chart_futures:
+            with metrics.stage("chart"):
+                chart_image = self.finish_charts(chart_futures)
+        
+        if not post:
+            print("投稿をスキップしました")
+            return
+        
+        print("ツイート投稿中...")
+        with metrics.stage("post"):
+            success = self.post_tweet_with_image(tweet_text, chart_image)
+        
+        if success:
+            if self.trends is not None:
+                self.trends.update(self.trend_key, symptom_counts, self.report_day())
+            print("昨日の花粉症分析・投稿完了")
+        else:
+            print("投稿に失敗しました")
+
+    def run_analysis(self, post=True, chart=True):
         print("Po Analytics 昨日の花粉症分析開始")
         print(f"実行時刻: {datetime.now()}")
         
         try:
-            symptom_counts = self.collect_yesterday_pollen_data()
-            
-            print("チャート作成中...")
-            chart_image = self.create_pollen_chart(symptom_counts)
-            
-            print("ツイート文生成中...")
-            tweet_text = self.generate_pollen_tweet(symptom_counts)
-            
-            print("ツイート投稿中...")
-            success = self.post_tweet_with_image(tweet_text, chart_image)
+            with metrics.stage("collect"):
+                if self.offline:
+                    symptom_counts = self.collect_from_store()
+                elif self.estimate:
+                    symptom_counts = self.collect_estimates()
+                else:
+                    symptom_counts = self.collect_yesterday_pollen_data()
+                self.save_cube()
             
-            if success:
-                print("昨日の花粉症分析・投稿完了")
-            else:
-                print("投稿に失敗しました")
+            self.publish(symptom_counts, post=post, chart=chart)
                 
         except Exception as e:
+            metrics.error("run_analysis", e)
             print(f"エラーが発生しました: {str(e)}")
+        finally:
+            self.charts.close()
 
 if __name__ == "__main__":
-    analyzer = PollenAnalyzer()
-    analyzer.run_analysis()
+    parser = argparse.ArgumentParser(description="花粉症症状トレンド分析")
+    parser.add_argument("--consolidate", action="store_true",
+                        help="1回の検索で全症状を取得しローカルで振り分ける")
+    parser.add_argument("--depth", type=int, default=20,
+                        help="症状ごとの最大取得件数（100件/ページで取得）")
+    parser.add_argument("--bucket-time-limit", type=float, default=60,
+                        help="症状ごとの取得時間上限（秒）")
+    parser.add_argument("--store", default=os.getenv('TWEET_STORE_PATH'),
+                        help="取得済みツイートを保存するSQLiteファイル（取得済み期間は再取得しない）")
+    parser.add_argument("--offline", action="store_true",
+                        help="APIを使わず --store の保存済みデータを再分類して集計する")
+    parser.add_argument("--no-chart", action="store_true",
+                        help="チャートを作らない（matplotlib を読み込まない）。投稿は本文のみ")
+    parser.add_argument("--dry-run", action="store_true",
+                        help="集計と本文生成のみ行い投稿しない")
+    parser.add_argument("--trend-store", default=os.getenv('TREND_STORE_PATH'),
+                        help="症状ごとの平常値を保存するJSONファイル（ランキングに平常比の増減を表示）")
+    parser.add_argument("--keep-near-duplicates", action="store_true",
+                        help="ほぼ同じ本文のツイート（コピペ・bot連投）も1件ずつ数える")
+    parser.add_argument("--estimate", action="store_true",
+                        help="件数エンドポイントの総数 × 少数の標本の有効率で件数を推定する（信頼区間つき）")
+    parser.add_argument("--sample-size", type=int, default=SAMPLE_SIZE,
+                        help="推定モードで症状ごとに判定する標本数")
+    parser.add_argument("--cube", default=os.getenv('POLLEN_SYMPTOM_CUBE_PATH'),
+                        help="症状×都道府県×時間の集計キューブを保存するファイル（実行をまたいで使い回す）")
+    parser.add_argument("--image-format", choices=["png", "webp", "jpeg"], default="png",
+                        help="投稿する画像の形式（png はパレット化して軽量化）")
+    parser.add_argument("--chart-width", type=int, default=CHART_WIDTH,
+                        help="チャート画像の幅（ピクセル）")
+    parser.add_argument("--chart-cache", default=os.getenv('CHART_CACHE_DIR'),
+                        help="描画したチャートを内容のハッシュで保存するディレクトリ（同じ内容なら描画しない）")
+    parser.add_argument("--chart-workers", type=int, default=CHART_WORKERS,
+                        help="チャートを描画するプロセス数（0 はプロセスを使わずに描画）")
+    parser.add_argument("--report-dir",
+                        help="時間別・地方別のチャート（集計キューブから作成）を保存するディレクトリ")
+    parser.add_argument("--outbox", default=os.getenv('PUBLISH_OUTBOX'),
+                        help="投稿に失敗した本文・画像を保存するディレクトリ")
+    parser.add_argument("--resend-outbox", action="store_true",
+                        help="集計せず、--outbox に残っている投稿を送り直す")
+    parser.add_argument("--metrics", default=os.getenv('METRICS_PATH'),
+                        help="段階ごとの時間・API呼び出し・判定件数を書き出すJSONファイル")
+    parser.add_argument("--profile", help="収集処理の cProfile 結果を保存するファイル（.prof）")
+    args = parser.parse_args()
+    if args.offline and not args.store:
+        parser.error("--offline には --store の指定が必要です")
+    if args.offline and args.estimate:
+        parser.error("--offline と --estimate は同時に指定できません")
+    if args.resend_outbox and not args.outbox:
+        parser.error("--resend-outbox には --outbox の指定が必要です")
+    
+    metrics.start("pollen", args.metrics, args.profile)
+    analyzer = PollenAnalyzer(
+        consolidate_queries=args.consolidate,
+        max_tweets_per_bucket=args.depth,
+        bucket_time_limit=args.bucket_time_limit,
+        store_path=args.store,
+        offline=args.offline,
+        trend_path=args.trend_store,
+        near_dup=not args.keep_near_duplicates,
+        image_format=args.image_format,
+        chart_width=args.chart_width,
+        outbox=args.outbox,
+        estimate=args.estimate,
+        sample_size=args.sample_size,
+        cube_path=args.cube,
+        chart_cache=args.chart_cache,
+        chart_workers=args.chart_workers,
+        report_dir=args.report_dir
+    )
+    if args.resend_outbox:
+        sent, remaining = analyzer.publisher.resend_outbox()
+        print(f"再送: {sent}件（残り {remaining}件）")
+    else:
+        analyzer.run_analysis(post=not args.dry_run, chart=not args.no_chart)
+    metrics.finish()
@@ -0,0 +1,58 @@
+# -*- coding: utf-8 -*-
+"""benchmarks/baseline の保存と基準値との比較"""
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'benchmarks'))
+import baseline
+
+
+class CompareTest(unittest.TestCase):
+    BASE = {'kaze': {'wall': 2.0, 'tweets_per_sec': 100.0, 'peak_rss_mb': 80.0}}
+
+    def test_within_threshold(self):
+        results = {'kaze': {'wall': 2.4, 'tweets_per_sec': 80.0, 'peak_rss_mb': 99.0}}
+        self.assertEqual(baseline.compare(results, self.BASE, 0.25, ['wall', 'tweets_per_sec', 'peak_rss_mb']), [])
+
+    def test_lower_is_better_metrics(self):
+        results = {'kaze': {'wall': 3.0, 'tweets_per_sec': 100.0, 'peak_rss_mb': 80.0}}
+        messages = baseline.compare(results, self.BASE, 0.25, ['wall', 'tweets_per_sec'])
+        self.assertEqual(len(messages), 1)
+        self.assertTrue(messages[0].startswith('kaze: wall 2 -> 3'))
+
+    def test_higher_is_better_metrics(self):
+        results = {'kaze': {'wall': 1.0, 'tweets_per_sec': 50.0}}
+        messages = baseline.compare(results, self.BASE, 0.25, ['wall', 'tweets_per_sec'])
+        self.assertEqual(len(messages), 1)
+        self.assertIn('tweets_per_sec', messages[0])
+
+    def test_missing_cases_and_metrics_are_skipped(self):
+        results = {'pollen': {'wall': 99.0}, 'kaze': {'tweets_per_sec': 100.0}}
+        self.assertEqual(baseline.compare(results, self.BASE, 0.25, ['wall', 'peak_rss_mb']), [])
+
+
+class SaveLoadTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp)
+
+    def test_round_trip(self):
+        path = os.path.join(self.tmp, 'baseline.json')
+        baseline.save(path, CompareTest.BASE)
+        self.assertEqual(baseline.load(path), CompareTest.BASE)
+
+    def test_no_path_means_no_baseline(self):
+        self.assertEqual(baseline.load(None), {})
+
+    def test_missing_file_is_an_error(self):
+        with self.assertRaises(SystemExit):
+            baseline.load(os.path.join(self.tmp, 'missing.json'))
+
+
+if __name__ == '__main__':
+    unittest.main()
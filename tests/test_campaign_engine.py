@@ -0,0 +1,115 @@
+# -*- coding: utf-8 -*-
+"""campaign_engine のクエリ詰め込みと共通取得の集計"""
+import collections
+import contextlib
+import io
+import json
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+from datetime import datetime, timedelta, timezone
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'analytics-common'))
+from campaign_engine import QUERY_SUFFIX, CampaignEngine, build_query, pack_queries, split_window
+from replay import ReplayClient
+
+T0 = datetime(2024, 1, 10)
+
+
+class PackQueriesTest(unittest.TestCase):
+    def test_build_query(self):
+        self.assertEqual(build_query(['(風邪) (咳)', '花粉']), '((風邪) (咳) OR 花粉)' + QUERY_SUFFIX)
+
+    def test_fits_in_one_query(self):
+        self.assertEqual(pack_queries(['咳', '熱', '咳']), [build_query(['咳', '熱'])])
+
+    def test_splits_at_the_limit(self):
+        clauses = [f'語{i:02d}' for i in range(30)]
+        limit = len(build_query(clauses[:10]))
+        queries = pack_queries(clauses, limit)
+        self.assertEqual(queries, [build_query(clauses[i:i + 10]) for i in range(0, 30, 10)])
+        self.assertTrue(all(len(q) <= limit for q in queries))
+
+    def test_clause_longer_than_limit(self):
+        with self.assertRaises(ValueError):
+            pack_queries(['咳', 'x' * 100], max_length=50)
+
+
+class SplitWindowTest(unittest.TestCase):
+    def test_last_bucket_is_clipped(self):
+        buckets = split_window(T0, T0 + timedelta(hours=14), 6)
+        self.assertEqual([(s - T0, e - T0) for s, e in buckets], [
+            (timedelta(0), timedelta(hours=6)),
+            (timedelta(hours=6), timedelta(hours=12)),
+            (timedelta(hours=12), timedelta(hours=14)),
+        ])
+
+
+class FakeCampaign:
+    """症状名がそのまま本文に含まれていれば有効と数えるキャンペーン"""
+
+    def __init__(self, campaign, symptom_names, client):
+        self.campaign = campaign
+        self.symptom_names = symptom_names
+        self.client = client
+        self.cube = collections.Counter()
+
+    def search_clauses(self):
+        return list(self.symptom_names)
+
+    def collection_window(self):
+        return T0, T0 + timedelta(hours=12)
+
+    def classify_for_store(self, text, queries, tweet_id=None):
+        return [(name, True) for name in self.symptom_names if name in text]
+
+    def begin_cube(self, start_time, end_time):
+        self.cube.clear()
+
+
+class CollectTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.fixture = os.path.join(self.tmp, 'tweets.jsonl')
+        texts = ['咳が出る', 'くしゃみと咳', '今日は晴れ', 'くしゃみ']
+        with open(self.fixture, 'w', encoding='utf-8') as f:
+            for i in range(48):
+                created = (T0 + timedelta(minutes=15 * i)).replace(tzinfo=timezone.utc)
+                f.write(json.dumps({'id': 100 + i, 'text': texts[i % 4], 'created_at': created.isoformat()},
+                                   ensure_ascii=False) + '\n')
+        self.client = ReplayClient(self.fixture)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp)
+
+    def engine(self, depth, max_query_length=512):
+        campaigns = [FakeCampaign('kaze', ['咳'], self.client), FakeCampaign('pollen', ['くしゃみ'], self.client)]
+        return CampaignEngine(campaigns, max_tweets_per_bucket=depth, bucket_hours=12,
+                              max_query_length=max_query_length)
+
+    def collect(self, engine):
+        with contextlib.redirect_stdout(io.StringIO()):
+            engine.collection_window()
+            return engine.collect()
+
+    def test_one_query_for_all_campaigns(self):
+        engine = self.engine(depth=100)
+        self.assertEqual(engine.queries, [build_query(['咳', 'くしゃみ'])])
+        self.assertEqual(self.collect(engine), {'kaze': {'咳': 24}, 'pollen': {'くしゃみ': 24}})
+
+    def test_tweets_matched_by_several_queries_are_counted_once(self):
+        # 1節ずつ別クエリに分けると「くしゃみと咳」は両方のクエリで取れる
+        engine = self.engine(depth=100, max_query_length=len(build_query(['くしゃみ'])))
+        self.assertEqual(len(engine.queries), 2)
+        self.assertEqual(self.collect(engine), {'kaze': {'咳': 24}, 'pollen': {'くしゃみ': 24}})
+        self.assertEqual(sum(engine.campaigns[0].cube.values()), 24)
+
+    def test_depth_is_counted_per_campaign(self):
+        counts = self.collect(self.engine(depth=5))
+        self.assertEqual(counts, {'kaze': {'咳': 5}, 'pollen': {'くしゃみ': 5}})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,182 @@
+# -*- coding: utf-8 -*-
+"""chart_service のキャッシュと描画プロセスの使い分け"""
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+import unittest
+import warnings
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'analytics-common'))
+import chart_service
+from chart_service import ChartService, chart_key, report_specs, save_report
+from symptom_cube import SymptomCube
+
+try:
+    import matplotlib
+except ImportError:
+    matplotlib = None
+
+BAR = ('bar', {'labels': ['咳', '発熱'], 'values': [3, 1]}, {'title': '風邪', 'figsize': [4, 3], 'width': 200})
+
+rendered = []
+
+
+def fake_render(data, style):
+    """描画した回数を数えるだけの描画処理（このプロセスでの描画用）"""
+    rendered.append(data)
+    return ('png:' + repr(data)).encode('utf-8')
+
+
+def fake(n):
+    return ('fake', {'n': n}, {})
+
+
+class ChartKeyTest(unittest.TestCase):
+    def test_same_content_same_key(self):
+        self.assertEqual(chart_key(*BAR), chart_key('bar', {'values': [3, 1], 'labels': ['咳', '発熱']}, BAR[2]))
+
+    def test_any_change_changes_key(self):
+        keys = {
+            chart_key(*BAR),
+            chart_key('line', BAR[1], BAR[2]),
+            chart_key('bar', {'labels': ['咳', '発熱'], 'values': [3, 2]}, BAR[2]),
+            chart_key('bar', BAR[1], dict(BAR[2], title='花粉')),
+        }
+        self.assertEqual(len(keys), 4)
+
+
+class ChartServiceTestCase(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.cache = os.path.join(self.tmp, 'cache')
+        chart_service.RENDERERS['fake'] = fake_render
+        del rendered[:]
+
+    def tearDown(self):
+        del chart_service.RENDERERS['fake']
+        shutil.rmtree(self.tmp)
+
+
+class CacheTest(ChartServiceTestCase):
+    def test_cache_hit_skips_rendering(self):
+        first = ChartService(self.cache, workers=0)
+        image = first.render(*fake(1))
+        self.assertEqual(len(rendered), 1)
+        self.assertTrue(first.is_cached(*fake(1)))
+        # 別のインスタンス（次回の実行）でも描画しない
+        second = ChartService(self.cache, workers=3)
+        self.assertEqual(second.submit_all({'a': fake(1)})['a'].result(), image)
+        self.assertEqual(len(rendered), 1)
+        self.assertIsNone(second.pool)
+
+    def test_without_cache_dir_always_renders(self):
+        service = ChartService(workers=0)
+        service.render(*fake(1))
+        service.render(*fake(1))
+        self.assertEqual(len(rendered), 2)
+        self.assertFalse(service.is_cached(*fake(1)))
+
+    def test_prune_removes_least_recently_used(self):
+        service = ChartService(self.cache, workers=0)
+        for n in range(4):
+            service.render(*fake(n))
+        past = time.time() - 100
+        for n, path in enumerate(sorted(os.listdir(self.cache))):
+            os.utime(os.path.join(self.cache, path), (past + n, past + n))
+        service.render(*fake(0))   # 使ったものは新しい扱い
+        service.prune(max_files=2)
+        self.assertTrue(service.is_cached(*fake(0)))
+        self.assertEqual(len(os.listdir(self.cache)), 2)
+
+
+class PoolTest(ChartServiceTestCase):
+    def test_fewer_charts_than_workers_render_in_process(self):
+        service = ChartService(self.cache, workers=3)
+        futures = service.submit_all({'a': fake(1), 'b': fake(2)})
+        self.assertIsNone(service.pool)
+        self.assertEqual(futures['b'].result(), fake_render({'n': 2}, {}))
+        self.assertEqual(len(rendered), 3)
+
+    def test_in_process_rendering_does_not_block_submit(self):
+        release = threading.Event()
+
+        def slow_render(data, style):
+            release.wait(5)
+            return fake_render(data, style)
+
+        chart_service.RENDERERS['slow'] = slow_render
+        service = ChartService(self.cache, workers=3)
+        try:
+            futures = service.submit_all({'a': ('slow', {'n': 1}, {})})
+            # submit_all は描画の完了を待たずに戻る（描画スレッドで本文の生成と並行して描画する）
+            self.assertFalse(futures['a'].done())
+            self.assertEqual(rendered, [])
+            release.set()
+            self.assertEqual(futures['a'].result(), fake_render({'n': 1}, {}))
+            self.assertTrue(service.is_cached('slow', {'n': 1}, {}))
+        finally:
+            release.set()
+            service.close()
+            del chart_service.RENDERERS['slow']
+        self.assertIsNone(service.pool)
+        self.assertIsNone(service.thread)
+
+    def test_cached_charts_are_not_counted(self):
+        service = ChartService(self.cache, workers=2)
+        service.render(*fake(1))
+        service.render(*fake(2))
+        service.submit_all({'a': fake(1), 'b': fake(2), 'c': fake(3)})
+        self.assertIsNone(service.pool)
+
+    @unittest.skipIf(matplotlib is None, 'matplotlib が必要')
+    def test_enough_charts_use_the_pool(self):
+        service = ChartService(self.cache, workers=2)
+        try:
+            specs = {str(n): ('bar', {'labels': ['a'], 'values': [n]}, {'figsize': [6, 4], 'width': 300})
+                     for n in range(2)}
+            # 描画プロセスは警告の設定を引き継ぐ（日本語フォントが無い環境の警告を出さない）
+            with warnings.catch_warnings():
+                warnings.simplefilter('ignore')
+                futures = service.submit_all(specs)
+                self.assertIsNotNone(service.pool)
+                for future in futures.values():
+                    self.assertTrue(future.result().startswith(b'\x89PNG'))
+        finally:
+            service.close()
+        self.assertIsNone(service.pool)
+        # 描画プロセスの結果もキャッシュに保存される
+        self.assertTrue(all(service.is_cached(*spec) for spec in specs.values()))
+
+
+class ReportTest(unittest.TestCase):
+    def test_report_specs_from_cube(self):
+        start = datetime(2024, 1, 10)
+        cube = SymptomCube(['咳', '発熱'], hours=48)
+        cube.clear(start, start + timedelta(hours=3))
+        cube.update({('咳', start, '都内'): 2, ('発熱', start + timedelta(hours=2), '大阪'): 1})
+        specs = report_specs(cube, start, start + timedelta(hours=3), '風邪')
+        kind, data, style = specs['hourly']
+        self.assertEqual(kind, 'line')
+        self.assertEqual(data['labels'], ['01/10 09時', '01/10 10時', '01/10 11時'])
+        self.assertEqual(data['series'], {'咳': [2, 0, 0], '発熱': [0, 0, 1]})
+        self.assertEqual(style['title'], '風邪（1時間ごと）')
+        kind, data, _ = specs['regions']
+        self.assertEqual(dict(zip(data['labels'], data['values']))['関東'], 2)
+        self.assertEqual(dict(zip(data['labels'], data['values']))['近畿'], 1)
+
+    def test_save_report(self):
+        tmp = tempfile.mkdtemp()
+        try:
+            paths = save_report(os.path.join(tmp, 'report'), 'kaze', {'hourly': b'a', 'regions': b'b'})
+            self.assertEqual([os.path.basename(p) for p in paths], ['kaze_hourly.png', 'kaze_regions.png'])
+            self.assertEqual(sorted(os.listdir(os.path.join(tmp, 'report'))), ['kaze_hourly.png', 'kaze_regions.png'])
+        finally:
+            shutil.rmtree(tmp)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,205 @@
+# -*- coding: utf-8 -*-
+"""collector のトークンバケットと再試行"""
+import os
+import sys
+import time
+import unittest
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'analytics-common'))
+from collector import COUNTS_RECENT, SEARCH_RECENT, RateLimitedCollector, TokenBucket
+
+
+class ApiError(Exception):
+    """tweepy の HTTPException と同じく response.status_code / headers を持つ例外"""
+
+    def __init__(self, status_code, headers=None):
+        super().__init__(f'HTTP {status_code}')
+        self.response = SimpleNamespace(status_code=status_code, headers=headers or {})
+
+
+class Flaky:
+    """最初の数回は errors の例外を送出し、その後は result を返す関数"""
+
+    def __init__(self, errors, result='ok'):
+        self.errors = list(errors)
+        self.result = result
+        self.calls = []
+
+    def __call__(self, **kwargs):
+        self.calls.append(kwargs)
+        if self.errors:
+            raise self.errors.pop(0)
+        return self.result
+
+
+def make_collector(**kwargs):
+    kwargs.setdefault('backoff_base', 0.001)
+    kwargs.setdefault('max_backoff', 0.001)
+    return RateLimitedCollector(SimpleNamespace(), **kwargs)
+
+
+class TokenBucketTest(unittest.TestCase):
+    def test_acquire_consumes_tokens(self):
+        bucket = TokenBucket(3, 900)
+        for _ in range(3):
+            self.assertEqual(bucket.acquire(), 0.0)
+        self.assertLess(bucket.tokens, 1)
+
+    def test_sync_caps_tokens_and_updates_capacity(self):
+        bucket = TokenBucket(180, 900)
+        bucket.sync(450, 5, 0)
+        self.assertEqual(bucket.capacity, 450)
+        self.assertLessEqual(bucket.tokens, 5)
+        self.assertIsNone(bucket.reset_at)
+
+    def test_sync_does_not_raise_tokens(self):
+        bucket = TokenBucket(10, 900)
+        bucket.tokens = 2.0
+        bucket.sync(10, 8, 0)
+        self.assertLess(bucket.tokens, 3)
+
+    def test_exhausted_bucket_waits_for_reset(self):
+        bucket = TokenBucket(10, 1)
+        bucket.sync(10, 0, time.time() + 3600)
+        self.assertIsNotNone(bucket.reset_at)
+        # 補充の速さに関係なく、復帰時刻までは補充しない
+        bucket.updated -= 100
+        bucket._refill(time.monotonic())
+        self.assertEqual(bucket.tokens, 0)
+
+    def test_refills_to_capacity_after_reset(self):
+        bucket = TokenBucket(10, 900)
+        bucket.sync(10, 0, time.time() - 1)
+        self.assertEqual(bucket.acquire(), 0.0)
+        self.assertIsNone(bucket.reset_at)
+        self.assertGreaterEqual(bucket.tokens, 8)
+
+    def test_acquire_waits_until_reset(self):
+        bucket = TokenBucket(10, 3600)
+        bucket.sync(10, 0, time.time() + 0.3)
+        waited = bucket.acquire()
+        self.assertGreaterEqual(waited, 0.2)
+        self.assertIsNone(bucket.reset_at)
+
+
+class CallTest(unittest.TestCase):
+    def test_retries_rate_limit_and_syncs_bucket(self):
+        collector = make_collector()
+        func = Flaky([ApiError(429, {'x-rate-limit-limit': '180', 'x-rate-limit-remaining': '7',
+                                     'x-rate-limit-reset': '0'})])
+        self.assertEqual(collector.call(func, endpoint=SEARCH_RECENT, query='q'), 'ok')
+        self.assertEqual(func.calls, [{'query': 'q'}, {'query': 'q'}])
+        self.assertLessEqual(collector.bucket(SEARCH_RECENT).tokens, 7)
+
+    def test_retries_server_and_connection_errors(self):
+        collector = make_collector()
+        func = Flaky([ApiError(503), ConnectionError('reset by peer'), ApiError(500)])
+        self.assertEqual(collector.call(func), 'ok')
+        self.assertEqual(len(func.calls), 4)
+
+    def test_gives_up_after_max_retries(self):
+        collector = make_collector(max_retries=2)
+        func = Flaky([ApiError(503)] * 5)
+        with self.assertRaises(ApiError):
+            collector.call(func)
+        self.assertEqual(len(func.calls), 3)
+
+    def test_client_errors_are_not_retried(self):
+        collector = make_collector()
+        func = Flaky([ApiError(400)])
+        with self.assertRaises(ApiError):
+            collector.call(func)
+        self.assertEqual(len(func.calls), 1)
+
+    def test_response_hook_syncs_endpoint_bucket(self):
+        collector = make_collector()
+        response = SimpleNamespace(
+            url='https://api.twitter.com' + COUNTS_RECENT + '?query=x',
+            headers={'x-rate-limit-limit': '300', 'x-rate-limit-remaining': '0',
+                     'x-rate-limit-reset': str(int(time.time()) + 600)},
+        )
+        collector._on_response(response)
+        self.assertIsNotNone(collector.bucket(COUNTS_RECENT).reset_at)
+        self.assertIsNone(collector.bucket(SEARCH_RECENT).reset_at)
+
+    def test_watch_registers_hook_once(self):
+        session = SimpleNamespace(hooks={})
+        collector = RateLimitedCollector(SimpleNamespace(session=session))
+        collector.watch(session)
+        self.assertEqual(session.hooks['response'], [collector._on_response])
+
+
+class Pages:
+    """search_recent_tweets の代替。total 件を next_token でページに分けて返す"""
+
+    def __init__(self, total):
+        self.total = total
+        self.requests = []
+
+    def __call__(self, max_results, next_token=None, **kwargs):
+        self.requests.append(max_results)
+        start = int(next_token or 0)
+        end = min(start + max_results, self.total)
+        meta = {'next_token': str(end)} if end < self.total else {}
+        return SimpleNamespace(data=list(range(start, end)) or None, meta=meta)
+
+
+class PaginateTest(unittest.TestCase):
+    def test_follows_next_token_until_budget(self):
+        pages = Pages(1000)
+        tweets = list(make_collector().paginate(pages, budget=250, query='q'))
+        self.assertEqual(tweets, list(range(250)))
+        # 最後のページは残りの件数だけ要求する
+        self.assertEqual(pages.requests, [100, 100, 50])
+
+    def test_minimum_page_size(self):
+        pages = Pages(1000)
+        tweets = list(make_collector().paginate(pages, budget=5))
+        self.assertEqual(tweets, list(range(5)))
+        self.assertEqual(pages.requests, [10])
+
+    def test_reports_complete_on_last_page(self):
+        progress = {}
+        tweets = list(make_collector().paginate(Pages(130), budget=500, progress=progress))
+        self.assertEqual(len(tweets), 130)
+        self.assertTrue(progress['complete'])
+
+    def test_budget_reached_is_not_complete(self):
+        progress = {}
+        list(make_collector().paginate(Pages(130), budget=100, progress=progress))
+        self.assertNotIn('complete', progress)
+
+    def test_empty_result(self):
+        progress = {}
+        self.assertEqual(list(make_collector().paginate(Pages(0), progress=progress)), [])
+        self.assertTrue(progress['complete'])
+
+    def test_time_limit_stops_after_current_page(self):
+        pages = Pages(10000)
+        tweets = list(make_collector().paginate(pages, time_limit=1e-9))
+        self.assertEqual(len(tweets), 100)
+        self.assertEqual(len(pages.requests), 1)
+
+    def test_stops_reading_when_consumer_stops(self):
+        pages = Pages(1000)
+        iterator = make_collector().paginate(pages)
+        self.assertEqual([next(iterator) for _ in range(3)], [0, 1, 2])
+        self.assertEqual(len(pages.requests), 1)
+
+
+class RunTest(unittest.TestCase):
+    def test_collects_results_and_errors(self):
+        collector = make_collector(max_workers=2)
+
+        def fail():
+            raise ValueError('bad job')
+
+        results, errors = collector.run({'a': lambda: 1, 'b': fail, 'c': lambda: 3})
+        self.assertEqual(results, {'a': 1, 'c': 3})
+        self.assertEqual(list(errors), ['b'])
+        self.assertIsInstance(errors['b'], ValueError)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,70 @@
+# -*- coding: utf-8 -*-
+"""benchmarks/corpus の合成コーパス生成"""
+import collections
+import os
+import sys
+import unittest
+from datetime import datetime, timezone
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'benchmarks'))
+from corpus import DEFAULT_MIX, NEUTRAL, CorpusGenerator, parse_mix
+
+# 分析クラスを読み込まずに使う小さな辞書
+VOCAB = {
+    'cold_groups': [('咳', '風邪'), ('頭痛', '鼻水')],
+    'pollen_terms': ['くしゃみ', '目のかゆみ'],
+    'pollen_context': ['花粉'],
+    'noise': ['治った', 'bot'],
+    'non_cold_headache': ['肩こり'],
+    'cold_exclusions': ['風邪'],
+}
+
+
+class ParseMixTest(unittest.TestCase):
+    def test_default(self):
+        self.assertEqual(parse_mix(None), DEFAULT_MIX)
+
+    def test_custom(self):
+        self.assertEqual(parse_mix('cold=0.5,neutral=0.5'), {'cold': 0.5, 'neutral': 0.5})
+
+    def test_unknown_kind(self):
+        with self.assertRaises(ValueError):
+            parse_mix('flu=1')
+
+
+class CorpusGeneratorTest(unittest.TestCase):
+    def test_same_seed_same_corpus(self):
+        first = list(CorpusGenerator(VOCAB, seed=7).records(200))
+        second = list(CorpusGenerator(VOCAB, seed=7).records(200))
+        self.assertEqual(first, second)
+        self.assertNotEqual(first, list(CorpusGenerator(VOCAB, seed=8).records(200)))
+
+    def test_only_requested_kinds(self):
+        texts = list(CorpusGenerator(VOCAB, mix={'neutral': 1.0, 'cold': 0}).texts(50))
+        self.assertTrue(all(any(text.startswith(n) for n in NEUTRAL) for text in texts))
+
+    def test_kinds_follow_the_mix(self):
+        generator = CorpusGenerator(VOCAB, mix={'retweet': 0.25, 'neutral': 0.75}, seed=1)
+        counts = collections.Counter(
+            'retweet' if text.startswith(('RT @', '@')) else 'neutral' for text in generator.texts(4000))
+        self.assertAlmostEqual(counts['retweet'] / 4000, 0.25, delta=0.03)
+
+    def test_cold_texts_contain_a_whole_group(self):
+        generator = CorpusGenerator(VOCAB, mix={'cold': 1.0}, seed=3)
+        for text in generator.texts(100):
+            self.assertTrue(any(all(term in text for term in group) for group in VOCAB['cold_groups']), text)
+
+    def test_records_span_the_window_in_id_order(self):
+        start = datetime(2024, 1, 1, tzinfo=timezone.utc)
+        records = list(CorpusGenerator(VOCAB).records(100, hours=10, start=start))
+        ids = [r['id'] for r in records]
+        self.assertEqual(ids, sorted(set(ids)))
+        self.assertEqual(records[0]['created_at'], start.isoformat())
+        last = datetime.fromisoformat(records[-1]['created_at'])
+        self.assertLess((last - start).total_seconds(), 10 * 3600)
+        self.assertEqual(set(records[0]), {'id', 'text', 'created_at', 'author_id', 'location',
+                                           'like_count', 'retweet_count'})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,168 @@
+# -*- coding: utf-8 -*-
+"""estimation の層別推定と信頼区間"""
+import json
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+from datetime import datetime, timedelta, timezone
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'analytics-common'))
+from collector import RateLimitedCollector
+from estimation import (Estimate, SymptomEstimator, apportion, format_estimate, split_window,
+                        stratified_estimate, wilson_interval)
+from replay import ReplayClient
+
+T0 = datetime(2024, 1, 10, tzinfo=timezone.utc)
+
+
+class WilsonIntervalTest(unittest.TestCase):
+    def test_known_values(self):
+        low, high = wilson_interval(0.5, 100)
+        self.assertAlmostEqual(low, 0.4038, places=4)
+        self.assertAlmostEqual(high, 0.5962, places=4)
+        low, high = wilson_interval(0.0, 20)
+        self.assertEqual(low, 0.0)
+        self.assertAlmostEqual(high, 0.1611, places=4)
+
+    def test_no_sample(self):
+        self.assertEqual(wilson_interval(0.3, 0), (0.0, 1.0))
+
+
+class StratifiedEstimateTest(unittest.TestCase):
+    def test_single_stratum(self):
+        estimate = stratified_estimate([(1000, 100, 40)])
+        self.assertEqual((estimate.volume, estimate.sampled, estimate.valid), (1000, 100, 40))
+        self.assertAlmostEqual(estimate.precision, 0.4)
+        self.assertEqual(estimate.count, 400)
+        self.assertLess(estimate.low, 400)
+        self.assertGreater(estimate.high, 400)
+
+    def test_strata_are_weighted_by_volume(self):
+        estimate = stratified_estimate([(900, 25, 25), (100, 25, 0)])
+        self.assertAlmostEqual(estimate.precision, 0.9)
+        self.assertEqual(estimate.count, 900)
+
+    def test_more_samples_give_a_narrower_interval(self):
+        small = stratified_estimate([(1000, 20, 10)])
+        large = stratified_estimate([(1000, 200, 100)])
+        self.assertLess(large.high - large.low, small.high - small.low)
+
+    def test_census_is_exact(self):
+        self.assertEqual(stratified_estimate([(10, 10, 7), (5, 5, 1)]), Estimate(15, 15, 8, 8 / 15, 8, 8))
+
+    def test_strata_without_samples_are_filled(self):
+        estimate = stratified_estimate([(100, 20, 10), (300, 0, 0)])
+        self.assertAlmostEqual(estimate.precision, 0.5)
+        self.assertEqual(estimate.volume, 400)
+        self.assertEqual(estimate.count, 200)
+
+    def test_nothing_sampled(self):
+        self.assertEqual(stratified_estimate([(50, 0, 0)]), Estimate(50, 0, 0, 0.0, 0, 50))
+
+    def test_zero_volume_uses_samples(self):
+        estimate = stratified_estimate([(0, 10, 5), (0, 10, 5)])
+        self.assertAlmostEqual(estimate.precision, 0.5)
+        self.assertEqual(estimate.count, 0)
+
+
+class HelpersTest(unittest.TestCase):
+    def test_split_window_on_hour_boundaries(self):
+        start = T0 + timedelta(minutes=30)
+        windows = split_window(start, start + timedelta(hours=10), 4)
+        self.assertEqual(windows[0][0], start)
+        self.assertEqual(windows[-1][1], start + timedelta(hours=10))
+        self.assertTrue(all(s.minute == 0 for s, _ in windows[1:]))
+        self.assertTrue(all(a[1] == b[0] for a, b in zip(windows, windows[1:])))
+
+    def test_short_window_is_not_split_within_an_hour(self):
+        self.assertEqual(split_window(T0, T0 + timedelta(minutes=40), 4), [(T0, T0 + timedelta(minutes=40))])
+
+    def test_apportion_keeps_total(self):
+        self.assertEqual(apportion(10, [1, 1, 1]), [3, 4, 3])
+        self.assertEqual(sum(apportion(97, [0.3, 2.5, 0, 1.1, 7])), 97)
+        self.assertEqual(apportion(5, [0, 0]), [0, 0])
+
+    def test_format_estimate(self):
+        line = format_estimate('咳', Estimate(12000, 100, 25, 0.25, 2300, 3800))
+        self.assertEqual(line, '咳: 推定3,000件（95%信頼区間 2,300〜3,800件、総数12,000件 × 有効率25.0%、標本100件）')
+
+
+class FakeAnalyzer:
+    """RT とメンションを除外する分析クラス"""
+    symptom_names = ['咳', '発熱']
+    bucket_time_limit = 10
+
+    def __init__(self, client):
+        self.client = client
+        self.collector = RateLimitedCollector(client, max_workers=2)
+
+    def build_symptom_query(self, symptom_name):
+        return {'咳': '(風邪) (咳)', '発熱': '(風邪) (熱)'}[symptom_name]
+
+    def rejection_reason(self, text, symptom_name, tweet_id=None):
+        return 'retweet_or_reply' if text.startswith(('RT @', '@')) else None
+
+
+class SymptomEstimatorTest(unittest.TestCase):
+    TEXTS = ['風邪で咳', 'RT @a 風邪で咳', '風邪で熱', '@b 風邪で咳と熱', '晴れ']
+
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        fixture = os.path.join(self.tmp, 'tweets.jsonl')
+        with open(fixture, 'w', encoding='utf-8') as f:
+            for i in range(200):
+                f.write(json.dumps({'id': 1000 + i, 'text': self.TEXTS[i % 5],
+                                    'created_at': (T0 + timedelta(minutes=6 * i)).isoformat()},
+                                   ensure_ascii=False) + '\n')
+        self.client = ReplayClient(fixture)
+        self.end = T0 + timedelta(hours=20)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp)
+
+    def test_census_counts_are_exact(self):
+        estimator = SymptomEstimator(FakeAnalyzer(self.client), sample_size=400, strata=4)
+        estimates, failures = estimator.run(T0, self.end)
+        self.assertEqual(failures, {})
+        # 咳: 5件中3件が一致しうち1件が有効 / 発熱: 2件が一致しうち1件が有効
+        self.assertEqual((estimates['咳'].volume, estimates['咳'].count), (120, 40))
+        self.assertEqual((estimates['発熱'].volume, estimates['発熱'].count), (80, 40))
+        self.assertEqual(len(estimator.hourly['咳']), 20)
+        self.assertEqual(sum(n for _, n in estimator.hourly['咳']), 40)
+
+    def test_sampled_estimate_covers_the_truth(self):
+        estimator = SymptomEstimator(FakeAnalyzer(self.client), sample_size=40, strata=4)
+        estimates, _ = estimator.run(T0, self.end)
+        estimate = estimates['咳']
+        self.assertEqual(estimate.volume, 120)
+        self.assertEqual(estimate.sampled, 40)
+        self.assertLessEqual(estimate.low, 40)
+        self.assertGreaterEqual(estimate.high, 40)
+        # 件数の取得は1回、標本の取得は時間帯ごとに1回
+        self.assertEqual(self.client.calls, 2 * (1 + 4))
+
+    def test_failed_symptom_is_reported(self):
+        client = self.client
+
+        class CountsFail:
+            """発熱の件数だけ取得に失敗するクライアント"""
+
+            def __getattr__(self, name):
+                return getattr(client, name)
+
+            def get_recent_tweets_count(self, query, **kwargs):
+                if '熱' in query:
+                    raise ValueError('件数を取得できません')
+                return client.get_recent_tweets_count(query, **kwargs)
+
+        analyzer = FakeAnalyzer(CountsFail())
+        estimates, failures = SymptomEstimator(analyzer, sample_size=40).run(T0, self.end)
+        self.assertEqual(list(estimates), ['咳'])
+        self.assertIsInstance(failures['発熱'], ValueError)
+        self.assertEqual(list(failures), ['発熱'])
+
+
+if __name__ == '__main__':
+    unittest.main()
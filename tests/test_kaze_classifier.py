@@ -0,0 +1,82 @@
+# -*- coding: utf-8 -*-
+"""kaze_classifier.KazeClassifier の症状の振り分けと除外判定"""
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'kaze-analytics'))
+from kaze_classifier import KazeClassifier
+
+
+class ClassifySymptomsTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.classifier = KazeClassifier()
+
+    def test_symptom_needs_cold_context(self):
+        self.assertEqual(self.classifier.classify_symptoms('風邪で咳が止まらない'), ['咳'])
+        self.assertEqual(self.classifier.classify_symptoms('咳が止まらない'), [])
+
+    def test_several_symptoms_in_declared_order(self):
+        text = '風邪で鼻水と喉が痛い、熱もある'
+        self.assertEqual(self.classifier.classify_symptoms(text), ['喉の症状', '発熱', '鼻の症状'])
+
+    def test_headache_groups(self):
+        # 「風邪による頭痛」は (頭痛 鼻水) などの組がすべて含まれる場合だけ
+        self.assertEqual(self.classifier.classify_symptoms('頭痛と鼻水がつらい'), ['風邪による頭痛'])
+        self.assertEqual(self.classifier.classify_symptoms('頭痛がつらい'), [])
+
+    def test_matches_per_symptom_query_terms(self):
+        # まとめた検索の振り分けが、症状ごとのクエリ（語の組のいずれかをすべて含む）と一致すること
+        texts = [
+            '風邪ひいて咳と微熱', '喉痛い 風邪かな', 'ノドが痛い', '頭痛 調子悪い', '偏頭痛 風邪',
+            'はなみずが 風邪', '熱っぽい', 'ゴホゴホ風邪', '',
+        ]
+        for text in texts:
+            expected = [name for name, groups in self.classifier.symptom_terms.items()
+                        if any(all(term in text for term in group) for group in groups)]
+            with self.subTest(text=text):
+                self.assertEqual(self.classifier.classify_symptoms(text), expected)
+
+    def test_combined_query_contains_every_clause(self):
+        query = self.classifier.build_combined_query()
+        self.assertTrue(query.endswith(' -is:retweet lang:ja'))
+        for clause in self.classifier.search_clauses():
+            self.assertIn(clause, query)
+        for name in self.classifier.symptom_patterns:
+            self.assertEqual(self.classifier.query_symptoms[self.classifier.build_symptom_query(name)], name)
+
+
+class RejectionReasonTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.classifier = KazeClassifier()
+
+    def test_reasons(self):
+        cases = [
+            ('RT @someone 風邪で咳', '咳', 'retweet_or_reply'),
+            ('@friend 風邪で咳', '咳', 'retweet_or_reply'),
+            ('風邪の咳が治った', '咳', 'noise'),
+            ('頭痛 風邪 寝不足かも', '風邪による頭痛', 'not_cold_headache'),
+            ('頭痛 風邪っぽい', '風邪による頭痛', None),
+            ('風邪で咳がつらい', '咳', None),
+        ]
+        for text, symptom, reason in cases:
+            with self.subTest(text=text):
+                self.assertEqual(self.classifier.rejection_reason(text, symptom), reason)
+                self.assertEqual(self.classifier.is_valid_tweet(text, symptom), reason is None)
+
+    def test_precomputed_match_gives_same_result(self):
+        text = '頭痛 風邪 肩こり'
+        matched = self.classifier.matcher.match(text)
+        self.assertEqual(self.classifier.rejection_reason(text, '風邪による頭痛', matched),
+                         self.classifier.rejection_reason(text, '風邪による頭痛'))
+
+    def test_no_near_duplicate_filter(self):
+        text = '風邪で咳がとまらなくて一晩中ねむれなかった、しんどい'
+        for tweet_id in (1, 2):
+            self.assertTrue(self.classifier.is_valid_tweet(text, '咳', tweet_id=tweet_id))
+
+
+if __name__ == '__main__':
+    unittest.main()
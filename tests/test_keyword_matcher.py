@@ -0,0 +1,89 @@
+# -*- coding: utf-8 -*-
+"""keyword_matcher.KeywordMatcher の照合結果"""
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'analytics-common'))
+from keyword_matcher import KeywordMatcher
+
+
+def naive_match(categories, text):
+    """部分文字列の検索で求めた一致カテゴリ（比較用）"""
+    return {category for category, keywords in categories.items() if any(k in text for k in keywords)}
+
+
+class KeywordMatcherTest(unittest.TestCase):
+    CATEGORIES = {
+        'noise': ['治った', '映画', 'bot'],
+        'cold': ['風邪', '鼻水', '咳'],
+        'headache': ['頭痛', '偏頭痛'],
+    }
+
+    def setUp(self):
+        self.matcher = KeywordMatcher(self.CATEGORIES)
+
+    def test_match_returns_categories(self):
+        self.assertEqual(self.matcher.match('風邪で鼻水が止まらない'), {'cold'})
+        self.assertEqual(self.matcher.match('風邪で頭痛'), {'cold', 'headache'})
+        self.assertEqual(self.matcher.match('今日は良い天気'), set())
+
+    def test_scan_returns_every_keyword(self):
+        found = self.matcher.scan('偏頭痛と咳、風邪かも')
+        self.assertEqual(found, {'headache': {'偏頭痛', '頭痛'}, 'cold': {'咳', '風邪'}})
+
+    def test_overlapping_keywords(self):
+        # 失敗リンクで、途中まで一致した別のキーワードに移れること
+        matcher = KeywordMatcher({'a': ['abcd'], 'b': ['bce'], 'c': ['cd']})
+        self.assertEqual(matcher.match('abce'), {'b'})
+        self.assertEqual(matcher.match('xabcd'), {'a', 'c'})
+        self.assertEqual(matcher.scan('abcbce'), {'b': {'bce'}})
+
+    def test_same_keyword_in_several_categories(self):
+        matcher = KeywordMatcher({'x': ['熱'], 'y': ['熱', '発熱']})
+        self.assertEqual(matcher.scan('発熱'), {'x': {'熱'}, 'y': {'熱', '発熱'}})
+
+    def test_empty_keywords_are_ignored(self):
+        matcher = KeywordMatcher({'x': ['', '咳']})
+        self.assertEqual(matcher.match('なにもない'), set())
+        self.assertEqual(matcher.match('咳'), {'x'})
+
+    def test_agrees_with_substring_search(self):
+        texts = [
+            '風邪ひいた', 'botです', '映画みて治った', '鼻水と頭痛', '',
+            '偏頭痛持ち', 'ずっと咳', '風邪風邪風邪', '頭頭痛痛',
+        ]
+        for text in texts:
+            with self.subTest(text=text):
+                self.assertEqual(self.matcher.match(text), naive_match(self.CATEGORIES, text))
+
+    def test_batch(self):
+        texts = ['風邪', '映画', '']
+        self.assertEqual(self.matcher.match_batch(texts), [self.matcher.match(t) for t in texts])
+        self.assertEqual(self.matcher.scan_batch(texts), [self.matcher.scan(t) for t in texts])
+
+
+
+class KanaFoldingTest(unittest.TestCase):
+    def test_hiragana_keyword_matches_any_kana(self):
+        matcher = KeywordMatcher({'cold': ['せき', '鼻水']})
+        for text in ('せきが出る', 'セキが出る', 'ｾｷが出る', '鼻水'):
+            with self.subTest(text=text):
+                self.assertEqual(matcher.match(text), {'cold'})
+
+    def test_scan_reports_the_keyword_as_given(self):
+        matcher = KeywordMatcher({'cold': ['セキ込み']})
+        self.assertEqual(matcher.scan('ひどいせき込み'), {'cold': {'セキ込み'}})
+
+    def test_katakana_only_keyword_matches_katakana_only(self):
+        matcher = KeywordMatcher({'pollen': ['スギ']})
+        self.assertEqual(matcher.match('スギ花粉'), {'pollen'})
+        self.assertEqual(matcher.match('ｽｷﾞ花粉'), {'pollen'})
+        self.assertEqual(matcher.match('食べすぎ'), set())
+
+    def test_full_width_letters(self):
+        matcher = KeywordMatcher({'noise': ['bot']})
+        self.assertEqual(matcher.match('ＢＯＴです'), {'noise'})
+
+if __name__ == '__main__':
+    unittest.main()
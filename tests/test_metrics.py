@@ -0,0 +1,107 @@
+# -*- coding: utf-8 -*-
+"""metrics の段階・件数の記録と書き出し"""
+import contextlib
+import io
+import json
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'analytics-common'))
+import metrics
+
+
+def busy():
+    return sum(i * i for i in range(1000))
+
+
+class MetricsTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmp, 'metrics.json')
+
+    def tearDown(self):
+        metrics._active = None
+        shutil.rmtree(self.tmp)
+
+    def finish(self):
+        with contextlib.redirect_stdout(io.StringIO()):
+            return metrics.finish()
+
+    def test_not_started_records_nothing(self):
+        self.assertIs(metrics.start('run'), metrics._NULL)
+        with metrics.stage('collect'):
+            metrics.incr('api.calls')
+            metrics.observe('wait_sec', 1.5)
+            metrics.classified('noise')
+        self.assertIsNone(self.finish())
+
+    def test_records_are_written(self):
+        metrics.start('kaze', self.path)
+        for _ in range(2):
+            with metrics.stage('collect'):
+                metrics.incr('api.calls')
+        metrics.incr('tweets', 10)
+        metrics.observe('upload_bytes', 100)
+        metrics.observe('upload_bytes', 300)
+        metrics.classified(None)
+        metrics.classified('noise')
+        metrics.classified('noise')
+        with self.assertRaises(RuntimeError):
+            with metrics.stage('publish'):
+                raise RuntimeError('失敗')
+        metrics.error('publish', RuntimeError('失敗'))
+
+        data = self.finish()
+        with open(self.path, encoding='utf-8') as f:
+            self.assertEqual(json.load(f), data)
+        self.assertEqual(data['run'], 'kaze')
+        self.assertEqual(data['stages']['collect']['count'], 2)
+        self.assertEqual(data['stages']['publish']['count'], 1)   # 例外でも時間を記録
+        self.assertEqual(data['counters'], {'api.calls': 2, 'classify.accepted': 1,
+                                            'classify.rejected.noise': 2, 'tweets': 10})
+        self.assertEqual(data['values'], {'upload_bytes': {'count': 2, 'sum': 400, 'max': 300}})
+        self.assertEqual(data['errors'], [{'stage': 'publish', 'type': 'RuntimeError', 'message': '失敗'}])
+        # finish() 後は計測しない
+        self.assertIs(metrics.current(), metrics._NULL)
+
+    def test_counters_from_threads(self):
+        recorder = metrics.start('run', self.path)
+
+        def work():
+            for _ in range(1000):
+                metrics.incr('n')
+
+        threads = [threading.Thread(target=work) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(recorder.counters['n'], 4000)
+
+    def test_profile_of_several_threads(self):
+        profile_path = os.path.join(self.tmp, 'run.prof')
+        metrics.start('run', profile_path=profile_path)
+
+        def work():
+            with metrics.profiled():
+                with metrics.profiled():   # 入れ子は外側だけ計測
+                    busy()
+
+        threads = [threading.Thread(target=work) for _ in range(3)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(len(metrics.current().profiles), 3)
+        data = self.finish()
+        self.assertTrue(os.path.exists(profile_path))
+        self.assertFalse(os.path.exists(self.path))
+        self.assertTrue(any('busy' in entry['function'] for entry in data['profile']['top']))
+
+
+if __name__ == '__main__':
+    unittest.main()
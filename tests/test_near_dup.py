@@ -0,0 +1,84 @@
+# -*- coding: utf-8 -*-
+"""near_dup のほぼ重複の判定"""
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'analytics-common'))
+from near_dup import NearDuplicateFilter, shingles, signature, similarity
+
+ORIGINAL = '今日から風邪で咳と鼻水が止まらない、明日の会議どうしよう'
+COPY = '@someone 今日から風邪で咳と鼻水が止まらない、明日の会議どうしよう https://t.co/abc'
+EDITED = '今日から風邪で咳と鼻水が止まらない、明日の会議どうしようかな'
+OTHER = '花粉がひどくて目がかゆい、薬を飲んでも全然効かない一日だった'
+
+
+class Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class SignatureTest(unittest.TestCase):
+    def test_shingles_ignore_urls_mentions_and_spaces(self):
+        self.assertEqual(shingles(COPY), shingles(ORIGINAL))
+        self.assertEqual(shingles('ｾｷ が'), {'せきが'})
+
+    def test_similarity(self):
+        sig = signature(shingles(ORIGINAL))
+        self.assertEqual(len(sig), 64)
+        self.assertEqual(similarity(sig, sig), 1.0)
+        self.assertGreater(similarity(sig, signature(shingles(EDITED))), 0.8)
+        self.assertLess(similarity(sig, signature(shingles(OTHER))), 0.3)
+
+
+class NearDuplicateFilterTest(unittest.TestCase):
+    def test_near_copies_point_to_the_first(self):
+        dups = NearDuplicateFilter()
+        self.assertIsNone(dups.check(1, ORIGINAL))
+        self.assertEqual(dups.check(2, COPY), 1)
+        self.assertEqual(dups.check(3, EDITED), 1)
+        self.assertIsNone(dups.check(4, OTHER))
+        self.assertEqual(dups.duplicates, 2)
+
+    def test_same_key_gives_the_same_result(self):
+        dups = NearDuplicateFilter()
+        self.assertIsNone(dups.check(1, ORIGINAL))
+        self.assertEqual(dups.check(2, COPY), 1)
+        # 症状ごとの検索で同じツイートが何度出ても結果は変わらない
+        self.assertIsNone(dups.check(1, ORIGINAL))
+        self.assertEqual(dups.check(2, COPY), 1)
+        self.assertEqual(dups.checked, 2)
+
+    def test_short_texts_are_not_checked(self):
+        dups = NearDuplicateFilter()
+        self.assertIsNone(dups.check(1, '風邪ひいた'))
+        self.assertIsNone(dups.check(2, '風邪ひいた'))
+        self.assertIsNone(dups.check(3, 'あ' * 40))
+        self.assertIsNone(dups.check(4, 'あ' * 40))
+        self.assertEqual(len(dups), 0)
+
+    def test_old_items_expire(self):
+        clock = Clock()
+        dups = NearDuplicateFilter(ttl=60, clock=clock)
+        dups.check(1, ORIGINAL)
+        clock.now = 61
+        self.assertIsNone(dups.check(2, COPY))
+        self.assertEqual(list(dups.items), [2])
+        self.assertTrue(all(keys == [2] for keys in dups.index.values()))
+
+    def test_max_items(self):
+        dups = NearDuplicateFilter(max_items=2)
+        for key in range(5):
+            dups.check(key, f'{key}番目の本文です、今日から風邪で咳と鼻水が止まらない')
+        self.assertEqual(len(dups), 2)
+
+    def test_bands_must_divide_num_perm(self):
+        with self.assertRaises(ValueError):
+            NearDuplicateFilter(num_perm=64, bands=10)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,58 @@
+# -*- coding: utf-8 -*-
+"""plotting の matplotlib 遅延読み込み"""
+import os
+import subprocess
+import sys
+import textwrap
+import unittest
+
+COMMON = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'analytics-common')
+sys.path.insert(0, COMMON)
+
+try:
+    import matplotlib
+except ImportError:
+    matplotlib = None
+
+
+def run_python(code):
+    """別プロセスで code を実行して標準出力を返す（読み込み済みのモジュールを調べるため）"""
+    env = dict(os.environ)
+    env.pop('MPLBACKEND', None)
+    result = subprocess.run([sys.executable, '-c', textwrap.dedent(code)], capture_output=True,
+                            text=True, cwd=COMMON, env=env, check=True)
+    return result.stdout.strip()
+
+
+class LazyImportTest(unittest.TestCase):
+    def test_import_does_not_load_matplotlib(self):
+        output = run_python('''
+            import sys
+            import plotting, chart_service
+            print('matplotlib' in sys.modules)
+        ''')
+        self.assertEqual(output, 'False')
+
+    @unittest.skipIf(matplotlib is None, 'matplotlib が必要')
+    def test_get_pyplot_uses_agg_once(self):
+        output = run_python('''
+            import plotting
+            plt = plotting.get_pyplot()
+            print(plt.get_backend().lower(), plotting.get_pyplot() is plt)
+        ''')
+        self.assertEqual(output, 'agg True')
+
+    @unittest.skipIf(matplotlib is None, 'matplotlib が必要')
+    def test_figure_dpi_gives_requested_width(self):
+        import plotting
+        plt = plotting.get_pyplot()
+        fig = plt.figure(figsize=(12, 6))
+        try:
+            self.assertEqual(plotting.figure_dpi(fig, 1200), 100)
+            self.assertEqual(plotting.figure_dpi(fig, 600), 50)
+        finally:
+            plt.close(fig)
+
+
+if __name__ == '__main__':
+    unittest.main()
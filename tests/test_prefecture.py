@@ -0,0 +1,57 @@
+# -*- coding: utf-8 -*-
+"""prefecture の地域の文字列から都道府県への解決"""
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'analytics-common'))
+from prefecture import PREFECTURES, REGIONS, Place, PrefectureResolver, resolve
+
+
+class ResolveTest(unittest.TestCase):
+    def test_free_text_locations(self):
+        cases = [
+            ('都内', '13'),
+            ('Tokyo, Japan', '13'),
+            ('ＴＯＫＹＯ', '13'),
+            ('トウキョウ', '13'),
+            ('札幌在住', '01'),
+            ('横浜市青葉区', '14'),
+            ('東京都', '13'),          # 「京都」を含むが東京
+            ('京都市', '26'),
+            ('神奈川→大阪', '14'),     # 先に出てきた方
+            ('関西在住、神戸出身', '28'),  # 地方より都道府県を優先
+        ]
+        for location, code in cases:
+            with self.subTest(location=location):
+                place = resolve(location)
+                self.assertEqual(place.code, code)
+                self.assertEqual(place, PrefectureResolver().places[code])
+
+    def test_region_only(self):
+        self.assertEqual(resolve('関西'), Place(None, None, '近畿'))
+        self.assertEqual(resolve('首都圏のどこか'), Place(None, None, '関東'))
+
+    def test_romaji_must_be_a_word(self):
+        self.assertIsNone(resolve('jamie'))
+        self.assertIsNone(resolve('chibaken'))
+        self.assertEqual(resolve('mie / japan').code, '24')
+
+    def test_unknown_and_empty(self):
+        self.assertIsNone(resolve('地球'))
+        self.assertIsNone(resolve(''))
+        self.assertIsNone(resolve(None))
+
+    def test_regions(self):
+        self.assertEqual(resolve('那覇').region, '九州・沖縄')
+        self.assertEqual(sorted(code for codes in REGIONS.values() for code in codes),
+                         [code for code, *_ in PREFECTURES])
+
+    def test_custom_table(self):
+        resolver = PrefectureResolver(prefectures=[('13', '東京都', 'ttt')], region_aliases={})
+        self.assertEqual(resolver.resolve('ttt').code, '13')
+        self.assertIsNone(resolver.resolve('関西'))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,194 @@
+# -*- coding: utf-8 -*-
+"""publisher の投稿・再試行・outbox への保存と再送"""
+import contextlib
+import io
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'analytics-common'))
+import publisher
+from collector import RateLimitedCollector
+from publisher import Publisher, optimize_image
+
+try:
+    from PIL import Image, ImageDraw
+except ImportError:
+    Image = None
+
+CREDENTIALS = ('key', 'secret', 'token', 'token-secret')
+# 1x1 の白い PNG（Pillow の有無によらず使える画像）
+TINY_PNG = (b'\x89PNG\r\n\x1a\n\x00\x00\x00\rIHDR\x00\x00\x00\x01\x00\x00\x00\x01\x08\x02\x00\x00\x00\x90wS'
+            b'\xde\x00\x00\x00\x0cIDATx\x9cc\xf8\xff\xff?\x00\x05\xfe\x02\xfe\r\xefF\xb8\x00\x00\x00\x00IEND'
+            b'\xaeB`\x82')
+
+
+class ApiError(Exception):
+    """tweepy の HTTPException と同じく response.status_code / headers を持つ例外"""
+
+    def __init__(self, status_code):
+        super().__init__(f'HTTP {status_code}')
+        self.response = SimpleNamespace(status_code=status_code, headers={})
+
+
+class FakeClient:
+    """errors を順に送出してから投稿を受け付ける tweepy.Client の代わり"""
+
+    def __init__(self, errors=()):
+        self.errors = list(errors)
+        self.calls = []
+        self.posted = []
+
+    def create_tweet(self, **kwargs):
+        self.calls.append(kwargs)
+        if self.errors:
+            raise self.errors.pop(0)
+        self.posted.append(kwargs)
+        return SimpleNamespace(data={'id': str(len(self.posted))})
+
+
+class FakeApi:
+    def __init__(self):
+        self.uploads = []
+
+    def media_upload(self, filename, file, chunked, media_category):
+        self.uploads.append((filename, file.read()))
+        return SimpleNamespace(media_id=100 + len(self.uploads))
+
+
+def chart_png(width=600, height=300):
+    """棒グラフ風の PNG（アンチエイリアスの中間色を含む）"""
+    image = Image.new('RGB', (width, height), 'white')
+    draw = ImageDraw.Draw(image)
+    for i in range(6):
+        draw.rectangle([40 + i * 90, 280 - i * 40, 100 + i * 90, 280], fill=(40 * i, 120, 200 - 30 * i))
+    draw.ellipse([10, 10, 200, 120], outline='black', width=3)
+    buffer = io.BytesIO()
+    image.resize((width * 2, height * 2), Image.LANCZOS).save(buffer, format='PNG')
+    buffer.seek(0)
+    return buffer
+
+
+class PublisherTestCase(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.outbox = os.path.join(self.tmp, 'outbox')
+        self.api = FakeApi()
+        publisher._sessions[CREDENTIALS] = self.api
+
+    def tearDown(self):
+        publisher._sessions.pop(CREDENTIALS, None)
+        shutil.rmtree(self.tmp)
+
+    def publisher(self, client, **kwargs):
+        collector = RateLimitedCollector(client, backoff_base=0.001, max_backoff=0.001)
+        return Publisher(client, CREDENTIALS, collector=collector, outbox=self.outbox, campaign='kaze', **kwargs)
+
+    def post(self, pub, *args, **kwargs):
+        with contextlib.redirect_stdout(io.StringIO()):
+            return pub.post(*args, **kwargs)
+
+    def outbox_files(self):
+        return sorted(os.listdir(self.outbox)) if os.path.exists(self.outbox) else []
+
+
+class PostTest(PublisherTestCase):
+    def test_text_only(self):
+        client = FakeClient()
+        self.assertTrue(self.post(self.publisher(client), '本文'))
+        self.assertEqual(client.posted, [{'text': '本文'}])
+        self.assertEqual(self.api.uploads, [])
+
+    def test_rate_limit_is_retried(self):
+        client = FakeClient([ApiError(429)])
+        self.assertTrue(self.post(self.publisher(client), '本文'))
+        self.assertEqual(len(client.calls), 2)
+        self.assertEqual(len(client.posted), 1)
+
+    def test_server_and_connection_errors_are_not_retried(self):
+        for error in (ApiError(503), ConnectionError('reset by peer')):
+            with self.subTest(error=error):
+                client = FakeClient([error])
+                self.assertFalse(self.post(self.publisher(client), '本文', save_on_failure=False))
+                self.assertEqual(len(client.calls), 1)
+
+    def test_image_is_uploaded_and_attached(self):
+        client = FakeClient()
+        self.assertTrue(self.post(self.publisher(client, image_format='png'), '本文', io.BytesIO(TINY_PNG), 'kaze'))
+        self.assertEqual(client.posted, [{'text': '本文', 'media_ids': [101]}])
+        self.assertEqual([name for name, _ in self.api.uploads], ['kaze.png'])
+
+    def test_failure_is_saved_to_outbox(self):
+        client = FakeClient([ApiError(503)])
+        self.assertFalse(self.post(self.publisher(client), '本文', io.BytesIO(TINY_PNG), 'kaze'))
+        files = self.outbox_files()
+        self.assertEqual(len(files), 2)
+        self.assertTrue(files[0].startswith('kaze_') and files[0].endswith('.json'))
+        with open(os.path.join(self.outbox, files[1]), 'rb') as f:
+            self.assertEqual(f.read(), TINY_PNG)
+
+    def test_unknown_image_format(self):
+        with self.assertRaises(ValueError):
+            Publisher(FakeClient(), CREDENTIALS, image_format='gif')
+
+
+class ResendOutboxTest(PublisherTestCase):
+    def test_resends_oldest_first_and_removes_sent(self):
+        failing = self.publisher(FakeClient([ApiError(503)] * 2))
+        self.post(failing, '一通目', io.BytesIO(TINY_PNG))
+        self.post(failing, '二通目')
+
+        client = FakeClient()
+        with contextlib.redirect_stdout(io.StringIO()):
+            self.assertEqual(self.publisher(client).resend_outbox(), (2, 0))
+        self.assertEqual([p['text'] for p in client.posted], ['一通目', '二通目'])
+        # 画像は送り直すたびにアップロードし直す
+        self.assertEqual((len(client.posted[0]['media_ids']), 'media_ids' in client.posted[1]), (1, False))
+        self.assertEqual(self.outbox_files(), [])
+
+    def test_stops_at_first_failure(self):
+        failing = self.publisher(FakeClient([ApiError(503)] * 2))
+        self.post(failing, '一通目')
+        self.post(failing, '二通目')
+
+        client = FakeClient([ApiError(503)])
+        with contextlib.redirect_stdout(io.StringIO()):
+            self.assertEqual(self.publisher(client).resend_outbox(), (0, 2))
+        # 送り直しに失敗しても outbox の内容は増えない
+        self.assertEqual(len(self.outbox_files()), 2)
+
+    def test_other_campaigns_are_left(self):
+        failing = self.publisher(FakeClient([ApiError(503)]))
+        failing.campaign = 'pollen'
+        self.post(failing, '花粉')
+        with contextlib.redirect_stdout(io.StringIO()):
+            self.assertEqual(self.publisher(FakeClient()).resend_outbox(), (0, 0))
+        self.assertEqual(len(self.outbox_files()), 1)
+
+
+@unittest.skipIf(Image is None, 'Pillow が必要')
+class OptimizeImageTest(unittest.TestCase):
+    def test_png_is_palettized_and_smaller(self):
+        original = chart_png()
+        optimized = optimize_image(original, 'png')
+        self.assertLess(optimized.getbuffer().nbytes, original.getbuffer().nbytes)
+        with Image.open(optimized) as image:
+            self.assertEqual((image.format, image.mode, image.size), ('PNG', 'P', (1200, 600)))
+
+    def test_conversions(self):
+        for image_format, pil_format in (('webp', 'WEBP'), ('jpeg', 'JPEG')):
+            with self.subTest(image_format=image_format):
+                with Image.open(optimize_image(chart_png(), image_format)) as image:
+                    self.assertEqual(image.format, pil_format)
+
+    def test_keeps_original_when_not_smaller(self):
+        buffer = io.BytesIO()
+        Image.new('RGB', (4, 4), 'white').save(buffer, format='PNG', optimize=True)
+        self.assertIs(optimize_image(buffer, 'png'), buffer)
+
+
+if __name__ == '__main__':
+    unittest.main()
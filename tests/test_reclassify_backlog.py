@@ -0,0 +1,116 @@
+# -*- coding: utf-8 -*-
+"""reclassify_backlog のチャンク判定・集計とマニフェストによる再開"""
+import contextlib
+import csv
+import io
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'kaze-analytics'))
+import reclassify_backlog
+from reclassify_backlog import Manifest, classify_chunk, find_csv_files, iter_chunks, merge_counts, reclassify
+
+ROWS = [
+    ('2024-01-08 09:00:00', '風邪で咳が止まらない'),
+    ('2024-01-08 10:00:00', '風邪で鼻水と喉が痛い、熱もある'),
+    ('2024-01-08 11:00:00', '風邪の咳が治った'),
+    ('2024-01-09 09:00:00', 'RT @someone 風邪で咳'),
+    ('2024-01-09 10:00:00', '風邪ひいて咳'),
+    ('2024-01-09 11:00:00', ''),
+]
+
+
+def write_csv(path, rows):
+    with open(path, 'w', encoding='utf-8-sig', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(['日時', '本文', '地域'])
+        for when, text in rows:
+            writer.writerow([when, text, ''])
+
+
+class ClassifyChunkTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        reclassify_backlog._init_worker()
+
+    def test_counts_valid_tweets_by_day(self):
+        counts = classify_chunk([(when[:10], text) for when, text in ROWS if text])
+        self.assertEqual(counts, {
+            '2024-01-08': {'咳': 1, '喉の症状': 1, '発熱': 1, '鼻の症状': 1},
+            '2024-01-09': {'咳': 1},
+        })
+
+    def test_merge_counts(self):
+        total = {'d1': {'咳': 1}}
+        merge_counts(total, {'d1': {'咳': 2, '発熱': 1}, 'd2': {'咳': 1}})
+        self.assertEqual(total, {'d1': {'咳': 3, '発熱': 1}, 'd2': {'咳': 1}})
+
+
+class FilesTestCase(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        os.makedirs(os.path.join(self.tmp, 'sub'))
+        self.first = os.path.join(self.tmp, 'kaze_20240108.csv')
+        self.second = os.path.join(self.tmp, 'sub', 'kaze_20240109.csv')
+        write_csv(self.first, ROWS[:3])
+        write_csv(self.second, ROWS[3:])
+        write_csv(os.path.join(self.tmp, 'kaze_20240108_top.csv'), ROWS[:1])
+        write_csv(os.path.join(self.tmp, 'other.csv'), ROWS)
+        self.manifest_path = os.path.join(self.tmp, 'manifest.json')
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp)
+
+
+class FilesTest(FilesTestCase):
+    def test_find_csv_files(self):
+        self.assertEqual(find_csv_files([self.tmp]), sorted([self.first, self.second]))
+        # ファイルを直接指定した場合も上位行だけのCSVは除く
+        top = os.path.join(self.tmp, 'kaze_20240108_top.csv')
+        self.assertEqual(find_csv_files([top, self.first]), [self.first])
+
+    def test_iter_chunks_skips_empty_text(self):
+        chunks = list(iter_chunks(self.second, 1))
+        self.assertEqual(chunks, [[('2024-01-09', ROWS[3][1])], [('2024-01-09', ROWS[4][1])]])
+
+    def test_manifest_fingerprint(self):
+        manifest = Manifest(self.manifest_path)
+        self.assertFalse(manifest.is_done(self.first))
+        manifest.record(self.first, 3, {'2024-01-08': {'咳': 1}})
+        reloaded = Manifest(self.manifest_path)
+        self.assertTrue(reloaded.is_done(self.first))
+        self.assertFalse(Manifest(self.manifest_path, fresh=True).is_done(self.first))
+        # 内容が変わったファイルは処理し直す
+        write_csv(self.first, ROWS)
+        self.assertFalse(reloaded.is_done(self.first))
+
+
+class ReclassifyTest(FilesTestCase):
+    def run_reclassify(self, manifest, files):
+        output = io.StringIO()
+        with contextlib.redirect_stdout(output):
+            counts = reclassify(files, manifest, workers=2, chunk_size=2)
+        return counts, output.getvalue()
+
+    def test_totals_and_resume(self):
+        files = find_csv_files([self.tmp])
+        expected = classify_chunk([(when[:10], text) for when, text in ROWS if text])
+
+        counts, _ = self.run_reclassify(Manifest(self.manifest_path), files)
+        self.assertEqual(counts, expected)
+        # 処理済みのファイルは読み直さず、記録した件数を使う
+        counts, output = self.run_reclassify(Manifest(self.manifest_path), files)
+        self.assertEqual(counts, expected)
+        self.assertIn('処理済み 2、今回 0', output)
+
+        write_csv(self.second, ROWS[3:5] * 2)
+        counts, output = self.run_reclassify(Manifest(self.manifest_path), files)
+        self.assertIn('処理済み 1、今回 1', output)
+        self.assertEqual(counts['2024-01-09'], {'咳': 2})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,117 @@
+# -*- coding: utf-8 -*-
+"""replay のフィクスチャ再生（検索クエリの評価・ページング・疑似レート制限）"""
+import json
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+from datetime import datetime, timedelta, timezone
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'analytics-common'))
+from collector import RateLimitedCollector
+from replay import ReplayClient, ReplayRateLimitError, ReplayScraper, compile_query
+
+T0 = datetime(2024, 1, 10, tzinfo=timezone.utc)
+TEXTS = ['風邪で咳', '風邪で熱', 'RT @a 風邪で咳', '今日は晴れ', '咳だけ', '風邪 鼻水']
+
+
+def write_fixture(path, n=60):
+    with open(path, 'w', encoding='utf-8') as f:
+        for i in range(n):
+            f.write(json.dumps({
+                'id': 1000 + i, 'text': TEXTS[i % len(TEXTS)],
+                'created_at': (T0 + timedelta(minutes=10 * i)).isoformat(), 'author_id': i,
+            }, ensure_ascii=False) + '\n')
+
+
+class CompileQueryTest(unittest.TestCase):
+    def test_operators(self):
+        cases = [
+            ('咳', '風邪で咳', True),
+            ('(風邪) (咳 OR 熱)', '風邪で熱', True),
+            ('(風邪) (咳 OR 熱)', '風邪で鼻水', False),
+            ('風邪 -is:retweet', 'RT @a 風邪', False),
+            ('風邪 -is:retweet lang:ja', '風邪', True),
+            ('風邪 -咳', '風邪で咳', False),
+            ('"ABC"', 'xabcx', True),
+        ]
+        for query, text, expected in cases:
+            with self.subTest(query=query, text=text):
+                self.assertEqual(compile_query(query)(text), expected)
+
+
+class ReplayTestCase(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.fixture = os.path.join(self.tmp, 'tweets.jsonl')
+        write_fixture(self.fixture)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp)
+
+
+class ReplayClientTest(ReplayTestCase):
+    QUERY = '(風邪) (咳 OR 熱) -is:retweet lang:ja'
+
+    def expected_ids(self, start=None, end=None):
+        ids = []
+        for i in range(60):
+            created = T0 + timedelta(minutes=10 * i)
+            if (start and created < start) or (end and created >= end):
+                continue
+            if compile_query(self.QUERY)(TEXTS[i % len(TEXTS)]):
+                ids.append(1000 + i)
+        return sorted(ids, reverse=True)
+
+    def test_pages_are_newest_first_and_complete(self):
+        client = ReplayClient(self.fixture)
+        start, end = T0 + timedelta(hours=1), T0 + timedelta(hours=8)
+        ids = [t.id for t in RateLimitedCollector(client).paginate(
+            client.search_recent_tweets, page_size=10, query=self.QUERY,
+            start_time=start.isoformat(), end_time=end.isoformat())]
+        self.assertEqual(ids, self.expected_ids(start, end))
+        self.assertEqual(client.tweets_served, len(ids))
+
+    def test_rate_limit_returns_429_with_headers(self):
+        client = ReplayClient(self.fixture, rate_limit=(2, 60))
+        client.search_recent_tweets(query=self.QUERY)
+        client.search_recent_tweets(query=self.QUERY)
+        with self.assertRaises(ReplayRateLimitError) as caught:
+            client.search_recent_tweets(query=self.QUERY)
+        self.assertEqual(caught.exception.response.status_code, 429)
+        self.assertEqual(caught.exception.response.headers['x-rate-limit-remaining'], '0')
+        self.assertEqual(client.rate_limited, 1)
+
+    def test_counts_by_hour(self):
+        client = ReplayClient(self.fixture)
+        start, end = T0, T0 + timedelta(hours=10)
+        response = client.get_recent_tweets_count(query=self.QUERY, start_time=start.isoformat(),
+                                                  end_time=end.isoformat())
+        self.assertEqual(len(response.data), 10)
+        self.assertEqual(response.meta['total_tweet_count'], len(self.expected_ids(start, end)))
+
+    def test_rebase_moves_newest_tweet(self):
+        now = datetime(2030, 5, 1, tzinfo=timezone.utc)
+        client = ReplayClient(self.fixture, rebase_to=now)
+        self.assertEqual(client.tweets[-1].created_at, now)
+        self.assertEqual(client.tweets[-1].created_at - client.tweets[0].created_at, timedelta(minutes=590))
+
+    def test_create_tweet_is_recorded(self):
+        client = ReplayClient(self.fixture)
+        response = client.create_tweet(text='本文', media_ids=[1])
+        self.assertEqual(client.posted, [{'id': response.data['id'], 'text': '本文', 'media_ids': [1]}])
+
+
+class ReplayScraperTest(ReplayTestCase):
+    def test_items_are_newest_first_and_match_query(self):
+        scraper = ReplayScraper(self.fixture, query='(風邪) (咳)')
+        tweets = list(scraper.get_items())
+        self.assertEqual([t.id for t in tweets], sorted((t.id for t in tweets), reverse=True))
+        self.assertTrue(all('咳' in t.rawContent and '風邪' in t.rawContent for t in tweets))
+        self.assertEqual(tweets[0].user.location, '')
+        self.assertEqual(tweets[0].date, tweets[0].created_at)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,340 @@
+# -*- coding: utf-8 -*-
+"""scrape_to_csv のチェックポイントからの再開とシャード取得"""
+import contextlib
+import gc
+import glob
+import io
+import json
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+import unittest
+import warnings
+from datetime import datetime, timedelta, timezone
+from types import SimpleNamespace
+
+SRC = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'kaze-analytics-scrape', 'src')
+sys.path.insert(0, SRC)
+sys.path.insert(0, os.path.join(SRC, '..', '..', 'analytics-common'))
+import scrape_to_csv
+from replay import ReplayScraper
+from writers import iter_rows
+
+try:
+    import pyarrow.parquet as pq
+except ImportError:
+    pq = None
+
+T0 = datetime(2024, 1, 10, tzinfo=timezone.utc)
+# 20文字以上の本文（ほぼ重複の判定対象）。10件ごとに同じ本文のコピペが混ざる
+# 咳だけ・熱だけ・両方を含む本文があり、シャード取得では複数のシャードに現れるものがある
+COPYPASTA = '今日から風邪で咳と鼻水が止まらない、明日の会議どうしよう'
+
+
+def write_fixture(path, n=60, start_id=1000):
+    with open(path, 'w', encoding='utf-8') as f:
+        for i in range(n):
+            if i % 10 == 3:
+                text = COPYPASTA
+            else:
+                text = f'風邪で咳が{i}日目' if i % 2 else f'風邪で熱が{i}日目、咳も少し' if i % 4 else f'風邪の熱が{i}日目'
+            f.write(json.dumps({
+                'id': start_id + i, 'text': text,
+                'created_at': (T0 + timedelta(minutes=i)).isoformat(),
+                'location': ['都内', '大阪', ''][i % 3], 'like_count': i % 7, 'retweet_count': i % 4,
+            }, ensure_ascii=False) + '\n')
+
+
+class Crashing:
+    """after 件返したところで例外を出す取得元"""
+
+    def __init__(self, scraper, after):
+        self.scraper = scraper
+        self.after = after
+
+    def get_items(self):
+        for n, tweet in enumerate(self.scraper.get_items()):
+            if n == self.after:
+                raise RuntimeError('接続が切れました')
+            yield tweet
+
+
+class Hanging:
+    """最初の1件を返した後、release されるまで応答しない取得元"""
+
+    def __init__(self, scraper, release):
+        self.scraper = scraper
+        self.release = release
+
+    def get_items(self):
+        for tweet in self.scraper.get_items():
+            yield tweet
+            self.release.wait()
+            return
+
+
+class Gated:
+    """opened が立つまで最初の1件を返さない取得元"""
+
+    def __init__(self, scraper, opened):
+        self.scraper = scraper
+        self.opened = opened
+
+    def get_items(self):
+        self.opened.wait()
+        yield from self.scraper.get_items()
+
+
+class Signalling:
+    """取得を始めたときに started を立てる取得元"""
+
+    def __init__(self, scraper, started):
+        self.scraper = scraper
+        self.started = started
+
+    def get_items(self):
+        self.started.set()
+        yield from self.scraper.get_items()
+
+
+class ScrapeTestCase(unittest.TestCase):
+    def setUp(self):
+        self.cwd = os.getcwd()
+        self.tmp = tempfile.mkdtemp()
+        self.fixture = os.path.join(self.tmp, 'tweets.jsonl')
+        write_fixture(self.fixture)
+
+    def tearDown(self):
+        os.chdir(self.cwd)
+        shutil.rmtree(self.tmp)
+
+    def workdir(self, name):
+        path = os.path.join(self.tmp, name)
+        os.makedirs(path)
+        os.chdir(path)
+        return path
+
+    def scraper(self, crash_after=None):
+        scraper = ReplayScraper(self.fixture, query=scrape_to_csv.QUERY)
+        return scraper if crash_after is None else Crashing(scraper, crash_after)
+
+    def run_scrape(self, **kwargs):
+        with contextlib.redirect_stdout(io.StringIO()):
+            scrape_to_csv.run(**kwargs)
+
+    def crash(self, after, **kwargs):
+        """after 件目で落ちる実行（落ちた実行が開いたままのファイルは閉じて警告を出さない）"""
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore', ResourceWarning)
+            with self.assertRaises(RuntimeError):
+                self.run_scrape(scraper=self.scraper(after), checkpoint_every=7, **kwargs)
+            gc.collect()
+
+    def outputs(self, directory):
+        """出力CSV（本体・上位行）の内容と last_id"""
+        result = {}
+        for path in glob.glob(os.path.join(directory, 'kaze_*.csv')):
+            with open(path, 'rb') as f:
+                result['top' if path.endswith('_top.csv') else 'all'] = f.read()
+        with open(os.path.join(directory, scrape_to_csv.LAST_ID_PATH)) as f:
+            result['last_id'] = f.read()
+        return result
+
+
+class CheckpointTest(ScrapeTestCase):
+    def test_resumed_run_matches_uninterrupted_run(self):
+        clean = self.workdir('clean')
+        self.run_scrape(scraper=self.scraper(), checkpoint_every=7)
+        expected = self.outputs(clean)
+
+        crashed = self.workdir('crashed')
+        for after in (5, 23, 40):
+            self.crash(after)
+            self.assertTrue(os.path.exists(scrape_to_csv.CHECKPOINT_PATH))
+        self.run_scrape(scraper=self.scraper(), checkpoint_every=7)
+        self.assertEqual(self.outputs(crashed), expected)
+        self.assertEqual(sorted(os.listdir(crashed)), sorted(os.listdir(clean)))
+
+    def test_checkpoint_records_progress(self):
+        self.workdir('run')
+        self.crash(30)
+        state = scrape_to_csv.load_checkpoint()
+        self.assertEqual(state['fetched'], 28)
+        self.assertEqual(state['cursor'], 1059 - 27)
+        self.assertEqual(state['high_id'], 1059)
+        self.assertIsNone(state['since_id'])
+        self.assertEqual(state['count'] + state['skipped'], 28)
+        self.assertGreater(state['skipped'], 0)
+
+    def test_no_resume_starts_over(self):
+        directory = self.workdir('run')
+        self.crash(30)
+        self.run_scrape(scraper=self.scraper(), resume=False)
+        self.assertFalse(os.path.exists(scrape_to_csv.CHECKPOINT_PATH))
+        self.assertFalse(glob.glob(os.path.join(directory, '*.part')))
+
+    def test_next_run_fetches_only_newer_tweets(self):
+        directory = self.workdir('run')
+        self.run_scrape(scraper=self.scraper())
+        write_fixture(self.fixture, n=70)
+        for path in glob.glob(os.path.join(directory, 'kaze_*.csv')):
+            os.remove(path)
+        self.run_scrape(scraper=self.scraper())
+        self.assertEqual(self.outputs(directory)['last_id'], '1069')
+        with open(glob.glob(os.path.join(directory, 'kaze_*[0-9].csv'))[0], encoding='utf-8-sig') as f:
+            self.assertEqual(len(f.readlines()), 1 + 10)
+
+    @unittest.skipIf(pq is None, 'pyarrow が必要')
+    def test_resumed_parquet_has_each_row_once(self):
+        def parquet_ids():
+            return [r['ツイートID'] for path in glob.glob('data/parquet/*/*.parquet')
+                    for r in pq.read_table(path).to_pylist()]
+
+        self.workdir('clean')
+        self.run_scrape(output_format='parquet', scraper=self.scraper(), checkpoint_every=7)
+        expected = set(parquet_ids())
+
+        self.workdir('crashed')
+        self.crash(23, output_format='parquet')
+        self.run_scrape(output_format='parquet', scraper=self.scraper(), checkpoint_every=7)
+        ids = parquet_ids()
+        self.assertEqual(len(ids), len(set(ids)))
+        # Parquet だけの出力では再開時にほぼ重複の索引を作り直さないため、コピペが残ることはある
+        self.assertLessEqual(expected, set(ids))
+
+
+class MergeShardsTest(unittest.TestCase):
+    def test_newest_first_without_duplicates(self):
+        shards = [[SimpleNamespace(id=i) for i in ids] for ids in ([9, 7, 4, 1], [8, 7, 3], [], [9, 2])]
+        self.assertEqual([t.id for t in scrape_to_csv.merge_shards(shards)], [9, 8, 7, 4, 3, 2, 1])
+
+
+class ShardFetchTest(unittest.TestCase):
+    def setUp(self):
+        self.release = threading.Event()
+        self.addCleanup(self.release.set)
+
+    def tweets(self, ids):
+        return SimpleNamespace(get_items=lambda: iter([SimpleNamespace(id=i) for i in ids]))
+
+    def test_stops_at_since_id_and_limit(self):
+        shard = scrape_to_csv.ShardFetch('咳', self.tweets([9, 8, 7, 6, 5]), since_id=6).start()
+        self.assertEqual([t.id for t in shard], [9, 8, 7])
+        self.assertTrue(shard.complete)
+        self.assertEqual(shard.max_id, 9)
+        shard = scrape_to_csv.ShardFetch('咳', self.tweets([9, 8, 7, 6, 5]), since_id=None, limit=2).start()
+        self.assertEqual([t.id for t in shard], [9, 8])
+        self.assertTrue(shard.complete)
+
+    def test_hung_shard_is_abandoned_at_the_time_limit(self):
+        scraper = Hanging(self.tweets([9, 8]), self.release)
+        started = time.monotonic()
+        shard = scrape_to_csv.ShardFetch('咳', scraper, since_id=None, time_limit=0.2).start()
+        self.assertEqual([t.id for t in shard], [9])
+        self.assertLess(time.monotonic() - started, 1.0)
+        self.assertTrue(shard.timed_out)
+        self.assertFalse(shard.complete)
+
+    def test_error_keeps_what_was_fetched(self):
+        shard = scrape_to_csv.ShardFetch('咳', Crashing(self.tweets([9, 8, 7]), 2), since_id=None).start()
+        self.assertEqual([t.id for t in shard], [9, 8])
+        self.assertIsInstance(shard.error, RuntimeError)
+        self.assertFalse(shard.complete)
+
+
+class RunShardedTest(ScrapeTestCase):
+    def setUp(self):
+        super().setUp()
+        self.release = threading.Event()
+        self.addCleanup(self.release.set)
+        self.broken = {}   # 症状ワード -> 取得元を包む関数
+
+    def factory(self, query):
+        scraper = ReplayScraper(self.fixture, query=query)
+        for term, wrap in self.broken.items():
+            if query == scrape_to_csv.shard_query(term):
+                return wrap(scraper)
+        return scraper
+
+    def run_sharded(self, **kwargs):
+        kwargs.setdefault('time_limit', 5)
+        with contextlib.redirect_stdout(io.StringIO()):
+            scrape_to_csv.run_sharded(scraper_factory=self.factory, workers=3, **kwargs)
+
+    def take_ids(self, directory):
+        """書き出したツイートID（同じ分に続けて実行しても混ざらないよう出力は消す）"""
+        ids = []
+        for path in glob.glob(os.path.join(directory, 'kaze_*.csv')):
+            if not path.endswith('_top.csv'):
+                ids.extend(int(row['ツイートID']) for row in iter_rows(path))
+            os.remove(path)
+        return ids
+
+    def monolithic_ids(self):
+        directory = self.workdir('monolithic')
+        self.run_scrape(scraper=self.scraper())
+        return self.take_ids(directory)
+
+    def test_matches_monolithic_run(self):
+        expected = self.monolithic_ids()
+        directory = self.workdir('sharded')
+        self.run_sharded()
+        ids = self.take_ids(directory)
+        self.assertEqual(sorted(ids), sorted(expected))
+        self.assertEqual(self.outputs(directory)['last_id'], '1059')
+        # 全シャードが最後まで取得済みなら、次回は何も書き出さない
+        self.run_sharded()
+        self.assertEqual(self.take_ids(directory), [])
+
+    def test_failed_shard_is_fetched_again_without_duplicates(self):
+        expected = self.monolithic_ids()
+        directory = self.workdir('sharded')
+        self.broken = {'熱': lambda scraper: Crashing(scraper, 5)}
+        self.run_sharded()
+        first = self.take_ids(directory)
+        state = scrape_to_csv.load_shard_state()
+        self.assertNotIn('熱', state)
+        self.assertEqual(state['咳'], 1059)
+        self.assertFalse(os.path.exists(scrape_to_csv.LAST_ID_PATH))
+        self.assertTrue(scrape_to_csv.load_written_ids())
+
+        self.broken = {}
+        self.run_sharded()
+        second = self.take_ids(directory)
+        self.assertTrue(second)
+        self.assertEqual(sorted(first + second), sorted(expected))
+        self.assertEqual(self.outputs(directory)['last_id'], '1059')
+        # 全シャードが追いついたら、どのシャードの取得位置よりも新しいIDだけを残す
+        floor = min(scrape_to_csv.load_shard_state().values())
+        self.assertEqual(scrape_to_csv.load_written_ids(), {i for i in first + second if i > floor})
+
+    def test_hung_shard_does_not_block_the_run(self):
+        directory = self.workdir('sharded')
+        self.broken = {'熱': lambda scraper: Hanging(scraper, self.release)}
+        started = time.monotonic()
+        self.run_sharded(time_limit=0.3)
+        self.assertLess(time.monotonic() - started, 3.0)
+        self.assertTrue(self.take_ids(directory))
+        self.assertNotIn('熱', scrape_to_csv.load_shard_state())
+        self.assertFalse(os.path.exists(scrape_to_csv.LAST_ID_PATH))
+
+    def test_stalled_shard_does_not_hold_back_later_shards(self):
+        expected = self.monolithic_ids()
+        directory = self.workdir('sharded')
+        # 最初の組の「咳」は、最後の組の「痰」の取得が始まるまで応答しない
+        later_started = threading.Event()
+        self.addCleanup(later_started.set)
+        self.broken = {'咳': lambda scraper: Gated(scraper, later_started),
+                       '痰': lambda scraper: Signalling(scraper, later_started)}
+        started = time.monotonic()
+        self.run_sharded(time_limit=5)
+        self.assertLess(time.monotonic() - started, 3.0)
+        self.assertEqual(sorted(self.take_ids(directory)), sorted(expected))
+        # 止まっていたシャードも時間の上限の前に最後まで取得できている
+        self.assertIn('咳', scrape_to_csv.load_shard_state())
+
+if __name__ == '__main__':
+    unittest.main()
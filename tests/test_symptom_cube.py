@@ -0,0 +1,110 @@
+# -*- coding: utf-8 -*-
+"""symptom_cube の集計・切り出しと保存"""
+import contextlib
+import io
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+from datetime import datetime, timedelta, timezone
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'analytics-common'))
+from symptom_cube import UNKNOWN_REGION, SymptomCube, hour_index, hour_start, prefecture_index
+
+T0 = datetime(2024, 1, 10)
+SYMPTOMS = ['咳', '発熱', '鼻の症状']
+
+
+def at(hours, minutes=0):
+    return T0 + timedelta(hours=hours, minutes=minutes)
+
+
+class HelpersTest(unittest.TestCase):
+    def test_hour_index(self):
+        index = hour_index(T0 + timedelta(minutes=59))
+        self.assertEqual(hour_start(index), T0)
+        self.assertEqual(hour_index(datetime(2024, 1, 10, 9, tzinfo=timezone(timedelta(hours=9)))), index)
+        self.assertEqual(hour_index('2024-01-10T00:30:00Z'), index)
+
+    def test_prefecture_index(self):
+        self.assertEqual(prefecture_index(None), 0)
+        self.assertEqual(prefecture_index('13'), 13)
+        self.assertEqual(prefecture_index(27), 27)
+        self.assertEqual(prefecture_index('札幌在住'), 1)
+        self.assertEqual(prefecture_index('関西'), 0)   # 地方だけ分かる場合は不明
+        self.assertEqual(prefecture_index('99'), 0)
+
+
+class SymptomCubeTest(unittest.TestCase):
+    def setUp(self):
+        self.cube = SymptomCube(SYMPTOMS, hours=48)
+        self.cube.update({
+            ('咳', at(0, 10), '都内'): 3,
+            ('咳', at(0, 50), '大阪'): 1,
+            ('発熱', at(1), '13'): 2,
+            ('咳', at(5), None): 4,
+            ('鼻の症状', at(5, 30), '札幌'): 1,
+        })
+        self.cube.add('咳', at(5, 1), '大阪')
+
+    def test_totals_and_ranking(self):
+        self.assertEqual(self.cube.totals(at(0), at(6)), {'咳': 9, '発熱': 2, '鼻の症状': 1})
+        self.assertEqual(self.cube.totals(at(0), at(1)), {'咳': 4, '発熱': 0, '鼻の症状': 0})
+        self.assertEqual(self.cube.totals(at(0), at(6), prefectures=['13']), {'咳': 3, '発熱': 2, '鼻の症状': 0})
+        self.assertEqual(self.cube.ranking(at(0), at(6))[0], ('咳', 9))
+
+    def test_partial_hours_are_included(self):
+        # 期間にかかる時間はまるごと数える
+        self.assertEqual(self.cube.totals(at(0, 30), at(0, 40))['咳'], 4)
+
+    def test_by_hour(self):
+        self.assertEqual(self.cube.by_hour(at(0), at(3)), [(at(0), 4), (at(1), 2)])
+        self.assertEqual(self.cube.by_hour(at(5), at(6), symptom='咳'), [(at(5), 5)])
+        self.assertEqual(self.cube.by_hour(at(5), at(6), symptom='咳', prefectures=['27']), [(at(5), 1)])
+
+    def test_by_prefecture_and_region(self):
+        self.assertEqual(self.cube.by_prefecture(at(0), at(6)), {'13': 5, '27': 2, '01': 1, None: 4})
+        regions = self.cube.by_region(at(0), at(6), symptom='咳')
+        self.assertEqual((regions['関東'], regions['近畿'], regions['北海道'], regions[UNKNOWN_REGION]),
+                         (3, 2, 0, 4))
+
+    def test_cleared_hours_are_zero(self):
+        # clear() した期間は件数が無い時間も0として返す（書いていない時間は除く）
+        self.cube.clear(at(2), at(4))
+        self.assertEqual(self.cube.by_hour(at(1), at(5)), [(at(1), 2), (at(2), 0), (at(3), 0)])
+
+    def test_clear_then_update_does_not_double_count(self):
+        self.cube.clear(at(0), at(1))
+        self.cube.update({('咳', at(0, 10), '都内'): 3})
+        self.assertEqual(self.cube.totals(at(0), at(1))['咳'], 3)
+        self.assertEqual(self.cube.totals(at(1), at(6))['発熱'], 2)
+
+    def test_ring_buffer_drops_old_hours(self):
+        self.cube.add('咳', at(48), '都内')   # 時間0と同じ枠を使い直す
+        self.assertEqual(self.cube.by_hour(at(0), at(1)), [])
+        self.assertEqual(self.cube.totals(at(48), at(49))['咳'], 1)
+        # 保持時間より古い日時は加えない
+        self.cube.add('咳', at(0), '都内')
+        self.assertEqual(self.cube.by_hour(at(0), at(1)), [])
+
+    def test_save_and_load(self):
+        tmp = tempfile.mkdtemp()
+        try:
+            path = os.path.join(tmp, 'kaze.cube')
+            self.cube.save(path)
+            loaded = SymptomCube.load(path, SYMPTOMS, hours=48)
+            self.assertEqual(loaded.counts, self.cube.counts)
+            self.assertEqual(loaded.by_prefecture(at(0), at(6)), self.cube.by_prefecture(at(0), at(6)))
+            # 症状や保持時間が変わった場合は空から
+            with contextlib.redirect_stdout(io.StringIO()):
+                self.assertEqual(SymptomCube.load(path, SYMPTOMS[:2], hours=48).totals(at(0), at(6)),
+                                 {'咳': 0, '発熱': 0})
+                self.assertEqual(SymptomCube.load(path, SYMPTOMS, hours=24).by_hour(at(0), at(6)), [])
+            self.assertEqual(SymptomCube.load(os.path.join(tmp, 'missing'), SYMPTOMS).by_hour(at(0), at(6)), [])
+        finally:
+            shutil.rmtree(tmp)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,38 @@
+# -*- coding: utf-8 -*-
+"""textnorm の正規化とカナの畳み込み"""
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'analytics-common'))
+from textnorm import base_form, fold_kana, is_katakana_word, normalize
+
+
+class NormalizeTest(unittest.TestCase):
+    def test_base_form(self):
+        self.assertEqual(base_form('ＡＢＣ１２３'), 'abc123')
+        self.assertEqual(base_form('ｾｷ'), 'セキ')
+        self.assertEqual(base_form('セキ'), 'セキ')
+
+    def test_fold_kana_keeps_length(self):
+        self.assertEqual(fold_kana('セキとハナミズ'), 'せきとはなみず')
+        self.assertEqual(fold_kana('ヴァー'), 'ゔぁー')
+        self.assertEqual(fold_kana('ヷ'), 'ヷ')   # 対応するひらがなが無い
+        self.assertEqual(len(fold_kana('カゼ・ヂ')), 4)
+
+    def test_normalize(self):
+        self.assertEqual(normalize('ＡＢＣ ｾｷ'), 'abc せき')
+        self.assertEqual(normalize('風邪でセキ'), normalize('風邪でせき'))
+
+    def test_is_katakana_word(self):
+        self.assertTrue(is_katakana_word('スギ'))
+        self.assertTrue(is_katakana_word('ｽｷﾞ'))
+        self.assertTrue(is_katakana_word('ハウスダスト'))
+        self.assertTrue(is_katakana_word('コーヒー'))
+        self.assertFalse(is_katakana_word('すぎ'))
+        self.assertFalse(is_katakana_word('スギ花粉'))
+        self.assertFalse(is_katakana_word(''))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,119 @@
+# -*- coding: utf-8 -*-
+"""trend_store の平常値の更新と投稿本文の文字数"""
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+from datetime import date, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'analytics-common'))
+from trend_store import (MAX_TWEET_WEIGHT, MIN_RUNS, Trend, TrendStore, fit_tweet, format_change,
+                         trend_arrow, truncate_tweet, tweet_weight)
+
+MONDAY = date(2024, 1, 8)
+
+
+class TweetWeightTest(unittest.TestCase):
+    def test_weights(self):
+        cases = [
+            ('abc 123', 7),
+            ('風邪で咳', 8),
+            ('a—b“c”', 6),        # 一般句読点の一部は1
+            ('📈', 2),
+            ('⚠️', 2),            # U+26A0 + U+FE0F
+            ('1️⃣', 2),            # 数字 + U+FE0F + U+20E3
+            ('👍🏽', 2),            # 肌の色
+            ('👨‍👩‍👧', 2),            # ZWJ でつないだ列
+            ('🇯🇵🇺🇸', 4),          # 国旗2つ
+            ('咳📈+45%', 2 + 2 + 4),
+            ('咳\u200d熱', 4),      # 絵文字でない文字の間の ZWJ は数えない
+            ('咳熱\ufe0f', 4),       # 絵文字でない全角文字の後の U+FE0F
+            ('👍\u200d咳', 4),       # ZWJ の後が絵文字でなければ別に数える
+            ('⚠️咳', 4),
+        ]
+        for text, expected in cases:
+            with self.subTest(text=text):
+                self.assertEqual(tweet_weight(text), expected)
+
+    def test_truncate(self):
+        self.assertEqual(truncate_tweet('風邪'), '風邪')
+        text = truncate_tweet('あ' * 200)
+        self.assertEqual(text, 'あ' * 139 + '…')
+        self.assertLessEqual(tweet_weight(text), MAX_TWEET_WEIGHT)
+
+    def test_truncate_drops_trailing_space(self):
+        self.assertEqual(truncate_tweet('abcd efgh', limit=6), 'abcd…')
+
+    def test_fit_tweet_takes_first_that_fits(self):
+        self.assertEqual(fit_tweet(['あ' * 141, 'あ' * 140, 'い']), 'あ' * 140)
+        self.assertEqual(fit_tweet(['あ' * 300, 'い' * 200]), 'い' * 139 + '…')
+
+
+class TrendStoreTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmp, 'trend.json')
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp)
+
+    def test_no_baseline_until_min_runs(self):
+        store = TrendStore(self.path)
+        self.assertIsNone(store.compare('kaze', '咳', 10, MONDAY))
+        for i in range(MIN_RUNS - 1):
+            store.update('kaze', {'咳': 10}, MONDAY + timedelta(days=i))
+        self.assertIsNone(store.compare('kaze', '咳', 10, MONDAY))
+        store.update('kaze', {'咳': 10}, MONDAY + timedelta(days=MIN_RUNS))
+        trend = store.compare('kaze', '咳', 15, MONDAY + timedelta(days=MIN_RUNS + 1))
+        self.assertEqual((trend.expected, trend.ratio), (10.0, 1.5))
+        self.assertGreater(trend.z, 0)
+
+    def test_state_is_saved_and_kept_per_campaign(self):
+        store = TrendStore(self.path)
+        for i in range(MIN_RUNS):
+            store.update('kaze', {'咳': 10}, MONDAY + timedelta(days=i))
+            store.update('pollen', {'くしゃみ': 50}, MONDAY + timedelta(days=i))
+        reloaded = TrendStore(self.path)
+        self.assertEqual(reloaded.compare('kaze', '咳', 10, MONDAY).expected, 10.0)
+        self.assertEqual(reloaded.compare('pollen', 'くしゃみ', 50, MONDAY).expected, 50.0)
+        self.assertIsNone(reloaded.compare('kaze', 'くしゃみ', 50, MONDAY))
+
+    def test_rerun_on_the_same_day_replaces_that_day(self):
+        once = TrendStore(self.path)
+        for i, count in enumerate([10, 12, 8]):
+            once.update('kaze', {'咳': count}, MONDAY + timedelta(days=i))
+        expected = once.state
+
+        os.remove(self.path)
+        rerun = TrendStore(self.path)
+        for i, count in enumerate([10, 12, 100]):
+            rerun.update('kaze', {'咳': count}, MONDAY + timedelta(days=i))
+        rerun.update('kaze', {'咳': 8}, MONDAY + timedelta(days=2))
+        self.assertEqual(rerun.state, expected)
+
+    def test_same_weekday_average_is_used(self):
+        store = TrendStore(self.path)
+        for week in range(3):
+            for day in range(7):
+                count = 70 if day == 0 else 10   # 月曜だけ多い
+                store.update('kaze', {'咳': count}, MONDAY + timedelta(weeks=week, days=day))
+        next_monday = MONDAY + timedelta(weeks=3)
+        self.assertAlmostEqual(store.compare('kaze', '咳', 70, next_monday).expected, 70.0)
+        self.assertLess(store.compare('kaze', '咳', 70, next_monday + timedelta(days=1)).expected, 70.0)
+
+
+class FormatTest(unittest.TestCase):
+    def test_format_change(self):
+        self.assertEqual(format_change(Trend(145, 100.0, 1.45, 4.5)), '+45%')
+        self.assertEqual(format_change(Trend(50, 100.0, 0.5, -5.0)), '-50%')
+        self.assertEqual(format_change(Trend(3, 0.0, None, 3.0)), '新規')
+
+    def test_trend_arrow(self):
+        self.assertEqual(trend_arrow(Trend(0, 0, None, 1.0)), '📈')
+        self.assertEqual(trend_arrow(Trend(0, 0, None, -1.5)), '📉')
+        self.assertEqual(trend_arrow(Trend(0, 0, None, 0.5)), '→')
+
+
+if __name__ == '__main__':
+    unittest.main()
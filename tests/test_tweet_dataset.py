@@ -0,0 +1,147 @@
+# -*- coding: utf-8 -*-
+"""tweet_dataset の日付パーティション書き出し・コンパクション・期間読み込み"""
+import contextlib
+import glob
+import io
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+from datetime import date, datetime
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'kaze-analytics-scrape', 'src'))
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    import tweet_dataset
+    from tweet_dataset import ParquetDatasetWriter, compact, read_range
+except ImportError:
+    tweet_dataset = None
+
+
+def row(tweet_id, when, text='風邪で咳', location='東京都'):
+    return {
+        'ツイートID': tweet_id, '日時': when, '本文': text, '地域': location,
+        '都道府県コード': '13' if location else '', '地方': '関東' if location else '',
+        'リツイート数': tweet_id % 3, 'いいね数': tweet_id % 5,
+    }
+
+
+ROWS_RUN1 = [row(i, f'2024-01-{8 + i % 3:02d} {i % 24:02d}:30:00') for i in range(1, 40)]
+ROWS_RUN2 = [row(i, f'2024-01-{8 + i % 4:02d} {i % 24:02d}:10:00', location='') for i in range(40, 70)]
+
+
+def compact_quietly(root, by):
+    with contextlib.redirect_stdout(io.StringIO()):
+        return compact(root, by=by)
+
+
+def dataset_rows(root):
+    """データセット全体の行を (ID, 日時, 本文, 地域, コード, 地方, RT, いいね) の多重集合で返す"""
+    rows = []
+    for path in glob.glob(os.path.join(root, '*=*', '*.parquet')):
+        for r in pq.read_table(path).to_pylist():
+            rows.append(tuple(str(v) for v in r.values()))
+    return sorted(rows)
+
+
+@unittest.skipIf(tweet_dataset is None, 'pyarrow が必要')
+class DatasetTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.root = os.path.join(self.tmp, 'parquet')
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp)
+
+    def write(self, run_id, rows, batch_rows=7):
+        with ParquetDatasetWriter(self.root, run_id, batch_rows=batch_rows) as writer:
+            for r in rows:
+                writer.write(r)
+        return writer
+
+    def files(self):
+        return sorted(os.path.relpath(p, self.root) for p in glob.glob(os.path.join(self.root, '*', '*')))
+
+    def test_rows_are_partitioned_by_day(self):
+        writer = self.write('20240110_0900', ROWS_RUN1)
+        self.assertEqual(writer.count, len(ROWS_RUN1))
+        self.assertEqual(self.files(), [f'date=2024-01-{d}/run-20240110_0900.parquet' for d in ('08', '09', '10')])
+        table = pq.read_table(os.path.join(self.root, 'date=2024-01-09', 'run-20240110_0900.parquet'))
+        self.assertTrue(all(ts.strftime('%Y-%m-%d') == '2024-01-09' for ts in table.column('日時').to_pylist()))
+
+    def test_daily_compaction_preserves_rows(self):
+        self.write('20240110_0900', ROWS_RUN1)
+        self.write('20240111_0900', ROWS_RUN2)
+        before = dataset_rows(self.root)
+        self.assertEqual(compact_quietly(self.root, 'day'), 3)   # 1/11 は1ファイルだけ
+        self.assertEqual(dataset_rows(self.root), before)
+        table = pq.read_table(os.path.join(self.root, 'date=2024-01-09', 'compacted.parquet'))
+        ids = table.column('ツイートID').to_pylist()
+        self.assertEqual(ids, sorted(ids))
+        self.assertNotIn('date=2024-01-09/run-20240110_0900.parquet', self.files())
+
+    def test_weekly_compaction_preserves_rows(self):
+        self.write('20240110_0900', ROWS_RUN1)
+        self.write('20240111_0900', ROWS_RUN2)
+        compact_quietly(self.root, 'day')
+        before = dataset_rows(self.root)
+        self.assertEqual(compact_quietly(self.root, 'week'), 1)
+        self.assertEqual(self.files(), ['week=2024-01-08/compacted.parquet'])
+        self.assertEqual(dataset_rows(self.root), before)
+        # 週次にまとめた後も期間で読める
+        self.assertEqual(read_range(self.root, date(2024, 1, 8), date(2024, 1, 15)).num_rows,
+                         len(ROWS_RUN1) + len(ROWS_RUN2))
+
+    def test_compaction_is_idempotent(self):
+        self.write('20240110_0900', ROWS_RUN1)
+        self.write('20240111_0900', ROWS_RUN1[:5])
+        compact_quietly(self.root, 'day')
+        before = dataset_rows(self.root)
+        self.assertEqual(compact_quietly(self.root, 'day'), 0)
+        self.assertEqual(dataset_rows(self.root), before)
+
+    def test_compaction_fills_missing_columns(self):
+        # ツイートID・都道府県コード・地方の列が無い古いファイル
+        old_schema = pa.schema([f for f in tweet_dataset.SCHEMA
+                                if f.name not in ('ツイートID', '都道府県コード', '地方')])
+        directory = os.path.join(self.root, 'date=2024-01-09')
+        os.makedirs(directory)
+        old = tweet_dataset._to_table([row(999, '2024-01-09 01:00:00')]).select(old_schema.names)
+        pq.write_table(old, os.path.join(directory, 'run-old.parquet'))
+        self.write('20240110_0900', ROWS_RUN1)
+        compact_quietly(self.root, 'day')
+        table = pq.read_table(os.path.join(directory, 'compacted.parquet'))
+        self.assertEqual(table.schema.names, tweet_dataset.SCHEMA.names)
+        self.assertEqual(table.num_rows, 1 + sum(1 for r in ROWS_RUN1 if r['日時'].startswith('2024-01-09')))
+        self.assertEqual(table.column('ツイートID').null_count, 1)
+
+    def test_read_range_filters_rows_and_columns(self):
+        self.write('20240110_0900', ROWS_RUN1)
+        table = read_range(self.root, datetime(2024, 1, 9, 12), date(2024, 1, 10), columns=['本文', '地域'])
+        self.assertEqual(table.schema.names, ['本文', '地域'])
+        expected = [r for r in ROWS_RUN1 if '2024-01-09 12:00:00' <= r['日時'] < '2024-01-10']
+        self.assertEqual(table.num_rows, len(expected))
+        self.assertEqual(read_range(self.root, date(2023, 1, 1), date(2023, 1, 2)).num_rows, 0)
+
+    def test_checkpoint_starts_new_segment(self):
+        writer = ParquetDatasetWriter(self.root, 'r1')
+        for r in ROWS_RUN1[:10]:
+            writer.write(r)
+        self.assertEqual(writer.checkpoint(), {'segment': 1, 'rows': 10})
+        for r in ROWS_RUN1[10:]:
+            writer.write(r)
+        writer.close()
+        self.assertIn('date=2024-01-09/run-r1-1.parquet', self.files())
+        self.assertEqual(len(dataset_rows(self.root)), len(ROWS_RUN1))
+
+    def test_discard_removes_run_files(self):
+        self.write('r1', ROWS_RUN1)
+        self.write('r2', ROWS_RUN2)
+        ParquetDatasetWriter(self.root, 'r1').discard()
+        self.assertTrue(all('run-r2' in path for path in self.files()))
+
+
+if __name__ == '__main__':
+    unittest.main()
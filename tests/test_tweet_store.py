@@ -0,0 +1,177 @@
+# -*- coding: utf-8 -*-
+"""tweet_store.TweetStore の保存・取得済み区間・再分類"""
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+from datetime import datetime, timedelta, timezone
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'analytics-common'))
+from tweet_store import TweetStore, to_utc_text
+
+T0 = datetime(2024, 1, 10, 0, 0)
+
+
+def at(hours):
+    return T0 + timedelta(hours=hours)
+
+
+class StoreTestCase(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.store = TweetStore(os.path.join(self.tmp, 'tweets.db'))
+
+    def tearDown(self):
+        self.store.close()
+        shutil.rmtree(self.tmp)
+
+
+class CoverageTest(StoreTestCase):
+    def test_nothing_covered(self):
+        self.assertEqual(self.store.uncovered('q', at(0), at(6)), [(at(0), at(6))])
+
+    def test_gaps_between_covered_intervals(self):
+        self.store.mark_covered('q', at(1), at(2))
+        self.store.mark_covered('q', at(4), at(5))
+        self.assertEqual(self.store.uncovered('q', at(0), at(6)),
+                         [(at(0), at(1)), (at(2), at(4)), (at(5), at(6))])
+
+    def test_overlapping_and_adjacent_intervals_merge(self):
+        self.store.mark_covered('q', at(1), at(3))
+        self.store.mark_covered('q', at(2), at(4))
+        self.store.mark_covered('q', at(4), at(5))   # 接する区間もまとめる
+        self.store.mark_covered('q', at(7), at(8))
+        rows = self.store.conn.execute(
+            "SELECT start_time, end_time FROM coverage WHERE query = 'q' ORDER BY start_time").fetchall()
+        self.assertEqual(rows, [(to_utc_text(at(1)), to_utc_text(at(5))),
+                                (to_utc_text(at(7)), to_utc_text(at(8)))])
+
+    def test_interval_spanning_several_is_merged_into_one(self):
+        for start in (1, 3, 5):
+            self.store.mark_covered('q', at(start), at(start + 1))
+        self.store.mark_covered('q', at(0), at(10))
+        self.assertEqual(self.store.conn.execute("SELECT COUNT(*) FROM coverage").fetchone()[0], 1)
+        self.assertEqual(self.store.uncovered('q', at(0), at(10)), [])
+
+    def test_fully_covered_and_partially_covered_windows(self):
+        self.store.mark_covered('q', at(0), at(6))
+        self.assertEqual(self.store.uncovered('q', at(1), at(5)), [])
+        self.assertEqual(self.store.uncovered('q', at(4), at(8)), [(at(6), at(8))])
+
+    def test_coverage_is_per_query(self):
+        self.store.mark_covered('a', at(0), at(6))
+        self.assertEqual(self.store.uncovered('b', at(0), at(6)), [(at(0), at(6))])
+
+    def test_empty_interval_is_ignored(self):
+        self.store.mark_covered('q', at(3), at(3))
+        self.assertEqual(self.store.conn.execute("SELECT COUNT(*) FROM coverage").fetchone()[0], 0)
+
+    def test_timezone_aware_times_are_stored_as_utc(self):
+        jst = timezone(timedelta(hours=9))
+        self.store.mark_covered('q', (at(0) + timedelta(hours=9)).replace(tzinfo=jst), at(6))
+        self.assertEqual(self.store.uncovered('q', at(0), at(6)), [])
+
+
+def tweet(tweet_id, hours, text='風邪で咳'):
+    return SimpleNamespace(id=tweet_id, text=text, created_at=at(hours))
+
+
+class FillTest(StoreTestCase):
+    def test_complete_fetch_covers_the_gap(self):
+        batches = []
+
+        def fetch(start, end, progress):
+            progress['complete'] = True
+            return iter([tweet(2, 3), tweet(1, 1)])
+
+        self.assertEqual(self.store.fill('q', at(0), at(6), fetch, batches.append), 2)
+        self.assertEqual([[t.id for t in b] for b in batches], [[2, 1]])
+        self.assertEqual(self.store.uncovered('q', at(0), at(6)), [])
+
+    def test_truncated_fetch_covers_from_oldest_tweet(self):
+        def fetch(start, end, progress):
+            return iter([tweet(3, 5), tweet(2, 4)])
+
+        self.store.fill('q', at(0), at(6), fetch, lambda batch: None)
+        self.assertEqual(self.store.uncovered('q', at(0), at(6)), [(at(0), at(4))])
+
+    def test_only_gaps_are_fetched(self):
+        self.store.mark_covered('q', at(2), at(4))
+        requested = []
+
+        def fetch(start, end, progress):
+            requested.append((start, end))
+            progress['complete'] = True
+            return iter([])
+
+        self.store.fill('q', at(0), at(6), fetch, lambda batch: None)
+        self.assertEqual(requested, [(at(0), at(2)), (at(4), at(6))])
+
+    def test_batches(self):
+        batches = []
+
+        def fetch(start, end, progress):
+            progress['complete'] = True
+            return (tweet(i, 5 - i * 0.01) for i in range(250))
+
+        self.store.fill('q', at(0), at(6), fetch, batches.append, batch_size=100)
+        self.assertEqual([len(b) for b in batches], [100, 100, 50])
+
+
+class TweetsTest(StoreTestCase):
+    def test_same_id_is_stored_once(self):
+        self.store.add_tweets([{'id': 1, 'text': '最初', 'created_at': at(1)}], query='a')
+        self.store.add_tweets([{'id': 1, 'text': '二回目', 'created_at': at(1)}], query='b')
+        rows = list(self.store.iter_tweets())
+        self.assertEqual(rows, [(1, '最初', to_utc_text(at(1)), None)])
+        queries = self.store.conn.execute("SELECT query FROM tweet_queries ORDER BY query").fetchall()
+        self.assertEqual(queries, [('a',), ('b',)])
+
+    def test_count_by_symptom_in_window(self):
+        self.store.add_tweets([{'id': i, 'text': 't', 'created_at': at(i)} for i in range(1, 5)], query='q')
+        self.store.set_classifications('kaze', [(1, '咳', True), (2, '咳', True), (3, '咳', False),
+                                                (4, '咳', True), (2, '発熱', True)])
+        self.assertEqual(self.store.count_by_symptom('kaze', at(0), at(4)), {'咳': 2, '発熱': 1})
+        self.assertEqual(self.store.count_by_symptom('kaze', at(0), at(4), query='other'), {})
+        self.assertEqual(self.store.count_by_symptom('pollen', at(0), at(4)), {})
+
+    def test_reclassify_replaces_previous_results(self):
+        self.store.add_tweets([{'id': 1, 'text': '風邪で咳', 'created_at': at(2)},
+                               {'id': 2, 'text': '熱', 'created_at': at(1)}], query='q')
+        self.store.set_classifications('kaze', [(1, '古い症状', True)])
+        seen = []
+
+        def classify(text, queries, tweet_id):
+            seen.append((tweet_id, queries))
+            return [('咳', '咳' in text)]
+
+        self.assertEqual(self.store.reclassify('kaze', classify), 2)
+        # 投稿日時の順に渡す
+        self.assertEqual(seen, [(2, ['q']), (1, ['q'])])
+        self.assertEqual(self.store.count_by_symptom('kaze', at(0), at(6)), {'咳': 1})
+
+    def test_failed_reclassify_keeps_previous_results(self):
+        self.store.add_tweets([{'id': i, 'text': 't', 'created_at': at(i)} for i in range(1, 4)], query='q')
+        self.store.set_classifications('kaze', [(1, '咳', True), (2, '咳', True)])
+
+        def classify(text, queries, tweet_id):
+            if tweet_id == 3:
+                raise RuntimeError('分類に失敗')
+            return [('発熱', True)]
+
+        with self.assertRaises(RuntimeError):
+            self.store.reclassify('kaze', classify, batch_size=1)
+        self.assertEqual(self.store.count_by_symptom('kaze', at(0), at(6)), {'咳': 2})
+        # 失敗後にやり直せば差し替わる
+        self.assertEqual(self.store.reclassify('kaze', lambda text, queries, tweet_id: [('発熱', True)]), 3)
+        self.assertEqual(self.store.count_by_symptom('kaze', at(0), at(6)), {'発熱': 3})
+
+    def test_iter_tweets_window(self):
+        self.store.add_tweets([{'id': i, 'text': 't', 'created_at': at(i)} for i in range(5)])
+        self.assertEqual([row[0] for row in self.store.iter_tweets(at(1), at(3), batch_size=1)], [1, 2])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,194 @@
+# -*- coding: utf-8 -*-
+"""writers の逐次CSV書き出しと外部ソート"""
+import csv
+import os
+import random
+import shutil
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'kaze-analytics-scrape', 'src'))
+from writers import FIELDS, StreamingCsvWriter, TopRows, engagement_order, fetch_order, iter_rows, sort_rows
+
+
+def make_rows(n, seed=0):
+    """ID の新しい順（取得順）の行。いいね数・リツイート数は同数が多くなるように小さくする"""
+    rng = random.Random(seed)
+    rows = []
+    for i in range(n):
+        rows.append({
+            'ツイートID': 10000 - i,
+            '日時': f'2024-01-10 {i % 24:02d}:00:00',
+            '本文': f'風邪で咳 {i}, "引用" あり',
+            '地域': rng.choice(['東京都', '', '大阪']),
+            '都道府県コード': rng.choice(['13', '']),
+            '地方': rng.choice(['関東', '']),
+            'リツイート数': rng.randrange(3),
+            'いいね数': rng.randrange(5),
+        })
+    return rows
+
+
+def read_csv(path):
+    with open(path, encoding='utf-8-sig', newline='') as f:
+        reader = csv.reader(f)
+        return next(reader), list(reader)
+
+
+class WriterTestCase(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp)
+
+    def path(self, name):
+        return os.path.join(self.tmp, name)
+
+    def write_all(self, rows, name='out.csv', top_n=10):
+        writer = StreamingCsvWriter(self.path(name), top_path=self.path('top.csv'), top_n=top_n)
+        with writer:
+            for row in rows:
+                writer.write(row)
+        return writer
+
+
+class SortRowsTest(WriterTestCase):
+    def test_external_sort_matches_stable_sort(self):
+        rows = make_rows(500)
+        self.write_all(rows, 'src.csv')
+        src = self.path('src.csv')
+        expected = [row['ツイートID'] for row in sorted(iter_rows(src), key=engagement_order)]
+        for chunk_rows in (7, 100, 1000):
+            with self.subTest(chunk_rows=chunk_rows):
+                sort_rows(src, self.path('dst.csv'), engagement_order, chunk_rows=chunk_rows)
+                self.assertEqual([row['ツイートID'] for row in iter_rows(self.path('dst.csv'))], expected)
+
+    def test_limit_and_fetch_order(self):
+        self.write_all(make_rows(50), 'src.csv')
+        sort_rows(self.path('src.csv'), self.path('dst.csv'), fetch_order, limit=20, chunk_rows=9)
+        self.assertEqual([row['ツイートID'] for row in iter_rows(self.path('dst.csv'))],
+                         list(range(10000, 9980, -1)))
+
+    def test_temporary_runs_are_removed(self):
+        self.write_all(make_rows(50), 'src.csv')
+        sort_rows(self.path('src.csv'), self.path('dst.csv'), engagement_order, chunk_rows=5)
+        self.assertEqual(sorted(os.listdir(self.tmp)), ['dst.csv', 'src.csv', 'top.csv'])
+
+
+class StreamingCsvWriterTest(WriterTestCase):
+    def test_output_is_sorted_by_engagement_with_original_columns_first(self):
+        rows = make_rows(120)
+        self.write_all(rows)
+        header, body = read_csv(self.path('out.csv'))
+        self.assertEqual(header, FIELDS)
+        self.assertEqual(header[:5], ['日時', '本文', '地域', 'リツイート数', 'いいね数'])
+        # 同数は取得した順のまま
+        expected = sorted(rows, key=lambda row: (-row['いいね数'], -row['リツイート数']))
+        self.assertEqual([int(line[FIELDS.index('ツイートID')]) for line in body],
+                         [row['ツイートID'] for row in expected])
+        self.assertFalse(os.path.exists(self.path('out.csv.part')))
+
+    def test_rows_round_trip(self):
+        rows = make_rows(30)
+        self.write_all(rows)
+        by_id = {row['ツイートID']: row for row in iter_rows(self.path('out.csv'))}
+        for row in rows:
+            self.assertEqual({k: str(v) for k, v in by_id[row['ツイートID']].items()},
+                             {k: str(v) for k, v in row.items()})
+
+    def test_top_file_is_head_of_main_file(self):
+        self.write_all(make_rows(200), top_n=15)
+        _, body = read_csv(self.path('out.csv'))
+        _, top = read_csv(self.path('top.csv'))
+        self.assertEqual(top, body[:15])
+
+    def test_no_rows_creates_no_files(self):
+        writer = self.write_all([])
+        self.assertEqual(writer.count, 0)
+        self.assertEqual(os.listdir(self.tmp), [])
+
+
+
+class ResumeTest(WriterTestCase):
+    def writer(self):
+        return StreamingCsvWriter(self.path('out.csv'), top_path=self.path('top.csv'), top_n=10)
+
+    def write_with_checkpoint(self, rows, at):
+        """rows[:at] を書いてチェックポイントを取り、残りも書いたところで止まった書き出し"""
+        writer = self.writer()
+        for row in rows[:at]:
+            writer.write(row)
+        state = writer.checkpoint()
+        for row in rows[at:]:
+            writer.write(row)
+        writer.file.flush()
+        writer.file.close()
+        return state
+
+    def expected(self, rows):
+        self.write_all(rows, 'expected.csv')
+        with open(self.path('expected.csv'), 'rb') as f, open(self.path('top.csv'), 'rb') as t:
+            return f.read(), t.read()
+
+    def output(self):
+        with open(self.path('out.csv'), 'rb') as f, open(self.path('top.csv'), 'rb') as t:
+            return f.read(), t.read()
+
+    def test_rows_after_checkpoint_are_dropped(self):
+        rows = make_rows(60)
+        state = self.write_with_checkpoint(rows[:45], 30)
+        self.assertEqual(state['rows'], 30)
+        writer = self.writer()
+        writer.resume(state)
+        self.assertEqual(writer.count, 30)
+        for row in rows[30:]:
+            writer.write(row)
+        writer.close()
+        result = self.output()   # expected() が top.csv を書き直すため先に読む
+        self.assertEqual(result, self.expected(rows))
+
+    def test_resume_after_the_output_was_replaced(self):
+        # 並べ替えた出力に置き換えた後、チェックポイントを消す前に止まった場合
+        rows = make_rows(40)
+        writer = self.writer()
+        for row in rows:
+            writer.write(row)
+        state = writer.checkpoint()
+        writer.close()
+        resumed = self.writer()
+        resumed.resume(state)
+        self.assertEqual([row['ツイートID'] for row in iter_rows(self.path('out.csv.part'))],
+                         [row['ツイートID'] for row in rows])
+        resumed.close()
+        result = self.output()
+        self.assertEqual(result, self.expected(rows))
+
+    def test_checkpoint_before_first_row(self):
+        rows = make_rows(10)
+        state = self.writer().checkpoint()
+        self.assertEqual(state, {'bytes': 0, 'rows': 0})
+        writer = self.writer()
+        writer.resume(state)
+        with writer:
+            for row in rows:
+                writer.write(row)
+        result = self.output()
+        self.assertEqual(result, self.expected(rows))
+
+class TopRowsTest(unittest.TestCase):
+    def test_keeps_largest_and_earliest_on_ties(self):
+        top = TopRows(3)
+        for i, likes in enumerate([1, 5, 5, 2, 5, 0]):
+            top.push({'id': i, 'いいね数': likes, 'リツイート数': 0})
+        self.assertEqual([row['id'] for row in top.sorted_rows()], [1, 2, 4])
+
+    def test_zero_size_keeps_nothing(self):
+        top = TopRows(0)
+        top.push({'いいね数': 1, 'リツイート数': 1})
+        self.assertEqual(top.sorted_rows(), [])
+
+
+if __name__ == '__main__':
+    unittest.main()